@@ -0,0 +1,104 @@
+import json
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+from benchmarks.synthetic import generate_memes
+
+def benchmark_engine(name, images, config=None, regions=None):
+    """OCR every image with one engine and return its per-image timings.
+
+    Creating the engine is timed separately: for tesserocr that is the one
+    model load every worker pays, for pytesseract it is nearly free and the
+    cost shows up in every single call instead. With ``regions`` only the
+    detected caption regions are OCRed, and the detection is part of the
+    per-image time.
+    """
+    from src.ocr import create_engine
+    from src.text_regions import find_text_regions, stack_regions
+
+    start = time.perf_counter()
+    engine = create_engine(name, config)
+    setup = time.perf_counter() - start
+
+    seconds = []
+    try:
+        for image in images:
+            start = time.perf_counter()
+            if regions:
+                image = stack_regions(image, find_text_regions(image, regions))
+            engine.recognize(image)
+            seconds.append(time.perf_counter() - start)
+    finally:
+        engine.close()
+
+    return {
+        'engine': name,
+        'regions': regions,
+        'images': len(images),
+        'setup_s': round(setup, 4),
+        'mean_s': round(float(np.mean(seconds)), 4),
+        'p50_s': round(float(np.percentile(seconds, 50)), 4),
+        'p95_s': round(float(np.percentile(seconds, 95)), 4),
+        'total_s': round(setup + sum(seconds), 4),
+    }
+
+def run(count=30, work_dir=None, seed=0, engines=None, regions=None):
+    """Compare the available OCR backends on the same synthetic memes.
+
+    Returns:
+        List of result dicts; every result except full-image pytesseract has
+        the per-image saving against it as 'saving_per_image_s' and 'speedup'.
+        With ``regions`` each engine is also run on caption regions only.
+    """
+    import cv2
+    from src.ocr import tesserocr_available
+
+    work_dir = work_dir or tempfile.mkdtemp(prefix='ocr-bench-')
+    raw_dir = os.path.join(work_dir, f'memes_{count}')
+    if not os.path.exists(os.path.join(raw_dir, 'labels.csv')):
+        generate_memes(raw_dir, count, seed=seed)
+    image_dir = os.path.join(raw_dir, 'images')
+    # Decoded up front (RGB, as etl_pipeline.ocr_input passes them) so only OCR is timed
+    images = [cv2.imread(os.path.join(image_dir, name))[:, :, ::-1] for name in sorted(os.listdir(image_dir))]
+
+    if engines is None:
+        engines = ['pytesseract'] + (['tesserocr'] if tesserocr_available() else [])
+    results = [benchmark_engine(name, images) for name in engines]
+    if regions:
+        results += [benchmark_engine(name, images, regions=regions) for name in engines]
+
+    baseline = next((r for r in results if r['engine'] == 'pytesseract' and not r['regions']), None)
+    for result in results:
+        if baseline is not None and result is not baseline:
+            result['saving_per_image_s'] = round(baseline['mean_s'] - result['mean_s'], 4)
+            result['speedup'] = round(baseline['mean_s'] / result['mean_s'], 2) if result['mean_s'] else None
+    return results
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Compare per-image OCR cost of the OCR backends')
+    parser.add_argument('--count', type=int, default=30, help='Number of synthetic memes to OCR')
+    parser.add_argument('--engines', nargs='+', choices=['pytesseract', 'tesserocr'],
+                        help='Backends to compare (default: every installed one)')
+    parser.add_argument('--regions', choices=['contours', 'bands'],
+                        help='Also time OCR of the detected caption regions only')
+    parser.add_argument('--work-dir', help='Where to keep generated memes (reused between runs)')
+    parser.add_argument('--output', help='Optional JSON results file')
+    args = parser.parse_args()
+
+    results = run(args.count, args.work_dir, engines=args.engines, regions=args.regions)
+    for result in results:
+        name = result['engine'] + (f" ({result['regions']})" if result['regions'] else '')
+        line = (f"{name:>24}: setup {result['setup_s']:.3f}s, mean {result['mean_s'] * 1000:.1f} ms/img, "
+                f"p95 {result['p95_s'] * 1000:.1f} ms/img")
+        if 'speedup' in result:
+            line += f", saves {result['saving_per_image_s'] * 1000:.1f} ms/img ({result['speedup']}x)"
+        print(line)
+    if not any(result['engine'] == 'tesserocr' for result in results):
+        print("tesserocr is not installed; install it (pip install tesserocr) to compare", file=sys.stderr)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,213 @@
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import generate_memes
+
+# Benchmarked steps, in the order they feed each other; 'etl' is run_etl, what the pipeline runs
+STAGES = ['extract', 'etl', 'analyze', 'warehouse']
+
+# Stage whose on-disk output each stage reads
+REQUIRES = {'analyze': 'etl', 'warehouse': 'etl'}
+
+DEFAULT_SCALES = [20, 100]
+
+def _peak_rss_mb(who=resource.RUSAGE_SELF):
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def _run_stage(stage, scale_dir, workers):
+    """Run one stage on a prepared scale directory and return its measurements.
+
+    Inputs the stage needs from earlier stages are read from disk before
+    the clock starts, so only the stage itself is timed.
+    """
+    from src.etl_pipeline import extract, run_etl
+    from src.analyze_data import analyze_data
+    from src.warehouse_loader import load_to_warehouse
+
+    image_dir = os.path.join(scale_dir, 'raw', 'images')
+    labels_path = os.path.join(scale_dir, 'raw', 'labels.csv')
+    processed_dir = os.path.join(scale_dir, 'processed')
+
+    if stage == 'extract':
+        # Listing the directory is what extract defers, so make it do so
+        run = lambda: list(extract(image_dir, labels_path)[0])
+    elif stage == 'etl':
+        # Every run OCRs every image and replaces the previous output
+        run = lambda: run_etl(image_dir, labels_path, processed_dir, workers=workers, use_cache=False,
+                              rebuild=True)
+    elif stage == 'analyze':
+        run = lambda: analyze_data(processed_dir, os.path.join(scale_dir, 'analysis'))
+    elif stage == 'warehouse':
+        import mongomock
+        client = mongomock.MongoClient()
+        run = lambda: load_to_warehouse(processed_dir, client=client, workers=workers)
+    else:
+        raise ValueError(f"Unknown stage: {stage}")
+
+    rss_before = _peak_rss_mb()
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    run()
+    wall = time.perf_counter() - wall
+    cpu = time.process_time() - cpu
+    # OCR workers (and the tesseract processes they start) have exited and been waited for by now
+    return {'seconds': wall, 'cpu_seconds': cpu, 'peak_rss_mb': _peak_rss_mb(), 'rss_before_mb': rss_before,
+            'children_peak_rss_mb': _peak_rss_mb(resource.RUSAGE_CHILDREN)}
+
+def _stage_worker(stage, scale_dir, workers, queue):
+    try:
+        queue.put(_run_stage(stage, scale_dir, workers))
+    except Exception as e:
+        queue.put({'error': f"{type(e).__name__}: {e}"})
+
+def measure(stage, scale_dir, workers=1):
+    """Run a stage in a fresh spawned process, so its peak RSS is its own"""
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_stage_worker, args=(stage, scale_dir, workers, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    if 'error' in result:
+        raise RuntimeError(f"{stage} failed: {result['error']}")
+    return result
+
+def prepare_scale(work_dir, scale, seed=0):
+    """Generate (or reuse) the synthetic dataset for one scale"""
+    scale_dir = os.path.join(work_dir, f'scale_{scale}')
+    raw_dir = os.path.join(scale_dir, 'raw')
+    if not os.path.exists(os.path.join(raw_dir, 'labels.csv')):
+        print(f"Generating {scale} synthetic memes in {raw_dir}")
+        generate_memes(raw_dir, scale, seed=seed)
+    return scale_dir
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(scales=DEFAULT_SCALES, stages=STAGES, workers=1, repeat=1, work_dir=None, seed=0):
+    """Time every stage at every scale on synthetic data.
+
+    Each stage runs ``repeat`` times in its own process; the fastest run is
+    kept (the least disturbed by other load on the machine) together with
+    the highest peak RSS, of the stage process itself and of the largest
+    child process it started (OCR workers, tesseract).
+
+    Returns:
+        Dict with environment details and one result per (stage, scale)
+    """
+    from src.ocr import tesseract_version
+
+    work_dir = work_dir or tempfile.mkdtemp(prefix='meme-bench-')
+    needed = set(stages)
+    for stage in stages:
+        while stage in REQUIRES:
+            stage = REQUIRES[stage]
+            needed.add(stage)
+
+    results = []
+    for scale in scales:
+        scale_dir = prepare_scale(work_dir, scale, seed)
+        for stage in [stage for stage in STAGES if stage in needed]:
+            runs = [measure(stage, scale_dir, workers) for _ in range(repeat if stage in stages else 1)]
+            if stage not in stages:
+                # Only run for the output a later stage reads
+                continue
+            best = min(runs, key=lambda run: run['seconds'])
+            result = {
+                'stage': stage,
+                'scale': scale,
+                'seconds': round(best['seconds'], 4),
+                'cpu_seconds': round(best['cpu_seconds'], 4),
+                'items_per_s': round(scale / best['seconds'], 2) if best['seconds'] > 0 else None,
+                'peak_rss_mb': round(max(run['peak_rss_mb'] for run in runs), 1),
+                'children_peak_rss_mb': round(max(run['children_peak_rss_mb'] for run in runs), 1),
+            }
+            results.append(result)
+            print(f"{stage:>10} x{scale:<6} {result['seconds']:8.3f}s  {result['items_per_s'] or 0:9.1f}/s  "
+                  f"{result['peak_rss_mb']:7.1f} MB  children {result['children_peak_rss_mb']:7.1f} MB", flush=True)
+
+    return {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'tesseract': tesseract_version(),
+        'workers': workers,
+        'repeat': repeat,
+        'seed': seed,
+        'results': results,
+    }
+
+def compare(baseline, current, tolerance=0.15):
+    """List regressions of current against baseline.
+
+    A result regresses when its throughput drops, or its peak RSS (own or
+    of its largest child process) grows, by more than ``tolerance`` (a
+    fraction) for the same stage and scale.
+
+    Returns:
+        List of human readable regression messages (empty when none)
+    """
+    old = {(r['stage'], r['scale']): r for r in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        before = old.get((result['stage'], result['scale']))
+        if before is None:
+            continue
+        name = f"{result['stage']} x{result['scale']}"
+        if before['items_per_s'] and result['items_per_s'] is not None \
+                and result['items_per_s'] < before['items_per_s'] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {before['items_per_s']}/s -> {result['items_per_s']}/s")
+        for key, label in [('peak_rss_mb', 'peak RSS'), ('children_peak_rss_mb', 'child peak RSS')]:
+            # Baselines from before children were measured lack the second key
+            if key in before and key in result and result[key] > before[key] * (1 + tolerance):
+                regressions.append(f"{name}: {label} {before[key]} MB -> {result[key]} MB")
+    return regressions
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Benchmark the ETL, analysis and warehouse stages on synthetic memes')
+    parser.add_argument('--scales', type=int, nargs='+', default=DEFAULT_SCALES,
+                        help='Numbers of images to benchmark with')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES, help='Stages to report')
+    parser.add_argument('--workers', type=int, default=1, help='OCR worker processes / warehouse writers')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per stage; the fastest is reported')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the synthetic data')
+    parser.add_argument('--work-dir', help='Where to keep generated data (reused between runs)')
+    parser.add_argument('--output', help='JSON results file (default: benchmarks/results/<commit>.json, '
+                                         'which git ignores)')
+    parser.add_argument('--compare', help='Baseline JSON results to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='Allowed relative throughput drop / RSS growth before flagging a regression')
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.scales, args.stages, workers=args.workers, repeat=args.repeat,
+                            work_dir=args.work_dir, seed=args.seed)
+    output = args.output or os.path.join('benchmarks', 'results', f"{report['commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), report, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions")
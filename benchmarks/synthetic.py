@@ -0,0 +1,110 @@
+import os
+import cv2
+import numpy as np
+import pandas as pd
+
+# Caption vocabulary; every meme is two short upper-case lines like a classic meme
+WORDS = [
+    'when', 'you', 'the', 'monday', 'coffee', 'code', 'works', 'first', 'time', 'nobody', 'expects',
+    'deadline', 'weekend', 'cat', 'dog', 'boss', 'meeting', 'friday', 'pizza', 'sleep', 'exam', 'finally',
+    'tests', 'pass', 'production', 'bug', 'feature', 'internet', 'again', 'always', 'never', 'me',
+]
+
+LABEL_VALUES = {
+    'humour': ['funny', 'very_funny', 'not_funny', 'hilarious'],
+    'sarcasm': ['general', 'not_sarcastic', 'twisted_meaning', 'very_twisted'],
+    'offensive': ['not_offensive', 'slight', 'very_offensive', 'hateful_offensive'],
+    'motivational': ['not_motivational', 'motivational'],
+    'overall_sentiment': ['neutral', 'positive', 'negative', 'very_positive', 'very_negative'],
+}
+
+def _caption(rng):
+    words = rng.choice(WORDS, size=rng.integers(4, 9))
+    split = len(words) // 2
+    return ' '.join(words[:split]).upper(), ' '.join(words[split:]).upper()
+
+def _draw_text(img, text, y):
+    """Centre white text with a black outline at height y, meme style"""
+    font = cv2.FONT_HERSHEY_DUPLEX
+    scale = img.shape[1] / 600
+    (width, height), _ = cv2.getTextSize(text, font, scale, 2)
+    if width > img.shape[1] * 0.95:
+        scale *= img.shape[1] * 0.95 / width
+        (width, height), _ = cv2.getTextSize(text, font, scale, 2)
+    origin = ((img.shape[1] - width) // 2, y + height)
+    cv2.putText(img, text, origin, font, scale, (0, 0, 0), 6, cv2.LINE_AA)
+    cv2.putText(img, text, origin, font, scale, (255, 255, 255), 2, cv2.LINE_AA)
+    return height
+
+def render_meme(rng, width, height):
+    """One synthetic meme: a noisy colour gradient with a top and bottom caption.
+
+    Returns:
+        (BGR image, caption text)
+    """
+    start, end = rng.integers(0, 256, size=(2, 3))
+    ramp = np.linspace(0, 1, height)[:, None, None]
+    img = (start + (end - start) * ramp) * np.ones((1, width, 1))
+    img = np.clip(img + rng.normal(0, 12, size=img.shape), 0, 255).astype(np.uint8)
+    for _ in range(rng.integers(1, 4)):
+        center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        color = tuple(int(c) for c in rng.integers(0, 256, size=3))
+        cv2.circle(img, center, int(rng.integers(10, max(11, min(width, height) // 3))), color, -1)
+
+    top, bottom = _caption(rng)
+    margin = height // 20
+    _draw_text(img, top, margin)
+    text_height = cv2.getTextSize(bottom, cv2.FONT_HERSHEY_DUPLEX, width / 600, 2)[0][1]
+    _draw_text(img, bottom, height - margin - text_height * 2)
+    return img, f"{top}\n{bottom}"
+
+def generate_memes(output_dir, count, seed=0, min_side=300, max_side=800, labels_name='labels.csv'):
+    """Write ``count`` synthetic meme images and a matching labels CSV, fully offline.
+
+    The layout mirrors the real dataset: <output_dir>/images/image_N.jpg and
+    <output_dir>/<labels_name> with the same columns as the original
+    labels.csv (including the trailing space in 'overall_sentiment ').
+    The same seed always produces the same images and labels.
+
+    Args:
+        output_dir: Directory to create the images/ folder and labels file in
+        count: Number of memes
+        seed: Random seed
+        min_side: Smallest image side in pixels
+        max_side: Largest image side in pixels
+        labels_name: File name of the labels CSV
+
+    Returns:
+        (image_dir, labels_path)
+    """
+    rng = np.random.default_rng(seed)
+    image_dir = os.path.join(output_dir, 'images')
+    os.makedirs(image_dir, exist_ok=True)
+
+    rows = []
+    for i in range(1, count + 1):
+        width, height = rng.integers(min_side, max_side + 1, size=2)
+        img, caption = render_meme(rng, int(width), int(height))
+        name = f'image_{i}.jpg'
+        cv2.imwrite(os.path.join(image_dir, name), img, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        text = caption.replace('\n', ' ').lower()
+        row = {'Unnamed: 0': i - 1, 'image_name': name, 'text_ocr': text, 'text_corrected': text}
+        for column, values in LABEL_VALUES.items():
+            row[column] = values[rng.integers(len(values))]
+        rows.append(row)
+
+    labels = pd.DataFrame(rows).rename(columns={'overall_sentiment': 'overall_sentiment '})
+    labels_path = os.path.join(output_dir, labels_name)
+    labels.to_csv(labels_path, index=False)
+    return image_dir, labels_path
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Generate synthetic meme images with labels')
+    parser.add_argument('output_dir', help='Directory for images/ and labels.csv')
+    parser.add_argument('--count', type=int, default=100, help='Number of memes to generate')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    args = parser.parse_args()
+
+    image_dir, labels_path = generate_memes(args.output_dir, args.count, seed=args.seed)
+    print(f"Wrote {args.count} memes to {image_dir} and labels to {labels_path}")
@@ -10,14 +10,29 @@ from test.prepare_test_data import prepare_test_data
 
 @pytest.fixture(scope="session", autouse=True)
 def setup_test_data():
-    """Set up test data before any tests run."""
-    # Check if source data exists
-    if not os.path.exists('data/raw/images') or not os.path.exists('data/raw/labels.csv'):
-        pytest.skip("Source data not found. Make sure data/raw/images and data/raw/labels.csv exist.")
-    
+    """Set up test data before any tests run (synthetic memes when data/raw is missing)."""
     # Prepare test data
     prepare_test_data()
     
     # Verify test data was created
     if not os.path.exists('data/raw_test/labels_test.csv'):
-        pytest.fail("Failed to create test data.")
\ No newline at end of file
+        pytest.fail("Failed to create test data.")
+
+
+@pytest.fixture(scope="session", autouse=True)
+def detached_progress_file():
+    """Keep processes the tests start (e.g. ETL shards) from reporting into a parent pipeline's progress file."""
+    from src import progress
+    path = os.environ.pop(progress.PROGRESS_FILE_ENV, None)
+    yield
+    if path is not None:
+        os.environ[progress.PROGRESS_FILE_ENV] = path
+
+
+@pytest.fixture(autouse=True)
+def isolated_progress():
+    """Give every test its own progress tracker, so nothing reaches a parent pipeline's progress file."""
+    from src import progress
+    previous = progress.set_tracker(progress.ProgressTracker())
+    yield
+    progress.set_tracker(previous)
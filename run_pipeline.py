@@ -1,135 +1,72 @@
 import os
+import shlex
+import shutil
 import subprocess
 import sys
+import tempfile
 import time
 from pathlib import Path
 import argparse
 import threading
-from tqdm import tqdm
 from dotenv import load_dotenv
 import pymongo
+from src import progress
+from src.orchestrator import Pipeline, Stage
+from src.etl_pipeline import run_etl
+from src.image_source import count_images
+from src.analyze_data import analyze_data
+from src.warehouse_loader import load_to_warehouse
 
-def stream_output(process, description, debug=False):
-    """Stream output from subprocess while keeping it separate from progress bar"""
-    for line in process.stdout:
-        if not line.strip():
-            continue
-            
-        # Always print processing updates (more inclusive matching)
-        if any(keyword in line for keyword in ["Processing", "Processed", "image", "images", "%"]):
-            tqdm.write(f"[{description}] {line.strip()}")
-        elif debug:
-            # Print other debug lines
-            tqdm.write(f"[{description}] {line.strip()}")
-        else:
-            # Print any other output that might be important
-            tqdm.write(f"[{description}] {line.strip()}")
+# Per-stage progress, throughput and latency percentiles of the last run
+METRICS_PATH = 'data/pipeline_metrics.json'
+
+# cProfile / py-spy output of a --profile run
+PROFILE_DIR = 'data/profile'
+
+def run_command(command, description, debug=False, py_spy=False):
+    """Run a shell command as a pipeline stage and forward its progress.
+
+    The child reports progress as JSON lines to the file named in
+    $PIPELINE_PROGRESS_FILE; those events are applied to the current
+    stage's tracker while the command runs, so the bars show real counts.
 
-def run_command(command, description, show_progress=False, debug=False, long_running=False):
-    """Run a shell command and print output with optional progress bar
-    
     Args:
         command: The command to run
         description: Description of the command
-        show_progress: Whether to show a progress bar
-        debug: Whether to show debug output
-        long_running: Whether this is a long-running command (slower progress bar)
+        debug: Stream the command's output instead of only printing it on failure
+        py_spy: Record the command with py-spy into data/profile/<stage>.speedscope.json
     """
     print(f"\n{'='*80}\n{description}\n{'='*80}")
-    
-    if show_progress:
-        # Start the process with unbuffered output
-        process = subprocess.Popen(
-            command, 
-            shell=True, 
-            stdout=subprocess.PIPE, 
-            stderr=subprocess.STDOUT,  # Redirect stderr to stdout
-            text=True,
-            bufsize=0,  # Unbuffered
-            universal_newlines=True
-        )
-        
-        # Setup output streaming thread to show real progress
-        output_thread = threading.Thread(target=stream_output, args=(process, description, debug))
-        output_thread.daemon = True
-        output_thread.start()
-        
-        # Adjust timing based on expected duration
-        update_interval = 1.0 if long_running else 0.2
-        max_progress = 85 if long_running else 95  # Leave more room for completion on long-running tasks
-        
-        # Show progress bar
-        with tqdm(total=100, desc=f"Running {description}", 
-                 bar_format='{l_bar}{bar}| {elapsed}<{remaining} {postfix}', 
-                 position=0, leave=True) as pbar:
-            
-            # Set initial postfix
-            pbar.set_postfix_str("Starting...")
-            
-            start_time = time.time()
-            completed = False
-            last_progress = 0
-            
-            while not completed:
-                if process.poll() is not None:  # Process has finished
-                    pbar.n = 100
-                    pbar.set_postfix_str("Complete!")
-                    pbar.refresh()
-                    completed = True
-                else:
-                    # Calculate progress differently for long-running processes
-                    # Use elapsed time to estimate progress
-                    elapsed = time.time() - start_time
-                    
-                    if long_running:
-                        # For long-running processes, progress more slowly
-                        # Estimate based on expected duration (roughly 0.5s per image for 7000 images = ~1 hour)
-                        estimated_total = 3600  # 1 hour in seconds (adjust for your dataset)
-                        progress = min(max_progress, int((elapsed / estimated_total) * max_progress))
-                    else:
-                        # For shorter processes, progress more quickly
-                        progress = min(max_progress, int(elapsed / update_interval) + last_progress)
-                    
-                    # Only update if progress has changed
-                    if progress > pbar.n:
-                        pbar.update(progress - pbar.n)
-                        last_progress = progress
-                        
-                    # Update the postfix to show activity even when progress bar doesn't move
-                    if elapsed > 10 and long_running:
-                        minutes, seconds = divmod(elapsed, 60)
-                        pbar.set_postfix_str(f"Running for {int(minutes)}m {int(seconds)}s")
-                    
-                    time.sleep(update_interval)
-            
-            # Process finished, get remaining output
-            stdout, stderr = process.communicate()
-            
-            if stderr:
-                print(f"\nERRORS/WARNINGS:\n{stderr}")
-                
-            return process.returncode == 0
-    else:
-        # Original behavior without progress bar
-        result = subprocess.run(command, shell=True, capture_output=True, text=True)
-        if debug and result.stdout:
-            print(result.stdout)
-        if result.stderr:
-            print(f"ERRORS/WARNINGS:\n{result.stderr}")
-        return result.returncode == 0  # True if command succeeded
 
-def estimate_completion_time(file_count, avg_time_per_file=0.5):
-    """Estimate pipeline completion time based on file count"""
-    total_seconds = file_count * avg_time_per_file
-    hours, remainder = divmod(total_seconds, 3600)
-    minutes, seconds = divmod(remainder, 60)
-    
-    if hours > 0:
-        return f"{int(hours)}h {int(minutes)}m"
-    elif minutes > 0:
-        return f"{int(minutes)}m {int(seconds)}s"
-    else:
-        return f"{int(seconds)}s"
+    if py_spy:
+        if shutil.which('py-spy'):
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            output = os.path.join(PROFILE_DIR, f'{progress.current_stage()}.speedscope.json')
+            command = f'py-spy record --subprocesses --format speedscope -o {shlex.quote(output)} -- {command}'
+        else:
+            print("py-spy not found on PATH, running without it")
+
+    fd, progress_path = tempfile.mkstemp(prefix='progress-', suffix='.jsonl')
+    os.close(fd)
+    env = dict(os.environ, **{progress.PROGRESS_FILE_ENV: progress_path})
+    stop = threading.Event()
+    follower = threading.Thread(target=progress.follow,
+                                args=(progress_path, progress.get_tracker(), progress.current_stage(), stop),
+                                daemon=True)
+    follower.start()
+    try:
+        result = subprocess.run(command, shell=True, env=env, text=True,
+                                stdout=None if debug else subprocess.PIPE, stderr=subprocess.PIPE)
+    finally:
+        stop.set()
+        follower.join()
+        os.remove(progress_path)
+
+    if result.returncode != 0 and result.stdout:
+        print(result.stdout)
+    if result.stderr:
+        print(f"ERRORS/WARNINGS:\n{result.stderr}")
+    return result.returncode == 0  # True if command succeeded
 
 def test_mongodb_connection():
     """Test MongoDB connection before starting the pipeline"""
@@ -168,13 +105,81 @@ def test_mongodb_connection():
         print(f"❌ MongoDB connection error: {str(e)}")
         return False
 
-def run_pipeline(process_all=False, debug=False, load_warehouse=False):
+def _require(ok, message):
+    if not ok:
+        raise RuntimeError(message)
+
+def build_stages(image_count, workers=1, rebuild=False, load_warehouse=False, etl_command=None,
+                 profile=False):
+    """Describe the pipeline as a DAG of stages for src.orchestrator.Pipeline.
+
+    The ETL stage returns the processed data as an Arrow table, which the
+    analysis and warehouse stages use directly instead of re-reading the
+    parquet file. Stages that draw with pyplot share the 'pyplot' lock
+    because pyplot keeps global state. With ``profile`` the ETL always
+    runs and records its per-image timing breakdown.
+    """
+    processed = 'data/processed/processed_data.parquet'
+    processed_test = 'data/processed_test/processed_data.parquet'
+
+    def etl(upstream):
+        return run_etl(sample=image_count, workers=workers, rebuild=rebuild, profile=profile)
+
+    def analysis(upstream):
+        table = upstream['etl']
+        _require(analyze_data('data/processed', 'data/analysis', table=table) is not None, "analysis failed")
+
+    def test_etl(upstream):
+        return run_etl('data/raw_test/images', 'data/raw_test/labels_test.csv', 'data/processed_test')
+
+    def test_analysis(upstream):
+        table = upstream['test_etl']
+        _require(analyze_data('data/processed_test', 'data/test_analysis', table=table) is not None,
+                 "test analysis failed")
+
+    def warehouse(upstream):
+        _require(load_to_warehouse('data/processed', table=upstream['etl']), "warehouse loading failed")
+
+    stages = [
+        Stage('etl', etl, inputs=('data/raw/labels.csv', 'src'), listings=('data/raw/images',),
+              outputs=(processed,), params={'sample': image_count}, command=etl_command, locks=('pyplot',),
+              always_run=rebuild or profile,
+              description='ETL PIPELINE EXECUTION'),
+        Stage('tests', deps=('etl',), inputs=('src', 'test', 'conftest.py'), command='python -m pytest',
+              description='TEST EXECUTION'),
+        Stage('analysis', analysis, deps=('etl', 'tests'), inputs=(processed, 'src'),
+              outputs=('data/analysis/data_summary.txt',), locks=('pyplot',),
+              command='python -m src.analyze_data --data-path data/processed --output-path data/analysis',
+              description='PRODUCTION DATA ANALYSIS'),
+        Stage('test_etl', test_etl, deps=('tests',), inputs=('data/raw_test/labels_test.csv', 'src'),
+              listings=('data/raw_test/images',), outputs=(processed_test,),
+              locks=('pyplot',), command='python -m src.etl_pipeline --test', description='TEST DATA CREATION'),
+        Stage('test_analysis', test_analysis, deps=('test_etl',), inputs=(processed_test, 'src'),
+              outputs=('data/test_analysis/data_summary.txt',), locks=('pyplot',),
+              command='python -m src.analyze_data --data-path data/processed_test --output-path data/test_analysis',
+              description='TEST DATA ANALYSIS'),
+    ]
+    if load_warehouse:
+        stages.append(Stage('warehouse', warehouse, deps=('etl', 'tests'), inputs=(processed,),
+                            command='python -m src.warehouse_loader --data-path data/processed',
+                            description='MONGODB DATA WAREHOUSE LOADING'))
+    return stages
+
+def run_pipeline(process_all=False, debug=False, load_warehouse=False, workers=1, rebuild=False,
+                 isolate=False, stage_workers=2, profile=None):
     """Run the entire ETL pipeline, tests, and analysis with progress tracking
     
     Args:
         process_all: Whether to process 1000 images or just 10
         debug: Whether to show debug output
         load_warehouse: Whether to load data to MongoDB data warehouse
+        workers: Number of OCR worker processes for the ETL step
+        rebuild: Ignore the ETL result cache and reprocess every image
+        isolate: Run each stage as a separate subprocess instead of in-process
+        stage_workers: Number of independent stages that may run at the same time
+        profile: None, 'timings' (per-image substage breakdown of the ETL),
+            'cprofile' (also cProfile every stage) or 'py-spy' (record every
+            stage subprocess with py-spy; implies isolate)
     """
     start_time = time.time()
     
@@ -191,77 +196,69 @@ def run_pipeline(process_all=False, debug=False, load_warehouse=False):
     os.makedirs('data/analysis', exist_ok=True)
     os.makedirs('data/test_analysis', exist_ok=True)
     
-    # Count images to provide estimate
-    image_count = 0
+    # Count images; throughput and ETA are measured once processing starts
+    image_count = 0 if process_all else 10
     try:
         if os.path.exists('data/raw/images'):
-            total_images = len(os.listdir('data/raw/images'))
+            # Cached between runs until the directory changes
+            total_images = count_images('data/raw/images')
             
             if not process_all:
                 print(f"\n🔍 Found {total_images} images, but will only process 10 images.")
                 image_count = 10
-                est_time = estimate_completion_time(image_count)
-                print(f"Estimated processing time: {est_time}")
             else:
                 # Cap at 1000 images
                 image_count = min(1000, total_images)
                 print(f"\n🔍 Processing {image_count} images out of {total_images} total images.")
-                est_time = estimate_completion_time(image_count)
-                print(f"Estimated processing time: {est_time}")
         else:
             print("⚠️ Image directory not found at data/raw/images")
     except Exception as e:
         print(f"Couldn't count images: {str(e)}")
     
-    # Step 1: Run ETL pipeline with progress bar
-    print("\n🔄 Running ETL pipeline...")
-    etl_command = 'python -m src.etl_pipeline'
-    
-    # Add sample flag based on processing mode
-    if not process_all:
-        etl_command += ' --sample 10'
-        long_running = False
-    else:
-        etl_command += f' --sample {image_count}'
-        long_running = True
-        
-    if run_command(etl_command, 'ETL PIPELINE EXECUTION', show_progress=True, debug=debug, long_running=long_running):
-        print("✅ ETL pipeline completed successfully")
-    else:
-        print("❌ ETL pipeline failed")
-        return False
-    
-    # Step 2: Run tests
-    print("\n🧪 Running tests...")
-    test_success = run_command('python -m pytest', 'TEST EXECUTION', debug=debug)
-    if test_success:
-        print("✅ All tests passed")
-    else:
-        print("❌ Some tests failed")
-        return False
-    
-    # Step 3: Analyze production data with progress bar
-    print("\n📊 Analyzing production data...")
-    if run_command('python -m src.analyze_data --data-path data/processed --output-path data/analysis', 
-                  'PRODUCTION DATA ANALYSIS', show_progress=True, debug=debug):
-        print("✅ Production data analysis completed")
-    else:
-        print("❌ Production data analysis failed")
-    
-    # Step 4: Create test data for analysis (small subset)
-    print("\n📊 Creating and analyzing test data...")
-    run_command('python -m src.etl_pipeline --test', 'TEST DATA CREATION', debug=debug)
-    run_command('python -m src.analyze_data --data-path data/processed_test --output-path data/test_analysis', 
-               'TEST DATA ANALYSIS', debug=debug)
-    
-    # Add MongoDB warehouse loading step
-    if load_warehouse:
-        print("\n📦 Loading data to MongoDB data warehouse...")
-        if run_command('python -m src.warehouse_loader --data-path data/processed', 
-                      'MONGODB DATA WAREHOUSE LOADING', show_progress=True, debug=debug):
-            print("✅ Data successfully loaded to MongoDB data warehouse")
-        else:
-            print("❌ MongoDB data warehouse loading failed")
+    # Build the stage DAG; every stage runs in-process unless isolate is set
+    if profile == 'cprofile' and stage_workers > 1:
+        # One profiled stage at a time, so stages don't distort each other's numbers
+        print("Profiling with cProfile: running one stage at a time")
+        stage_workers = 1
+    if profile == 'py-spy' and not isolate:
+        print("Profiling with py-spy: running each stage as a subprocess")
+        isolate = True
+
+    etl_command = f'python -m src.etl_pipeline --sample {image_count}'
+    if workers > 1:
+        etl_command += f' --workers {workers}'
+    if rebuild:
+        etl_command += ' --rebuild'
+    if profile:
+        etl_command += ' --profile'
+
+    def runner(command, description):
+        return run_command(command, description, debug=debug, py_spy=profile == 'py-spy')
+
+    pipeline = Pipeline(
+        build_stages(image_count, workers=workers, rebuild=rebuild, load_warehouse=load_warehouse,
+                     etl_command=etl_command, profile=bool(profile)),
+        max_workers=stage_workers, isolate=isolate, runner=runner,
+        profile_dir=PROFILE_DIR if profile == 'cprofile' else None,
+        show_progress=True, metrics_path=METRICS_PATH,
+    )
+    print(f"\n🔄 Running pipeline stages ({'subprocess' if isolate else 'in-process'}, "
+          f"up to {stage_workers} at a time)...")
+    results = pipeline.run()
+
+    print("\nStage summary:")
+    metrics = pipeline.tracker.snapshot()
+    for name, result in results.items():
+        icon = {'ok': '✅', 'skipped': '⏭️', 'failed': '❌', 'blocked': '⛔'}[result.status]
+        line = f"{icon} {name}: {result.status} ({result.seconds:.1f}s)"
+        stage_metrics = metrics.get(name)
+        if stage_metrics and stage_metrics['total']:
+            p90 = stage_metrics['latency_s']['p90']
+            line += (f", {stage_metrics['done']}/{stage_metrics['total']} {stage_metrics['unit']} "
+                     f"at {stage_metrics['rate_per_s']:.1f}/s")
+            if p90 is not None:
+                line += f", p90 {p90:.2f}s per {stage_metrics['unit']}"
+        print(line)
     
     total_time = time.time() - start_time
     minutes, seconds = divmod(total_time, 60)
@@ -270,14 +267,24 @@ def run_pipeline(process_all=False, debug=False, load_warehouse=False):
     print("\nOutput locations:")
     print("- Processed data: data/processed/")
     print("- Analysis results: data/analysis/")
+    print(f"- Stage metrics: {METRICS_PATH}")
     
-    return True
+    # ETL and tests are required; analysis and warehouse failures are reported above
+    return all(results[name].status in ('ok', 'skipped') for name in ('etl', 'tests'))
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run the ETL pipeline with options")
     parser.add_argument("--all", action="store_true", help="Process all images instead of just 10")
     parser.add_argument("--debug", action="store_true", help="Show debug output")
     parser.add_argument("--warehouse", action="store_true", help="Load data to MongoDB data warehouse")
+    parser.add_argument("--workers", type=int, default=1, help="Number of OCR worker processes for the ETL step")
+    parser.add_argument("--rebuild", action="store_true", help="Ignore cached ETL results and reprocess every image")
+    parser.add_argument("--isolate", action="store_true", help="Run each stage as a separate subprocess")
+    parser.add_argument("--stage-workers", type=int, default=2, help="Number of independent stages run concurrently")
+    parser.add_argument("--profile", nargs='?', const='timings', choices=['timings', 'cprofile', 'py-spy'],
+                        help="Time every ETL substage per image; 'cprofile' or 'py-spy' also profile each stage")
     args = parser.parse_args()
     
-    run_pipeline(process_all=args.all, debug=args.debug, load_warehouse=args.warehouse)
+    run_pipeline(process_all=args.all, debug=args.debug, load_warehouse=args.warehouse, workers=args.workers,
+                 rebuild=args.rebuild, isolate=args.isolate, stage_workers=args.stage_workers,
+                 profile=args.profile)
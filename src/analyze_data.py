@@ -1,129 +1,281 @@
 import os
+from dataclasses import dataclass, field
+from typing import Optional
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 import numpy as np
-from sklearn.feature_extraction.text import CountVectorizer
-from collections import Counter
-
-def load_processed_data(data_path):
-    """Load processed data from parquet or csv file"""
-    if os.path.exists(os.path.join(data_path, 'processed_data.parquet')):
-        return pd.read_parquet(os.path.join(data_path, 'processed_data.parquet'))
-    elif os.path.exists(os.path.join(data_path, 'processed_data.csv')):
-        return pd.read_csv(os.path.join(data_path, 'processed_data.csv'))
-    else:
-        raise FileNotFoundError(f"No processed data found in {data_path}")
+from src import charts, dataset
+from src.charts import Chart, bar_aggregate, histogram_panel
+from src.rollups import load_rollup
+from src.schema import image_dimensions
+from src.term_index import INDEX_FILENAME, TermIndex
 
-def analyze_data(data_path, output_path):
-    """Analyze processed data and create visualizations"""
-    # Create output directory if it doesn't exist
-    os.makedirs(output_path, exist_ok=True)
-    
-    # Load data
+# Label columns that can drive the sentiment chart, in order of preference
+SENTIMENT_COLUMNS = ['sentiment', 'overall_sentiment']
+
+# Every column compute_metrics can use; the histogram and OCR columns are never read
+ANALYSIS_COLUMNS = SENTIMENT_COLUMNS + ['text', 'height', 'width', 'image_size', 'duplicate_of']
+
+@dataclass
+class AnalysisResult:
+    """Metrics computed by compute_metrics, independent of any rendering.
+
+    Every per-row metric is a pandas Series aligned to the input rows.
+    Metrics answered from a rollup come as (values, rows) bins instead.
+    Fields stay None when the input has no column to derive them from.
+    """
+    record_count: int
+    columns: list
+    dtypes: pd.Series
+    sentiment_column: Optional[str] = None
+    sentiment_counts: Optional[pd.Series] = None
+    word_counts: Optional[pd.Series] = None
+    top_words: Optional[pd.DataFrame] = None
+    top_words_by_sentiment: dict = field(default_factory=dict)
+    heights: Optional[pd.Series] = None
+    widths: Optional[pd.Series] = None
+    word_count_bins: Optional[tuple] = None
+    height_bins: Optional[tuple] = None
+    width_bins: Optional[tuple] = None
+    duplicate_count: Optional[int] = None
+    canonical_count: Optional[int] = None
+    errors: dict = field(default_factory=dict)
+
+def load_processed_data(data_path, columns=None, filters=None):
+    """Load processed data from parquet or csv file
+
+    Args:
+        data_path: Processed data directory
+        columns: Columns to read (None for all); columns the file lacks are skipped
+        filters: Row filter pushed down to the parquet reader (see src.dataset)
+    """
+    return dataset.read_frame(data_path, columns, filters)
+
+def word_counts(text):
+    """Number of whitespace-separated words per row (0 for missing text)"""
+    return text.fillna('').astype(str).str.count(r'\S+').astype(np.int64)
+
+def top_words(term_index, k=20, group=None):
+    """Most frequent non-stopword terms as a DataFrame with word/count columns"""
+    return pd.DataFrame(term_index.top_k(k, group), columns=['word', 'count'])
+
+def load_term_index(data_path):
+    """Load the term index the ETL keeps next to the processed data.
+
+    Like rollups.load_rollup, None when there is no index or it was saved
+    for another version of the data file (see dataset.fingerprint); the
+    top words are then counted from the text instead.
+    """
+    path = os.path.join(data_path, INDEX_FILENAME)
+    if not os.path.exists(path):
+        return None
     try:
-        df = load_processed_data(data_path)
-        print(f"Loaded data with {len(df)} records")
-    except Exception as e:
-        print(f"Error loading data: {str(e)}")
-        return
-    
-    # Save data summary stats
+        index = TermIndex.load(path)
+        current = dataset.fingerprint(data_path)
+    except (OSError, ValueError, KeyError):
+        return None
+    return index if index.data == current else None
+
+def _rollup_bins(rollup, name):
+    values, rows = rollup.histogram(name)
+    return (values, rows) if len(values) else None
+
+def compute_metrics(df, k=20, term_index=None, rollup=None):
+    """Compute every analysis metric for a processed DataFrame.
+
+    All per-row work is vectorised pandas/NumPy; nothing here touches
+    matplotlib, so it can be timed on its own.
+
+    Args:
+        df: Processed data as produced by the ETL pipeline
+        k: Number of top words to keep
+        term_index: TermIndex to answer top-word queries from; when None
+            one is built from df's text in a single pass
+        rollup: src.rollups.Rollup of the data; when given, the record
+            count, sentiment counts and word count/image size histograms
+            come from it, and df only needs the columns for top words
+            (without a term index) and duplicates
+
+    Returns:
+        AnalysisResult
+    """
+    result = AnalysisResult(record_count=len(df) if rollup is None else rollup.rows,
+                            columns=list(df.columns), dtypes=df.dtypes)
+
+    if rollup is not None:
+        result.sentiment_column = next((c for c in SENTIMENT_COLUMNS if c in rollup.present), None)
+        if result.sentiment_column:
+            counts = rollup.distribution(result.sentiment_column)
+            result.sentiment_counts = pd.Series(counts, name='count').rename_axis(result.sentiment_column)
+        result.word_count_bins = _rollup_bins(rollup, 'word_count')
+        result.height_bins = _rollup_bins(rollup, 'height')
+        result.width_bins = _rollup_bins(rollup, 'width')
+    else:
+        result.sentiment_column = next((c for c in SENTIMENT_COLUMNS if c in df.columns), None)
+        if result.sentiment_column:
+            result.sentiment_counts = df[result.sentiment_column].value_counts()
+
+    if rollup is None and 'text' in df.columns:
+        result.word_counts = word_counts(df['text'])
+    # With a rollup the text is only read when there is no term index to ask
+    if 'text' in df.columns or (rollup is not None and term_index is not None):
+        try:
+            if term_index is None:
+                term_index = TermIndex()
+                groups = df[result.sentiment_column] if result.sentiment_column else None
+                term_index.update(df['text'], groups)
+            result.top_words = top_words(term_index, k)
+            for group in term_index.groups:
+                result.top_words_by_sentiment[group] = top_words(term_index, k, group)
+        except Exception as e:
+            result.errors['top_words'] = str(e)
+
+    if rollup is None and ({'height', 'width'} <= set(df.columns) or 'image_size' in df.columns):
+        try:
+            # Typed height/width columns, or the legacy image_size tuples
+            heights, widths = image_dimensions(df)
+            result.heights = heights.dropna()
+            result.widths = widths.dropna()
+        except Exception as e:
+            result.errors['image_size'] = str(e)
+
+    if 'duplicate_of' in df.columns:
+        duplicates = df['duplicate_of'].dropna()
+        result.duplicate_count = len(duplicates)
+        result.canonical_count = duplicates.nunique()
+
+    return result
+
+def write_summary(result, output_path):
+    """Write data_summary.txt for an AnalysisResult"""
     with open(os.path.join(output_path, 'data_summary.txt'), 'w') as f:
         f.write(f"Dataset Overview:\n")
-        f.write(f"Total records: {len(df)}\n")
-        f.write(f"Columns: {', '.join(df.columns)}\n\n")
-        
+        f.write(f"Total records: {result.record_count}\n")
+        f.write(f"Columns: {', '.join(result.columns)}\n\n")
+
         f.write("Data Types:\n")
-        f.write(str(df.dtypes))
+        f.write(str(result.dtypes))
         f.write("\n\n")
-        
+
         # If sentiment exists, capture distribution
-        if 'sentiment' in df.columns:
+        if result.sentiment_counts is not None:
             f.write("Sentiment Distribution:\n")
-            f.write(str(df['sentiment'].value_counts()))
+            f.write(str(result.sentiment_counts))
             f.write("\n\n")
-    
-    # Create visualizations
+
+        if result.duplicate_count:
+            f.write(f"Near-duplicates: {result.duplicate_count} records duplicate "
+                    f"{result.canonical_count} canonical images\n\n")
+
+        for group, words in sorted(result.top_words_by_sentiment.items()):
+            f.write(f"Top words ({group}): {', '.join(words['word'].head(10))}\n")
+
+def _panel(values, bins, count, title, xlabel):
+    """Histogram panel from per-row values, or from (values, rows) bins of a rollup"""
+    if values is not None:
+        return histogram_panel(values, count, title, xlabel)
+    return histogram_panel(bins[0], count, title, xlabel, weights=bins[1])
+
+def chart_specs(result):
+    """The analysis charts for an AnalysisResult, as charts.Chart aggregates"""
+    specs = []
     # 1. Sentiment distribution if available
-    if 'sentiment' in df.columns:
-        plt.figure(figsize=(10, 6))
-        sns.countplot(x='sentiment', data=df)
-        plt.title('Sentiment Distribution')
-        plt.savefig(os.path.join(output_path, 'sentiment_distribution.png'))
-        plt.close()
-    
+    if result.sentiment_counts is not None:
+        specs.append(Chart('sentiment_distribution.png', 'bar', bar_aggregate(
+            result.sentiment_counts.index, result.sentiment_counts.values, 'Sentiment Distribution')))
+
     # 2. Word count distribution from text
-    if 'text' in df.columns:
-        word_counts = df['text'].str.split().apply(lambda x: len(x) if isinstance(x, list) else 0)
-        plt.figure(figsize=(10, 6))
-        sns.histplot(word_counts, bins=30)
-        plt.title('Word Count Distribution')
-        plt.xlabel('Number of Words')
-        plt.savefig(os.path.join(output_path, 'word_count_distribution.png'))
-        plt.close()
-        
-        # 3. Most common words
-        try:
-            # Remove rows with empty text
-            text_data = df['text'].dropna()
-            vectorizer = CountVectorizer(stop_words='english')
-            X = vectorizer.fit_transform(text_data)
-            words = vectorizer.get_feature_names_out()
-            word_counts = X.sum(axis=0).A1
-            word_freq = pd.DataFrame({'word': words, 'count': word_counts})
-            top_words = word_freq.sort_values('count', ascending=False).head(20)
-            
-            plt.figure(figsize=(12, 8))
-            sns.barplot(x='count', y='word', data=top_words)
-            plt.title('Top 20 Words')
-            plt.tight_layout()
-            plt.savefig(os.path.join(output_path, 'top_words.png'))
-            plt.close()
-        except Exception as e:
-            print(f"Error creating word frequency chart: {str(e)}")
-    
+    if result.word_counts is not None or result.word_count_bins is not None:
+        specs.append(Chart('word_count_distribution.png', 'histogram', {'figsize': [10, 6], 'panels': [
+            _panel(result.word_counts, result.word_count_bins, 30, 'Word Count Distribution', 'Number of Words')]}))
+
+    # 3. Most common words
+    if 'top_words' in result.errors:
+        print(f"Error creating word frequency chart: {result.errors['top_words']}")
+    elif result.top_words is not None:
+        specs.append(Chart('top_words.png', 'bar', bar_aggregate(
+            result.top_words['word'], result.top_words['count'], 'Top 20 Words', xlabel='count',
+            horizontal=True, figsize=(12, 8))))
+
     # 4. Image size distribution if available
-    if 'image_size' in df.columns:
+    if 'image_size' in result.errors:
+        print(f"Error creating image size distribution: {result.errors['image_size']}")
+    elif (result.heights is not None and len(result.heights) and len(result.widths)) or \
+            (result.height_bins is not None and result.width_bins is not None):
+        specs.append(Chart('image_size_distribution.png', 'histogram', {'figsize': [12, 6], 'panels': [
+            _panel(result.heights, result.height_bins, 20, 'Image Height Distribution', 'Height (pixels)'),
+            _panel(result.widths, result.width_bins, 20, 'Image Width Distribution', 'Width (pixels)'),
+        ]}))
+    return specs
+
+def render_charts(result, output_path, workers=None):
+    """Render the analysis charts for an AnalysisResult into output_path.
+
+    Charts are drawn from small aggregates in parallel, and a chart whose
+    aggregate has not changed since it was last drawn is kept as it is.
+
+    Returns:
+        Dict {filename: 'rendered' or 'unchanged'}
+    """
+    status = charts.render_charts(chart_specs(result), output_path, workers=workers)
+    unchanged = sorted(name for name, state in status.items() if state == 'unchanged')
+    if unchanged:
+        print(f"Charts unchanged, kept: {', '.join(unchanged)}")
+    return status
+
+def analyze_data(data_path, output_path, df=None, table=None):
+    """Analyze processed data and create visualizations
+    
+    Args:
+        data_path: Processed data directory (also holds the term index)
+        output_path: Directory for the summary and charts
+        df: Already loaded processed data; read from data_path when None
+        table: Processed data as an Arrow table, used instead of reading
+            data_path; only the columns the analysis needs are converted
+    """
+    # Create output directory if it doesn't exist
+    os.makedirs(output_path, exist_ok=True)
+
+    # Load data
+    term_index = load_term_index(data_path)
+    rollup = schema = None
+    if df is None:
         try:
-            # Extract height and width from image_size
-            heights = []
-            widths = []
-            
-            for size in df['image_size']:
-                if isinstance(size, str):
-                    # Handle string representation of tuple
-                    size = eval(size)
-                if isinstance(size, tuple) and len(size) >= 2:
-                    heights.append(size[0])
-                    widths.append(size[1])
-            
-            if heights and widths:
-                fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 6))
-                ax1.hist(heights, bins=20)
-                ax1.set_title('Image Height Distribution')
-                ax1.set_xlabel('Height (pixels)')
-                
-                ax2.hist(widths, bins=20)
-                ax2.set_title('Image Width Distribution')
-                ax2.set_xlabel('Width (pixels)')
-                
-                plt.tight_layout()
-                plt.savefig(os.path.join(output_path, 'image_size_distribution.png'))
-                plt.close()
+            # Counts and histograms come from the rollup when it matches the data
+            rollup = load_rollup(data_path)
+            columns = ANALYSIS_COLUMNS
+            if rollup is not None:
+                columns = ['duplicate_of'] + ([] if term_index else SENTIMENT_COLUMNS + ['text'])
+            if table is not None:
+                df = dataset.to_frame(table, columns)
+                schema = table.schema
+            else:
+                df = load_processed_data(data_path, columns=columns)
+                schema = dataset.schema(data_path)
+                print(f"Loaded data with {len(df)} records" + (" (counts from rollups)" if rollup else ""))
         except Exception as e:
-            print(f"Error creating image size distribution: {str(e)}")
-    
+            print(f"Error loading data: {str(e)}")
+            return
+
+    result = compute_metrics(df, term_index=term_index, rollup=rollup)
+    if schema is not None:
+        # Only the analysis columns were read, but the summary lists them all,
+        # with the pandas dtypes reading the whole file would have given
+        empty = schema.empty_table().to_pandas()
+        result.columns = list(empty.columns)
+        result.dtypes = empty.dtypes
+    write_summary(result, output_path)
+    render_charts(result, output_path)
+
     print(f"Analysis complete. Results saved to {output_path}")
     return df
 
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description='Analyze processed data')
-    parser.add_argument('--data-path', type=str, default='data/processed', 
+    parser.add_argument('--data-path', type=str, default='data/processed',
                         help='Path to processed data directory')
-    parser.add_argument('--output-path', type=str, default='data/analysis', 
+    parser.add_argument('--output-path', type=str, default='data/analysis',
                         help='Path to save analysis results')
     args = parser.parse_args()
-    
+
     analyze_data(args.data_path, args.output_path)
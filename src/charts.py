@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+import numpy as np
+
+# Bump when a renderer changes how it draws, so every chart is drawn again
+CHART_VERSION = 1
+
+# PNG text chunk holding the fingerprint of the aggregate a chart was drawn from
+FINGERPRINT_KEY = 'aggregate-fingerprint'
+
+# Fewer charts than this are drawn in-process: a chart takes about a tenth of
+# a second, about what starting a worker and setting up matplotlib in it costs
+POOL_MIN_CHARTS = 8
+
+@dataclass
+class Chart:
+    """One figure to draw: a renderer name plus the small aggregate it plots.
+
+    Aggregates are plain lists/strings/numbers (bar labels and heights,
+    histogram edges and counts), never the raw rows, so they are cheap to
+    fingerprint and to ship to a worker process.
+
+    Attributes:
+        filename: PNG file name inside the output directory
+        kind: 'bar' or 'histogram' (see RENDERERS)
+        data: Aggregate for the renderer
+    """
+    filename: str
+    kind: str
+    data: dict
+
+    def fingerprint(self):
+        payload = json.dumps({'version': CHART_VERSION, 'kind': self.kind, 'data': self.data},
+                             sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+def bar_aggregate(labels, values, title, xlabel=None, ylabel=None, horizontal=False, figsize=(10, 6)):
+    """Aggregate for a bar chart, e.g. from a value_counts() Series"""
+    return {'labels': [str(label) for label in labels], 'values': [float(value) for value in values],
+            'title': title, 'xlabel': xlabel, 'ylabel': ylabel, 'horizontal': horizontal,
+            'figsize': list(figsize)}
+
+def histogram_panel(values, bins, title, xlabel=None, weights=None):
+    """One histogram panel: bin edges and counts computed with NumPy.
+
+    With weights, each value stands for that many rows, e.g. the bins of a
+    pre-counted histogram (see src.rollups).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    keep = ~np.isnan(values)
+    if weights is not None:
+        weights = np.asarray(weights, dtype=np.float64)[keep]
+    counts, edges = np.histogram(values[keep], bins=bins, weights=weights)
+    return {'counts': counts.astype(np.int64).tolist(), 'edges': edges.tolist(), 'title': title, 'xlabel': xlabel}
+
+def _render_bar(plt, data):
+    fig, ax = plt.subplots(figsize=data['figsize'])
+    if data['horizontal']:
+        # First label on top, like a ranked list
+        ax.barh(data['labels'][::-1], data['values'][::-1])
+    else:
+        ax.bar(data['labels'], data['values'])
+        plt.setp(ax.get_xticklabels(), rotation=45, ha='right')
+    ax.set_title(data['title'])
+    if data['xlabel']:
+        ax.set_xlabel(data['xlabel'])
+    if data['ylabel']:
+        ax.set_ylabel(data['ylabel'])
+    return fig
+
+def _render_histogram(plt, data):
+    panels = data['panels']
+    fig, axes = plt.subplots(1, len(panels), figsize=data.get('figsize', (6 * len(panels), 6)), squeeze=False)
+    for ax, panel in zip(axes[0], panels):
+        edges = np.asarray(panel['edges'])
+        # Weighted bin starts redraw exactly the histogram of the original values
+        ax.hist(edges[:-1], bins=edges, weights=panel['counts'])
+        ax.set_title(panel['title'])
+        if panel['xlabel']:
+            ax.set_xlabel(panel['xlabel'])
+    return fig
+
+RENDERERS = {'bar': _render_bar, 'histogram': _render_histogram}
+
+def png_text(path):
+    """tEXt chunks of a PNG file as a dict (empty when missing or not a PNG)"""
+    text = {}
+    try:
+        with open(path, 'rb') as f:
+            if f.read(8) != b'\x89PNG\r\n\x1a\n':
+                return text
+            while True:
+                header = f.read(8)
+                if len(header) < 8:
+                    break
+                length, kind = struct.unpack('>I4s', header)
+                if kind == b'IDAT':
+                    # Matplotlib writes text chunks before the image data
+                    break
+                body = f.read(length)
+                f.seek(4, os.SEEK_CUR)
+                if kind == b'tEXt':
+                    key, _, value = body.partition(b'\x00')
+                    text[key.decode('latin-1')] = value.decode('latin-1')
+                elif kind == b'zTXt':
+                    key, _, value = body.partition(b'\x00')
+                    text[key.decode('latin-1')] = zlib.decompress(value[1:]).decode('latin-1')
+    except OSError:
+        pass
+    return text
+
+def is_current(chart, output_dir):
+    """True when the chart's PNG was drawn from the same aggregate"""
+    return png_text(os.path.join(output_dir, chart.filename)).get(FINGERPRINT_KEY) == chart.fingerprint()
+
+def render(chart, output_dir):
+    """Draw one chart and save it with its fingerprint in the PNG metadata"""
+    from src.plotting import pyplot
+    plt = pyplot()
+    path = os.path.join(output_dir, chart.filename)
+    fig = RENDERERS[chart.kind](plt, chart.data)
+    fig.tight_layout()
+    tmp_path = path + '.tmp'
+    fig.savefig(tmp_path, format='png', metadata={FINGERPRINT_KEY: chart.fingerprint()})
+    plt.close(fig)
+    os.replace(tmp_path, path)
+    return chart.filename
+
+def render_charts(charts, output_dir, workers=None, force=False):
+    """Draw every chart whose PNG is missing or was drawn from a different aggregate.
+
+    When at least POOL_MIN_CHARTS charts need drawing they are rendered
+    in a process pool (up to ``workers`` processes, default one per chart
+    and CPU), since each figure is CPU-bound matplotlib work. Fewer charts,
+    or workers=1, are drawn in-process.
+
+    Args:
+        charts: List of Chart objects
+        output_dir: Directory the PNGs are written to
+        workers: Maximum number of rendering processes
+        force: Draw every chart even when it is unchanged
+
+    Returns:
+        Dict {filename: 'rendered' or 'unchanged'}
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    status = {}
+    todo = []
+    for chart in charts:
+        if not force and is_current(chart, output_dir):
+            status[chart.filename] = 'unchanged'
+        else:
+            todo.append(chart)
+
+    workers = min(workers or os.cpu_count() or 1, len(todo))
+    if workers <= 1 or len(todo) < POOL_MIN_CHARTS:
+        for chart in todo:
+            status[render(chart, output_dir)] = 'rendered'
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for filename in pool.map(render, todo, [output_dir] * len(todo)):
+                status[filename] = 'rendered'
+    return status
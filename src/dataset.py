@@ -0,0 +1,153 @@
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow import fs
+
+# File names the ETL writes into its output directory
+PARQUET_NAME = 'processed_data.parquet'
+CSV_NAME = 'processed_data.csv'
+
+# Default ETL output directory, relative to the project root
+DATA_DIR = 'data/processed'
+
+def data_file(data_path=DATA_DIR):
+    """Path of the processed data in data_path (parquet preferred over the CSV fallback).
+
+    data_path can also name the file itself.
+
+    Raises:
+        FileNotFoundError: when there is no processed data
+    """
+    if os.path.isfile(data_path):
+        return data_path
+    for name in (PARQUET_NAME, CSV_NAME):
+        path = os.path.join(data_path, name)
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(f"No processed data found in {data_path}")
+
+def fingerprint(data_path=DATA_DIR):
+    """Name, size and modification time of the processed data file.
+
+    Every ETL run writes a new file and moves it into place, so artifacts
+    derived from the data (rollups, the term index) store this to tell
+    whether they still describe it, without reading a single row.
+    """
+    path = data_file(data_path)
+    stat = os.stat(path)
+    return [os.path.basename(path), stat.st_size, stat.st_mtime_ns]
+
+def _is_parquet(path):
+    return not path.endswith('.csv')
+
+def schema(data_path=DATA_DIR):
+    """Arrow schema of the processed data, read from the parquet footer (or inferred from the CSV head)"""
+    path = data_file(data_path)
+    if _is_parquet(path):
+        return pq.read_schema(path, memory_map=True)
+    return pa.Schema.from_pandas(pd.read_csv(path, nrows=1000), preserve_index=False)
+
+def columns(data_path=DATA_DIR):
+    """Column names of the processed data"""
+    return schema(data_path).names
+
+def _projection(names, wanted):
+    """The wanted columns the file has, in the order asked for (None reads every column)"""
+    if wanted is None:
+        return None
+    return [name for name in dict.fromkeys(wanted) if name in names]
+
+def _expression(filters):
+    """A pyarrow Expression from filters given as an Expression or in DNF list form.
+
+    The list form is the one pyarrow.parquet uses, e.g.
+    [('overall_sentiment', '=', 'positive'), ('height', '>', 200)] for an
+    AND, or a list of such lists for an OR of ANDs.
+    """
+    if filters is None or isinstance(filters, ds.Expression):
+        return filters
+    return pq.filters_to_expression(filters)
+
+def _dataset(path):
+    # Memory-mapped local files: row groups are decoded straight from the page cache
+    return ds.dataset(path, format='parquet', filesystem=fs.LocalFileSystem(use_mmap=True))
+
+def read_table(data_path=DATA_DIR, columns=None, filters=None):
+    """Read the processed data as a pyarrow Table, projected and filtered.
+
+    Only the requested columns are decoded (the 256-wide histogram is never
+    touched unless asked for), and filters are pushed down so row groups
+    whose statistics rule them out are skipped. Requested columns the file
+    does not have are left out rather than raising, so callers can ask for
+    every column they know how to use.
+
+    Args:
+        data_path: Processed data directory or file
+        columns: Column names to read (None for all)
+        filters: Row filter as a pyarrow Expression or DNF list (see _expression)
+
+    Returns:
+        pyarrow.Table backed by a memory-mapped file for parquet input
+    """
+    path = data_file(data_path)
+    expression = _expression(filters)
+    if _is_parquet(path):
+        dataset = _dataset(path)
+        return dataset.to_table(columns=_projection(dataset.schema.names, columns), filter=expression)
+
+    # CSV fallback: no pushdown, but the same projection and filter semantics
+    table = pa.Table.from_pandas(pd.read_csv(path), preserve_index=False)
+    if expression is not None:
+        table = table.filter(expression)
+    projection = _projection(table.column_names, columns)
+    return table if projection is None else table.select(projection)
+
+def to_frame(table, columns=None, arrow_dtypes=True):
+    """Convert an Arrow table (or the given columns of it) to a pandas DataFrame.
+
+    With arrow_dtypes the columns keep their Arrow buffers (pd.ArrowDtype)
+    instead of being copied into NumPy/object arrays, which matters most
+    for the text column.
+    """
+    projection = _projection(table.column_names, columns)
+    if projection is not None:
+        table = table.select(projection)
+    return table.to_pandas(types_mapper=pd.ArrowDtype if arrow_dtypes else None)
+
+def read_frame(data_path=DATA_DIR, columns=None, filters=None, arrow_dtypes=True):
+    """read_table as a pandas DataFrame (see to_frame)"""
+    return to_frame(read_table(data_path, columns, filters), arrow_dtypes=arrow_dtypes)
+
+def count_rows(data_path=DATA_DIR, filters=None):
+    """Number of rows, or of rows matching filters; unfiltered counts come from the footer"""
+    path = data_file(data_path)
+    if _is_parquet(path):
+        return _dataset(path).count_rows(filter=_expression(filters))
+    return read_table(path, columns=[], filters=filters).num_rows
+
+def iter_batches(data_path=DATA_DIR, columns=None, filters=None, batch_size=1000):
+    """Stream the processed data as pyarrow RecordBatches of up to batch_size rows.
+
+    Parquet is scanned row group by row group from the memory-mapped file,
+    with the same projection and filter pushdown as read_table, so only
+    one batch of the requested columns is decoded at a time. CSV input is
+    read in chunks of batch_size.
+    """
+    path = data_file(data_path)
+    expression = _expression(filters)
+    if _is_parquet(path):
+        dataset = _dataset(path)
+        yield from dataset.to_batches(columns=_projection(dataset.schema.names, columns), filter=expression,
+                                      batch_size=batch_size)
+        return
+
+    for chunk in pd.read_csv(path, chunksize=batch_size):
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if expression is not None:
+            table = table.filter(expression)
+        projection = _projection(table.column_names, columns)
+        if projection is not None:
+            table = table.select(projection)
+        yield from table.to_batches()
@@ -0,0 +1,196 @@
+import cv2
+import numpy as np
+from src.text_regions import find_text_regions
+
+HASH_METHODS = ('ahash', 'dhash', 'phash')
+
+# Widest scale text regions are compared at; images are never upscaled for it
+TEXT_WIDTH = 320
+
+# Share of the text region pixels whose ink may differ between duplicates
+TEXT_MAX_DIFFERENCE = 0.004
+
+def _gray(path, reduced=True):
+    """Decode an image as grayscale; JPEGs are decoded at reduced size, which is all a hash needs"""
+    buf = np.fromfile(path, dtype=np.uint8)
+    img = cv2.imdecode(buf, cv2.IMREAD_REDUCED_GRAYSCALE_4) if reduced else None
+    if img is None or min(img.shape) < 8:
+        img = cv2.imdecode(buf, cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        raise ValueError("could not decode image")
+    return img
+
+def _bits_to_int(bits):
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), 'big')
+
+def ahash(gray):
+    """64-bit average hash: 8x8 thumbnail thresholded at its mean"""
+    small = cv2.resize(gray, (8, 8), interpolation=cv2.INTER_AREA).astype(np.float32)
+    return _bits_to_int(small > small.mean())
+
+def dhash(gray):
+    """64-bit difference hash: sign of horizontal gradients of a 9x8 thumbnail"""
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+    return _bits_to_int(small[:, 1:] > small[:, :-1])
+
+def phash(gray):
+    """64-bit perceptual hash: low-frequency 8x8 DCT block thresholded at its median.
+
+    Robust to recompression, resizing and small colour changes, which is
+    what reposted memes go through.
+    """
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8]
+    # The DC term only encodes overall brightness
+    return _bits_to_int(low > np.median(low.ravel()[1:]))
+
+def image_hash(path, method='phash'):
+    """Perceptual hash of an image file as a 64-bit int"""
+    if method not in HASH_METHODS:
+        raise ValueError(f"Unknown hash method '{method}', choose one of: {', '.join(HASH_METHODS)}")
+    return globals()[method](_gray(path))
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+def _ink(gray):
+    _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    return mask
+
+def text_difference(first, second):
+    """Share of the text region pixels of two grayscale images whose ink differs.
+
+    Memes made from the same template hash alike whatever their caption,
+    so this compares the captions themselves: both images are scaled to
+    the same size (no wider than TEXT_WIDTH or either image), the text
+    regions of the first are binarised in both, and differences thinner
+    than 3 pixels, which is what resizing and recompression leave, are
+    dropped. A repost scores close to 0, a different caption does not.
+    """
+    width = min(TEXT_WIDTH, first.shape[1], second.shape[1])
+    size = (width, max(1, round(first.shape[0] * width / first.shape[1])))
+    first = cv2.resize(first, size, interpolation=cv2.INTER_AREA)
+    second = cv2.resize(second, size, interpolation=cv2.INTER_AREA)
+    kernel = np.ones((3, 3), np.uint8)
+
+    differing = area = 0
+    for x, y, w, h in find_text_regions(first):
+        changed = cv2.bitwise_xor(_ink(first[y:y + h, x:x + w]), _ink(second[y:y + h, x:x + w]))
+        differing += cv2.countNonZero(cv2.morphologyEx(changed, cv2.MORPH_OPEN, kernel))
+        area += w * h
+    return differing / max(area, 1)
+
+def _text_image(gray):
+    """A grayscale image scaled to at most TEXT_WIDTH wide, all text_difference looks at"""
+    if gray.shape[1] <= TEXT_WIDTH:
+        return gray
+    height = max(1, round(gray.shape[0] * TEXT_WIDTH / gray.shape[1]))
+    return cv2.resize(gray, (TEXT_WIDTH, height), interpolation=cv2.INTER_AREA)
+
+class BKTree:
+    """Burkhard-Keller tree over 64-bit hashes for Hamming-radius queries.
+
+    Each child edge is labelled with its distance to the parent, so by the
+    triangle inequality a query only descends into children whose label is
+    within max_distance of its own distance to the node.
+    """
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, value, item):
+        node = [value, item, {}]
+        self.size += 1
+        if self.root is None:
+            self.root = node
+            return
+        current = self.root
+        while True:
+            distance = hamming(value, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def search(self, value, max_distance):
+        """All (distance, item) pairs within max_distance, closest first"""
+        if self.root is None:
+            return []
+        found = []
+        todo = [self.root]
+        while todo:
+            node = todo.pop()
+            distance = hamming(value, node[0])
+            if distance <= max_distance:
+                found.append((distance, node[1]))
+            for edge, child in node[2].items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    todo.append(child)
+        return sorted(found, key=lambda pair: pair[0])
+
+class DuplicateIndex:
+    """Groups images into canonical originals and their near-duplicates.
+
+    Images are added in order; the first image of a group is canonical and
+    every later image within max_distance of a canonical hash points to the
+    closest one whose text regions also match (see text_difference).
+
+    Args:
+        max_distance: Largest Hamming distance (out of 64 bits) counted as a duplicate
+        method: 'phash', 'dhash' or 'ahash'
+        check_text: Compare the text regions of hash matches before grouping them
+    """
+
+    def __init__(self, max_distance=6, method='phash', check_text=True):
+        self.max_distance = max_distance
+        self.method = method
+        self.check_text = check_text
+        self.tree = BKTree()
+        self.hashes = {}
+        self.duplicate_of = {}
+        # Canonical path -> its _text_image, kept once a canonical has been decoded
+        self.text_images = {}
+
+    def add(self, path, value=None):
+        """Index an image and return the canonical image it duplicates, or None"""
+        value = image_hash(path, self.method) if value is None else value
+        self.hashes[path] = value
+        # Only hash matches pay for a full decode, and each canonical only once
+        gray = None
+        for _, canonical in self.tree.search(value, self.max_distance):
+            if self.check_text:
+                gray = _text_image(_gray(path, reduced=False)) if gray is None else gray
+                if text_difference(self._canonical_text_image(canonical), gray) > TEXT_MAX_DIFFERENCE:
+                    continue
+            self.duplicate_of[path] = canonical
+            return canonical
+        self.tree.add(value, path)
+        if gray is not None:
+            self.text_images[path] = gray
+        return None
+
+    def _canonical_text_image(self, path):
+        image = self.text_images.get(path)
+        if image is None:
+            image = self.text_images[path] = _text_image(_gray(path, reduced=False))
+        return image
+
+def find_duplicates(image_paths, max_distance=6, method='phash', check_text=True):
+    """Map every near-duplicate image path to its canonical image path.
+
+    Images that cannot be decoded are left out; transform reports them.
+    With check_text, images that share a template but not a caption stay
+    separate.
+
+    Returns:
+        Dict {duplicate path: canonical path}
+    """
+    index = DuplicateIndex(max_distance, method, check_text)
+    for path in image_paths:
+        try:
+            index.add(path)
+        except (OSError, ValueError, cv2.error):
+            continue
+    return index.duplicate_of
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+def file_digest(path, block_size=1 << 20):
+    """Return the sha256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def fingerprint(config):
+    """Hash a JSON-serialisable config dict into a short stable string"""
+    payload = json.dumps(config, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+class ResultCache:
+    """Persistent per-image result cache for the ETL transform step.
+
+    Entries are keyed by the image's content hash plus a fingerprint of the
+    OCR/pipeline configuration, so renamed files still hit and any change to
+    Tesseract or the transform settings invalidates everything at once.
+    The cache is capped at ``max_bytes``; least recently used entries are
+    evicted first.
+
+    Args:
+        path: SQLite database file (parent directories are created)
+        config_fingerprint: Fingerprint of the settings that produced the results
+        max_bytes: Upper bound on the total size of stored records
+        read: Set to False to only write results (used for --rebuild)
+    """
+
+    def __init__(self, path, config_fingerprint, max_bytes=512 * 1024 * 1024, read=True):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.config_fingerprint = config_fingerprint
+        self.max_bytes = max_bytes
+        self.read = read
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS results ('
+            ' key TEXT PRIMARY KEY,'
+            ' record TEXT NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' last_used REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)')
+
+    def _key(self, content_hash):
+        return f"{content_hash}:{self.config_fingerprint}"
+
+    def get(self, content_hash):
+        """Return the cached record for this content, or None"""
+        if not self.read:
+            self.misses += 1
+            return None
+        key = self._key(content_hash)
+        row = self._conn.execute('SELECT record FROM results WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self._conn.execute('UPDATE results SET last_used = ? WHERE key = ?', (time.time(), key))
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, content_hash, record):
+        """Store a JSON-serialisable record for this content"""
+        payload = json.dumps(record)
+        self._conn.execute(
+            'INSERT OR REPLACE INTO results (key, record, size, last_used) VALUES (?, ?, ?, ?)',
+            (self._key(content_hash), payload, len(payload), time.time())
+        )
+
+    def total_bytes(self):
+        return self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes.
+
+        Returns:
+            Number of evicted entries
+        """
+        excess = self.total_bytes() - self.max_bytes
+        if excess <= 0:
+            return 0
+        evicted = 0
+        freed = 0
+        rows = self._conn.execute('SELECT key, size FROM results ORDER BY last_used').fetchall()
+        for key, size in rows:
+            if freed >= excess:
+                break
+            self._conn.execute('DELETE FROM results WHERE key = ?', (key,))
+            freed += size
+            evicted += 1
+        return evicted
+
+    def close(self):
+        self.evict()
+        self._conn.commit()
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -2,108 +2,735 @@
 import os
 import pandas as pd
 import cv2
-import pytesseract
-from PIL import Image
 import numpy as np
-import matplotlib.pyplot as plt
-from tqdm import tqdm
 import sys
-import platform
+import time
+import itertools
+from dataclasses import dataclass, asdict, field
+from typing import Optional
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, as_completed, wait
+import pyarrow.parquet as pq
+from src import dataset, progress
+from src.profiling import NULL_STOPWATCH, ProfileBuffer, stopwatch
+from src.dedup import find_duplicates
+from src.etl_cache import ResultCache, file_digest, fingerprint
+from src.image_source import LABEL_KEY, ImageSource, read_labels
+from src.ocr import OcrConfig, get_engine, resolve_engine, tesseract_version
+from src.charts import Chart, bar_aggregate, render_charts
+from src.parquet_writer import ParquetChunkWriter
+from src.rollups import Rollup, build_rollup, load_rollup, open_rollup, save_rollup
+from src.schema import HISTOGRAM_BINS, frame_to_table
+from src.shards import MANIFEST_NAME, merge_shards, parse_shard, shard_dir, write_manifest
+from src.text_regions import coverage, find_text_regions, stack_regions
+from src.term_index import TermIndex, open_term_index, save_term_index, term_index_path, update_from_parquet
 
-# Only set the tesseract path on Windows
-if platform.system() == 'Windows':
-    pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+# Bump whenever process_image changes what it returns, so cached results are invalidated
+ETL_VERSION = 5
 
-def extract(image_dir, labels_path):
-    # Load labels
-    labels = pd.read_csv(labels_path)
-    
-    # Get image paths
-    image_paths = [os.path.join(image_dir, fname) for fname in os.listdir(image_dir)]
-    
+# Fields a near-duplicate copies from its canonical image instead of running OCR
+OCR_FIELDS = ('text', 'ocr_confidence', 'ocr_coverage')
+
+@dataclass(frozen=True)
+class TransformOptions:
+    """Per-image processing settings, shipped to every worker process.
+
+    Attributes:
+        ocr_preprocess: OCR a grayscale, downscaled copy instead of the full colour image
+        ocr_max_side: Longest side in pixels of the OCR input when ocr_preprocess is on
+        ocr_engine: 'tesserocr' (Tesseract kept loaded in every worker), 'pytesseract'
+            (one tesseract process per image) or 'auto' (tesserocr when installed)
+        ocr: Language, page segmentation mode and character whitelist for Tesseract
+        ocr_regions: Only OCR likely caption regions, found with 'contours' (text
+            lines anywhere) or 'bands' (top and bottom quarter); None OCRs everything
+    """
+    ocr_preprocess: bool = False
+    ocr_max_side: int = 1600
+    ocr_engine: str = 'auto'
+    ocr: OcrConfig = field(default_factory=OcrConfig)
+    ocr_regions: Optional[str] = None
+
+def config_fingerprint(options=None):
+    """Fingerprint of everything that affects a processed record besides the image itself"""
+    options = asdict(options or TransformOptions())
+    # The backend 'auto' ends up with, since the two can segment text differently
+    options['ocr_engine'] = resolve_engine(options['ocr_engine'])
+    return fingerprint({
+        'etl_version': ETL_VERSION,
+        'tesseract': tesseract_version(),
+        'options': options,
+    })
+
+def open_cache(cache_dir='data/cache', max_mb=512, rebuild=False, options=None):
+    """Open the persistent transform result cache.
+
+    With rebuild=True the cache is only written to, so every image is
+    processed again and the fresh results replace the stored ones.
+    """
+    return ResultCache(os.path.join(cache_dir, 'etl_results.sqlite'), config_fingerprint(options),
+                       max_bytes=max_mb * 1024 * 1024, read=not rebuild)
+
+def index_labels(labels):
+    """Index a labels DataFrame by image file name for the join in transform.
+
+    Column names are stripped of whitespace and the rows get a hash index
+    on the image_name column, so looking up an image's labels is O(1) and
+    independent of file listing order. When a name appears more than once
+    the first row wins. Labels without an image_name column are returned
+    as they are and joined by position.
+    """
+    if labels.index.name == LABEL_KEY:
+        return labels
+    labels = labels.rename(columns=lambda column: str(column).strip())
+    if LABEL_KEY not in labels.columns:
+        return labels
+    repeated = labels[LABEL_KEY].duplicated()
+    if repeated.any():
+        print(f"Warning: {int(repeated.sum())} repeated {LABEL_KEY} rows in the labels, keeping the first",
+              flush=True)
+        labels = labels[~repeated]
+    return labels.set_index(pd.Index(labels[LABEL_KEY].astype(str), name=LABEL_KEY))
+
+def extract(image_dir, labels_path, sample=None, pattern=None, count_cache=None, shard=None):
+    """Find the images and read their labels.
+
+    The images come back as a lazy ImageSource over the directory; nothing
+    is listed until the transform starts pulling paths. With ``sample``
+    only the first ``sample`` files are listed, and only their label rows
+    are kept while the labels CSV is read in chunks.
+
+    Args:
+        image_dir: Directory holding the images
+        labels_path: Labels CSV with an image_name column
+        sample: Optional number of images to take
+        pattern: Optional glob on the image file names, e.g. 'image_1*.jpg'
+        count_cache: JSON file caching the image count between runs, e.g.
+            src.image_source.COUNT_CACHE (None keeps it in memory)
+        shard: Optional (index, count); only that shard's images and labels (see src.shards)
+
+    Returns:
+        (image_paths, labels) - an ImageSource (a list of paths with
+        ``sample``) and the labels indexed by image name
+    """
+    image_paths = ImageSource(image_dir, pattern, count_cache=count_cache, shard=shard)
+    names = None
+    if sample:
+        image_paths = image_paths.head(sample)
+        names = [os.path.basename(path) for path in image_paths]
+
+    # Load labels, indexed by image file name
+    labels = index_labels(read_labels(labels_path, names, shard=shard))
     return image_paths, labels
 
-def transform(image_paths, labels):
-    processed_data = []
-    total_images = len(image_paths)
-    
-    # Use tqdm to show real progress for each image
-    for idx, path in enumerate(tqdm(image_paths, desc="Processing images", unit="img")):
-        try:
-            # Print progress for EACH image with explicit formatting for better visibility
-            progress_msg = f"Processing image {idx+1}/{total_images} ({(idx+1)/total_images*100:.1f}%)"
-            print(progress_msg, flush=True)  # Use print instead of tqdm.write with flush=True
-            sys.stdout.flush()  # Force flush stdout to ensure immediate display
-                
-            # Image processing
-            img = cv2.imread(path)
-            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            
+def unmatched_labels(labels, image_paths):
+    """Image names that have a label row but no image among image_paths"""
+    if labels.index.name != LABEL_KEY:
+        return []
+    names = {os.path.basename(path) for path in image_paths}
+    return [name for name in labels.index if name not in names]
+
+def decode_image(path):
+    """Read an image file once and decode it to a BGR ndarray"""
+    buf = np.fromfile(path, dtype=np.uint8)
+    img = cv2.imdecode(buf, cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("could not decode image")
+    return img
+
+def color_histogram(img):
+    """256-bin histogram of the red channel (index 2 in BGR) of a decoded image"""
+    return cv2.calcHist([img], [2], None, [HISTOGRAM_BINS], [0, 256]).ravel().astype(np.uint32)
+
+def ocr_input(img, options):
+    """Build the array handed to Tesseract from the decoded BGR image.
+
+    Without preprocessing this is a channel-reversed view (RGB order, no
+    copy). With preprocessing it is a grayscale image whose longest side is
+    at most options.ocr_max_side, which is far cheaper to OCR.
+    """
+    if not options.ocr_preprocess:
+        return img[:, :, ::-1]
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    height, width = gray.shape
+    scale = options.ocr_max_side / max(height, width)
+    if scale < 1:
+        gray = cv2.resize(gray, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+    return gray
+
+def process_image(path, options=None, watch=NULL_STOPWATCH, reuse=None):
+    """Decode, OCR and compute metrics for a single image.
+
+    The file is read and decoded exactly once; OCR, the histogram and the
+    size metrics all work from that one ndarray. With ``reuse`` (the
+    record of the image this one duplicates) OCR is skipped and the text
+    fields are copied from it.
+
+    Runs inside worker processes when transform is parallel, so it never
+    prints or raises: failures come back as an error string instead.
+
+    Args:
+        path: Image file path
+        options: TransformOptions (defaults to TransformOptions())
+        watch: Stopwatch timing the substages (the default does nothing)
+        reuse: Optional record whose text, ocr_confidence and ocr_coverage are reused
+
+    Returns:
+        (record, error) tuple - record is None when error is set
+    """
+    options = options or TransformOptions()
+    try:
+        # Image processing (BGR channel order, as decoded by OpenCV)
+        img = decode_image(path)
+        watch.lap('decode')
+
+        if reuse is not None:
+            text = {key: reuse[key] for key in OCR_FIELDS}
+        else:
             # OCR text extraction
-            text = pytesseract.image_to_string(Image.open(path))
-            
-            # Basic image metrics
-            hist = cv2.calcHist([img], [0], None, [256], [0, 256])
-            
-            processed_data.append({
-                'image_path': path,
-                'text': text.strip(),
-                'image_size': img.shape,
-                'histogram': hist.flatten().tolist(),
-                **labels.iloc[idx].to_dict()
-            })
-            
-            # Print completion message for this image - replaced Unicode checkmark with ASCII
-            print(f"[OK] Completed image {idx+1}/{total_images}", flush=True)
-            sys.stdout.flush()
-            
-        except Exception as e:
-            print(f"Error processing {path} ({idx+1}/{total_images}): {str(e)}", flush=True)
-            sys.stdout.flush()
-    
-    # Create DataFrame and clean column namesz
+            ocr_image = ocr_input(img, options)
+            ocr_coverage = 1.0
+            if options.ocr_regions:
+                # All caption crops go to Tesseract together, stacked into one image
+                boxes = find_text_regions(ocr_image, options.ocr_regions)
+                ocr_coverage = coverage(boxes, ocr_image.shape)
+                ocr_image = stack_regions(ocr_image, boxes)
+            watch.lap('ocr_prep')
+            ocr = get_engine(options.ocr_engine, options.ocr).recognize(ocr_image)
+            watch.lap('ocr')
+            text = {'text': ocr.text.strip(), 'ocr_confidence': ocr.confidence, 'ocr_coverage': ocr_coverage}
+
+        # Basic image metrics
+        hist = color_histogram(img)
+        height, width, channels = img.shape
+        watch.lap('histogram')
+
+        return {
+            'image_path': path,
+            **text,
+            'height': height,
+            'width': width,
+            'channels': channels,
+            'histogram': hist,
+        }, None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+def _timed_process(idx, path, options=None, profile=False, reuse=None):
+    """(idx, path, record, error, seconds, laps) for one image; laps is None unless profiling"""
+    start = time.perf_counter()
+    watch = stopwatch(profile)
+    record, error = process_image(path, options, watch, reuse)
+    return idx, path, record, error, time.perf_counter() - start, watch.laps
+
+def _process_chunk(chunk, options=None, profile=False):
+    """Worker entry point: process a list of (idx, path) pairs"""
+    return [_timed_process(idx, path, options, profile) for idx, path in chunk]
+
+def _iter_results(indexed, workers=1, chunk_size=16, options=None, profile=False):
+    """Yield (idx, path, record, error, seconds, laps) for every (idx, path) pair, in completion order.
+
+    With workers > 1 the images are sent to a process pool in chunks, and
+    at most 2 * workers chunks are in flight at any time so memory stays
+    bounded no matter how many paths are queued. ``indexed`` may also hold
+    finished (idx, path, record) triples, e.g. cache hits; those are passed
+    straight through with seconds and laps set to None.
+    """
+    if workers <= 1:
+        for item in indexed:
+            if len(item) == 3:
+                yield item + (None, None, None)
+            else:
+                yield _timed_process(*item, options, profile)
+        return
+
+    max_pending = workers * 2
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        chunk = []
+        for item in indexed:
+            if len(item) == 3:
+                yield item + (None, None, None)
+                continue
+            chunk.append(item)
+            if len(chunk) < chunk_size:
+                continue
+            pending.add(pool.submit(_process_chunk, chunk, options, profile))
+            chunk = []
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+        if chunk:
+            pending.add(pool.submit(_process_chunk, chunk, options, profile))
+        for future in as_completed(pending):
+            yield from future.result()
+
+def _label_lookup(labels):
+    """Build a function (idx, path) -> label columns dict, or None when the image has no label row.
+
+    Keyed labels (see index_labels) are joined on the image file name;
+    labels without an image_name column fall back to row idx.
+    """
+    labels = index_labels(labels)
+    if labels.index.name == LABEL_KEY:
+        rows = labels.to_dict('index')
+        return lambda idx, path: rows.get(os.path.basename(path))
+    rows = labels.to_dict('records')
+    return lambda idx, path: rows[idx] if idx < len(rows) else None
+
+def _missing_label(path):
+    return f"KeyError: no label row for {os.path.basename(path)}"
+
+def _iter_records(image_paths, labels, workers=1, chunk_size=16, cache=None, options=None,
+                  errors=None, skip=None, profiler=None, duplicates=None):
+    """Yield (idx, record) for every processed image, as soon as each one is ready.
+
+    image_paths is consumed lazily, so the first images are being processed
+    while the rest of a large directory is still being listed. Labels are
+    joined on the image file name (see index_labels), so the order of
+    image_paths does not matter. Images without a label row are reported
+    in ``errors`` before any work is spent on them.
+
+    Cache hits are yielded as they are found, freshly processed images in
+    the order the workers finish them. Failures are appended to
+    ``errors``. With a ProfileBuffer as ``profiler`` every substage of
+    every image is timed.
+
+    Near-duplicates listed in ``duplicates`` ({path: canonical path}) come
+    last: they reuse the OCR fields of their canonical image and only have
+    their own size and histogram computed. When the canonical image is not
+    processed in this run (failed, or already written before a resume) the
+    duplicate is OCRed itself.
+    """
+    errors = errors if errors is not None else []
+    skip = skip or set()
+    label_row = _label_lookup(labels)
+    duplicates = duplicates or {}
+    wanted = set(duplicates.values())
+    canonical = {}
+    profile = profiler is not None
+    deferred = []
+    digests = {}
+    counts = {'hits': 0, 'processed': 0}
+    # Lists know their length; a lazy directory listing is never counted
+    # up front, its total is filled in once the listing is done
+    total = len(image_paths) if isinstance(image_paths, (list, tuple)) else None
+
+    def work():
+        listed = skipped = 0
+        # Cache lookups happen here, interleaved with feeding the pool
+        for idx, path in enumerate(image_paths):
+            listed += 1
+            if path in skip:
+                skipped += 1
+                continue
+            if label_row(idx, path) is None:
+                # Never spend OCR on an image the labels do not cover
+                errors.append({'image_path': path, 'error': _missing_label(path)})
+                progress.advance(0, failed=1)
+                continue
+            watch = stopwatch(profile)
+            record = None
+            if cache is not None:
+                try:
+                    digest = file_digest(path)
+                except OSError:
+                    # Let process_image report the unreadable file
+                    digest = None
+                watch.lap('digest')
+                if digest is not None:
+                    record = cache.get(digest)
+                    if record is None:
+                        digests[idx] = digest
+                    else:
+                        record['histogram'] = np.asarray(record['histogram'], dtype=np.uint32)
+                        record = {'image_path': path, **record, 'duplicate_of': duplicates.get(path)}
+                watch.lap('cache')
+            if profile:
+                profiler.add(path, watch.laps)
+            if record is not None:
+                counts['hits'] += 1
+                yield idx, path, record
+            elif path in duplicates:
+                # Borrowed text is never cached, the cache only holds real OCR results
+                deferred.append((idx, path))
+            else:
+                counts['processed'] += 1
+                yield idx, path
+        if total is None:
+            progress.set_total(listed - skipped)
+
+    def duplicate_results():
+        # Runs after every canonical image has been through the pool
+        if deferred:
+            print(f"Dedup: {len(deferred)} near-duplicates reuse the OCR text of their canonical image",
+                  flush=True)
+        for idx, path in deferred:
+            reuse = canonical.get(duplicates[path])
+            if reuse is not None:
+                digests.pop(idx, None)
+            result = _timed_process(idx, path, options, profile, reuse)
+            if result[2] is not None:
+                result[2]['duplicate_of'] = duplicates[path] if reuse is not None else None
+            yield result
+
+    # Progress goes to the structured channel (src.progress), one event per image
+    progress.start_items(None if total is None else max(0, total - len(skip)), unit='img')
+    results = itertools.chain(_iter_results(work(), workers, chunk_size, options, profile), duplicate_results())
+    for idx, path, record, error, seconds, laps in results:
+        watch = stopwatch(profile)
+        if error is None and idx in digests:
+            cached = {k: v for k, v in record.items() if k not in ('image_path', 'duplicate_of')}
+            cached['histogram'] = cached['histogram'].tolist()
+            cache.put(digests.pop(idx), cached)
+            watch.lap('cache')
+
+        if error is None:
+            record.setdefault('duplicate_of', None)
+            record.update(label_row(idx, path))
+            watch.lap('labels')
+        if profile:
+            profiler.add(path, laps)
+            profiler.add(path, watch.laps)
+
+        if error is not None:
+            errors.append({'image_path': path, 'error': error})
+            progress.advance(0, latency=seconds, failed=1)
+            continue
+
+        if path in wanted:
+            canonical[path] = {key: record[key] for key in OCR_FIELDS}
+        progress.advance(latency=seconds)
+        yield idx, record
+
+    if cache is not None:
+        print(f"Cache: {counts['hits']} hits, {counts['processed'] + len(deferred)} images processed", flush=True)
+
+def iter_transform(image_paths, labels, workers=1, chunk_size=16, cache=None, options=None,
+                   errors=None, skip=None, profiler=None, duplicates=None):
+    """Generator version of transform: yield one labelled record per image.
+
+    Records come out as soon as they are ready (not in input order), so the
+    caller can stream them to disk without holding the dataset in memory.
+
+    Args:
+        errors: Optional list that collects {'image_path', 'error'} dicts
+        skip: Optional set of image paths that are already done (for resume)
+        profiler: Optional ProfileBuffer that receives per-image substage timings
+
+    The remaining arguments are the same as for transform.
+    """
+    for _, record in _iter_records(image_paths, labels, workers, chunk_size, cache, options, errors, skip,
+                                   profiler, duplicates):
+        yield record
+
+def transform(image_paths, labels, workers=1, chunk_size=16, cache=None, options=None, profiler=None,
+              duplicates=None):
+    """Run OCR and image metrics over every image and join the labels.
+
+    Args:
+        image_paths: List, ImageSource or iterator of image file paths
+        labels: Labels DataFrame, joined on its image_name column (row N
+            belongs to image_paths[N] when it has none)
+        workers: Number of worker processes (1 keeps everything in-process)
+        chunk_size: Images per task submitted to the process pool
+        cache: Optional ResultCache; only images missing from it are processed
+        options: TransformOptions for decoding/OCR (defaults to TransformOptions())
+        profiler: Optional ProfileBuffer that receives per-image substage timings
+        duplicates: Optional {path: canonical path} from src.dedup.find_duplicates;
+            those images reuse the OCR text of their canonical image
+
+    Returns:
+        DataFrame with one row per successfully processed image. Failures,
+        including images without a label row, are listed in
+        ``df.attrs['errors']`` as dicts with image_path/error, and label rows
+        without an image in ``df.attrs['unmatched_labels']``.
+    """
+    if iter(image_paths) is image_paths:
+        # A one-shot iterator; the paths are needed again for the label report
+        image_paths = list(image_paths)
+    errors = []
+    labels = index_labels(labels)
+    results = dict(_iter_records(image_paths, labels, workers, chunk_size, cache, options, errors,
+                                 profiler=profiler, duplicates=duplicates))
+
+    # Restore input order, since the pool returns results as they finish
+    processed_data = [results[idx] for idx in sorted(results)]
+
+    # Create DataFrame and clean column names
     df = pd.DataFrame(processed_data)
-    # Clean column names by stripping whitespace
-    df.columns = df.columns.str.strip()
-    print(f"Processed {len(processed_data)}/{total_images} images successfully", flush=True)
+    # Clean column names by stripping whitespace (a frame without records has no columns)
+    df = df.rename(columns=str.strip)
+    df.attrs['errors'] = errors
+    df.attrs['unmatched_labels'] = unmatched_labels(labels, image_paths)
+    print(f"Processed {len(processed_data)}/{len(image_paths)} images successfully", flush=True)
+    if errors:
+        print(f"{len(errors)} images failed, see df.attrs['errors'] for details", flush=True)
+    if df.attrs['unmatched_labels']:
+        print(f"{len(df.attrs['unmatched_labels'])} label rows have no image, "
+              f"see df.attrs['unmatched_labels']", flush=True)
     return df
 
-def load(data, output_dir='data/processed'):
+def merge_with_existing(data, output_dir):
+    """Combine freshly processed rows with a previous run's parquet output.
+
+    Rows for images that were processed again replace the old ones, every
+    other existing row is kept.
+    """
+    existing_path = os.path.join(output_dir, 'processed_data.parquet')
+    if not os.path.exists(existing_path):
+        return data
+    existing = dataset.read_frame(existing_path, arrow_dtypes=False)
+    if set(existing.columns) != set(data.columns):
+        raise ValueError(f"{existing_path} was written with a different schema, re-run with --rebuild")
+    if 'image_path' in data.columns:
+        existing = existing[~existing['image_path'].isin(data['image_path'])]
+    print(f"Merging {len(data)} new rows with {len(existing)} existing rows", flush=True)
+    merged = pd.concat([existing, data], ignore_index=True)
+    merged.attrs = data.attrs
+    return merged
+
+def load(data, output_dir='data/processed', merge=False):
     os.makedirs(output_dir, exist_ok=True)
+
+    if merge:
+        data = merge_with_existing(data, output_dir)
     
     # Try to save as parquet, fall back to CSV if necessary
     try:
-        data.to_parquet(os.path.join(output_dir, 'processed_data.parquet'))
+        table = frame_to_table(data)
+        pq.write_table(table, os.path.join(output_dir, 'processed_data.parquet'))
+        rollup = Rollup()
+        rollup.add(table)
+        term_index = None
+        if 'image_path' in table.column_names:
+            term_index = TermIndex(group_column=find_sentiment_column(table.column_names))
+            term_index.add(table)
     except ImportError:
         print("Warning: pyarrow or fastparquet not available. Saving as CSV instead.")
         data.to_csv(os.path.join(output_dir, 'processed_data.csv'), index=False)
+        rollup = build_rollup(output_dir)
+        term_index = None
     
-    # Visualization - find appropriate sentiment column
-    plt.figure(figsize=(10, 6))
-    
+    save_rollup(rollup, output_dir)
+    # The old top-words index describes the replaced data
+    if term_index is not None:
+        save_term_index(term_index, output_dir)
+    elif os.path.exists(term_index_path(output_dir)):
+        os.remove(term_index_path(output_dir))
+    save_sentiment_chart(rollup, output_dir)
+
+def find_sentiment_column(columns):
+    """Pick the label column used for the sentiment chart, or None"""
     # Look for sentiment columns with flexible matching
-    sentiment_column = None
     for col in ['sentiment', 'overall_sentiment', 'sarcasm', 'offensive', 'motivational']:
-        if col in data.columns:
-            sentiment_column = col
-            break
-    
+        if col in columns:
+            return col
+    return None
+
+def save_sentiment_chart(rollup, output_dir):
+    """Plot the sentiment distribution of the processed data into output_dir.
+
+    The counts come from the data's rollup (src.rollups), so no rows are
+    read, and the chart is left alone when they are the same as the last
+    time it was drawn.
+    """
+    sentiment_column = find_sentiment_column(rollup.present)
     if sentiment_column:
-        data[sentiment_column].value_counts().plot(kind='bar')
-        plt.title(f'{sentiment_column.capitalize()} Distribution')
+        counts = rollup.distribution(sentiment_column)
+        aggregate = bar_aggregate(list(counts), list(counts.values()), f'{sentiment_column.capitalize()} Distribution')
     else:
         # Create a simple plot if no sentiment column is found
-        plt.bar(['No sentiment data'], [1])
-        plt.title('No sentiment data available')
+        aggregate = bar_aggregate(['No sentiment data'], [1], 'No sentiment data available')
+    return render_charts([Chart('sentiment_distribution.png', 'bar', aggregate)], output_dir, workers=1)
+
+def load_stream(records, writer, merge=False, term_index=False, bounded_term_index=False):
+    """Write an iterable of records through a ParquetChunkWriter, then plot the sentiment chart.
+
+    Memory stays bounded by the writer's row_group_size, and every completed
+    row group survives a crash (see ParquetChunkWriter). The rollup next
+    to the output is updated with the rows this run adds and replaces.
+
+    Args:
+        records: Iterable of record dicts, e.g. from iter_transform
+        writer: ParquetChunkWriter for the output directory
+        merge: Keep rows from an existing processed_data.parquet
+        term_index: Update the top-words index next to the output the same way
+        bounded_term_index: Use the memory-bounded counters when creating that index
+
+    Returns:
+        Number of rows in processed_data.parquet
+    """
+    for record in records:
+        writer.write(record)
+    rollup = open_rollup(writer.output_dir, rebuild=not merge)
+    index = None
+    if term_index:
+        index = open_term_index(writer.output_dir, find_sentiment_column(writer.columns(merge)),
+                                rebuild=not merge, bounded=bounded_term_index)
+    rows = writer.finalize(merge=merge, rollup=rollup, term_index=index)
+    if not os.path.exists(writer.path):
+        # Nothing to write, e.g. a shard that got no images
+        return rows
+
+    save_rollup(rollup, writer.output_dir)
+    if index is not None:
+        save_term_index(index, writer.output_dir)
+    save_sentiment_chart(rollup, writer.output_dir)
+    return rows
+
+def run_etl(image_dir='data/raw/images', labels_path='data/raw/labels.csv', output_dir='data/processed',
+            sample=None, workers=1, chunk_size=16, options=None, rebuild=False, use_cache=True,
+            cache_dir='data/cache', cache_max_mb=512, row_group_size=500, resume=False,
+            bounded_term_index=False, profile=False, dedup=None, shard=None):
+    """Run extract, transform and load end to end.
+
+    This is what ``python -m src.etl_pipeline`` runs; the pipeline
+    orchestrator calls it in-process and passes the returned table on to
+    the analysis and warehouse stages. With ``profile`` every substage of
+    every image is timed and a breakdown is written to <output_dir>/profile.
+    With ``dedup`` (a Hamming distance out of 64 bits) images whose
+    perceptual hash is that close to an earlier image reuse its OCR text.
+
+    With ``shard`` (index, count) only the images src.shards assigns to
+    that shard are processed, into <output_dir>/shards/<index>-of-<count>,
+    and a manifest marks the shard as finished; merge_etl_shards combines
+    the shards once all of them are done.
+
+    Returns:
+        The processed data as a memory-mapped pyarrow Table (None if no rows were written)
+    """
+    options = options or TransformOptions()
+    if shard:
+        output_dir = shard_dir(output_dir, shard)
+        manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+        # Until this run finishes the shard counts as missing
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        print(f"Shard {shard[0]}/{shard[1]}: writing to {output_dir}")
+
+    # Sampling only lists as many files as it takes
+    image_paths, labels = extract(image_dir, labels_path, sample=sample, shard=shard)
+    if sample:
+        print(f"Sampling the first {len(image_paths)} images of {image_dir}")
     
-    plt.savefig(os.path.join(output_dir, 'sentiment_distribution.png'))
-    plt.close()  # Close the figure to free memory
+    duplicates = None
+    if dedup is not None:
+        duplicates = find_duplicates(image_paths, max_distance=dedup)
+        print(f"Dedup: {len(duplicates)} of {len(image_paths)} images are near-duplicates "
+              f"of {len(set(duplicates.values()))} canonical images")
+
+    print(f"Processing the images in {image_dir}...")
+    cache = open_cache(cache_dir, cache_max_mb, rebuild=rebuild, options=options) if use_cache else None
+    os.makedirs(output_dir, exist_ok=True)
+    writer = ParquetChunkWriter(output_dir, row_group_size=row_group_size, resume=resume)
+    if writer.done_paths:
+        print(f"Resuming: {len(writer.done_paths)} images already written")
+    errors = []
+    profiler = ProfileBuffer() if profile else None
+    try:
+        records = iter_transform(image_paths, labels, workers=workers, chunk_size=chunk_size,
+                                 cache=cache, options=options, errors=errors, skip=set(writer.done_paths),
+                                 profiler=profiler, duplicates=duplicates)
+        # The term index of a sharded run is built once for the merged data
+        total_rows = load_stream(records, writer, merge=not rebuild, term_index=not shard,
+                                 bounded_term_index=bounded_term_index)
+    finally:
+        if cache is not None:
+            cache.close()
+    print(f"Processed {writer.rows_written}/{len(image_paths)} images successfully")
+    if errors:
+        print(f"{len(errors)} images failed:")
+        for error in errors:
+            print(f"  {error['image_path']}: {error['error']}")
+    print(f"Wrote {total_rows} rows to {writer.path}")
+    # Listing the directory once more is only worth it after the real work is done
+    unmatched = unmatched_labels(labels, image_paths)
+    if unmatched:
+        print(f"Warning: {len(unmatched)} label rows have no image, e.g. {', '.join(unmatched[:5])}")
+    if profiler is not None:
+        profiler.write(os.path.join(output_dir, 'profile'))
+    if options.ocr_regions and total_rows:
+        import pyarrow.compute as pc
+        read = pc.mean(pq.read_table(writer.path, columns=['ocr_coverage'])['ocr_coverage']).as_py()
+        if read is not None:
+            print(f"Text regions: OCR read {read:.0%} of the image area on average, skipped {1 - read:.0%}")
+    if shard:
+        write_manifest(output_dir, shard, total_rows, len(errors), config_fingerprint(options))
+        return pq.read_table(writer.path, memory_map=True) if total_rows else None
+    if not total_rows:
+        return None
+    return pq.read_table(writer.path, memory_map=True)
+
+def merge_etl_shards(output_dir, count, bounded_term_index=False):
+    """Merge the output of a count-way sharded ETL into <output_dir>/processed_data.parquet.
+
+    Also adds up the shard rollups, draws the sentiment chart and rebuilds
+    the top-words index for the merged data, so analyze_data and
+    warehouse_loader can use the output directory as if one process had
+    written it.
+
+    Raises:
+        ValueError: for missing, mismatched or overlapping shards (see src.shards)
+
+    Returns:
+        The merged data as a memory-mapped pyarrow Table
+    """
+    path, _ = merge_shards(output_dir, count)
+    # Rollups are additive, so the shards' rollups add up to the merged one
+    shard_rollups = [load_rollup(shard_dir(output_dir, (index, count))) for index in range(count)]
+    if all(shard_rollup is not None for shard_rollup in shard_rollups):
+        rollup = Rollup()
+        for shard_rollup in shard_rollups:
+            rollup.merge(shard_rollup)
+    else:
+        rollup = build_rollup(output_dir)
+    save_rollup(rollup, output_dir)
+    save_sentiment_chart(rollup, output_dir)
+    update_from_parquet(path, group_column=find_sentiment_column(rollup.present), rebuild=True,
+                        bounded=bounded_term_index)
+    return pq.read_table(path, memory_map=True)
 
 if __name__ == '__main__':
     import argparse
+    import contextlib
     parser = argparse.ArgumentParser(description='ETL Pipeline for Image Processing')
     parser.add_argument('--test', action='store_true', help='Run in test mode with small dataset')
     parser.add_argument('--sample', type=int, help='Only process specified number of images')
+    parser.add_argument('--workers', type=int, default=1, help='Number of worker processes for OCR (default: 1)')
+    parser.add_argument('--chunk-size', type=int, default=16, help='Images per task sent to each worker')
+    parser.add_argument('--ocr-preprocess', action='store_true',
+                        help='OCR a grayscale, downscaled copy of each image (much faster on large images)')
+    parser.add_argument('--ocr-max-side', type=int, default=1600,
+                        help='Longest side in pixels of the OCR input with --ocr-preprocess')
+    parser.add_argument('--ocr-engine', choices=['auto', 'tesserocr', 'pytesseract'], default='auto',
+                        help='OCR backend; tesserocr keeps Tesseract loaded in every worker (default: auto)')
+    parser.add_argument('--ocr-lang', default='eng', help="Tesseract language(s), e.g. 'eng+ind'")
+    parser.add_argument('--ocr-psm', type=int, default=3, help='Tesseract page segmentation mode')
+    parser.add_argument('--ocr-whitelist', help='Only recognise these characters')
+    parser.add_argument('--ocr-regions', choices=['contours', 'bands'],
+                        help='Only OCR likely caption regions instead of the whole image')
+    parser.add_argument('--dedup', type=int, nargs='?', const=6, metavar='DISTANCE',
+                        help='Reuse the OCR text of near-duplicate images whose perceptual hashes differ '
+                             'in at most DISTANCE of 64 bits (default when given: 6)')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='Ignore cached results and previous output, reprocess every image')
+    parser.add_argument('--no-cache', action='store_true', help='Disable the persistent result cache')
+    parser.add_argument('--cache-dir', default='data/cache', help='Directory for the result cache')
+    parser.add_argument('--cache-max-mb', type=int, default=512, help='Size limit for the result cache in MB')
+    parser.add_argument('--row-group-size', type=int, default=500,
+                        help='Records written per parquet row group (bounds memory use)')
+    parser.add_argument('--bounded-term-index', action='store_true',
+                        help='Use a count-min sketch and a Bloom filter of image paths when creating '
+                             'the top-words index, so it does not grow with the dataset')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue an interrupted run from its last written row group')
+    parser.add_argument('--profile', action='store_true',
+                        help='Time every substage of every image and write a breakdown to <output>/profile')
+    parser.add_argument('--shard', type=parse_shard, metavar='INDEX/COUNT',
+                        help='Only process shard INDEX of COUNT (e.g. 0/4), into <output>/shards')
+    parser.add_argument('--merge-shards', type=int, metavar='COUNT',
+                        help='Merge the output of a COUNT-way sharded run instead of processing images')
+    parser.add_argument('--output-dir', help='Output directory (default: data/processed, or data/processed_test)')
     args = parser.parse_args()
     
     if args.test:
@@ -117,18 +744,28 @@ if __name__ == '__main__':
         image_dir = 'data/raw/images'
         labels_path = 'data/raw/labels.csv'
         output_dir = 'data/processed'
+    output_dir = args.output_dir or output_dir
+
+    if args.merge_shards:
+        try:
+            merge_etl_shards(output_dir, args.merge_shards, bounded_term_index=args.bounded_term_index)
+        except ValueError as e:
+            print(f"Cannot merge shards: {e}")
+            sys.exit(1)
+        print("Shards merged")
+        sys.exit(0)
     
-    image_paths, labels = extract(image_dir, labels_path)
-    
-    # Apply sampling if requested
-    if args.sample and len(image_paths) > args.sample:
-        print(f"Sampling {args.sample} images from {len(image_paths)} total images")
-        image_paths = image_paths[:args.sample]
-        if len(labels) > args.sample:
-            labels = labels.iloc[:args.sample]
-    
-    print(f"Processing {len(image_paths)} images...")
-    processed_data = transform(image_paths, labels)
-    print(f"Processed {len(processed_data)} images successfully")
-    load(processed_data, output_dir)
+    # Under the pipeline runner progress events go to its JSON-lines file; standalone, draw a bar here
+    renderer = (progress.ProgressRenderer(progress.get_tracker())
+                if progress.PROGRESS_FILE_ENV not in os.environ else contextlib.nullcontext())
+    with progress.stage('etl'), renderer:
+        run_etl(image_dir, labels_path, output_dir, sample=args.sample, workers=args.workers,
+                chunk_size=args.chunk_size,
+                options=TransformOptions(ocr_preprocess=args.ocr_preprocess, ocr_max_side=args.ocr_max_side,
+                                         ocr_engine=args.ocr_engine, ocr_regions=args.ocr_regions,
+                                         ocr=OcrConfig(args.ocr_lang, args.ocr_psm, args.ocr_whitelist)),
+                rebuild=args.rebuild, use_cache=not args.no_cache, cache_dir=args.cache_dir,
+                cache_max_mb=args.cache_max_mb, row_group_size=args.row_group_size, resume=args.resume,
+                bounded_term_index=args.bounded_term_index, profile=args.profile, dedup=args.dedup,
+                shard=args.shard)
     print("ETL pipeline completed")
\ No newline at end of file
@@ -0,0 +1,157 @@
+import fnmatch
+import itertools
+import json
+import os
+from typing import NamedTuple
+
+import pandas as pd
+from src.shards import in_shard, shard_of
+
+# File extensions treated as images (compared lower-case)
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp', '.tif', '.tiff')
+
+# Labels column holding the image file name each row belongs to
+LABEL_KEY = 'image_name'
+
+# Where count_images remembers directory sizes between runs
+COUNT_CACHE = 'data/cache/image_counts.json'
+
+class ImageFile(NamedTuple):
+    """An image found by ImageSource, with the metadata os.scandir gives for free"""
+    path: str
+    size: int
+    mtime: float
+
+class ImageSource:
+    """Lazy view of the image files in a directory.
+
+    Iterating streams paths straight from os.scandir, so work can start on
+    the first file while the rest of the directory is still being listed,
+    and nothing holds the whole listing in memory. Files come in directory
+    order, which is stable between scans of an unchanged directory.
+
+    ``len()`` counts the files once (see count_images), or not at all after
+    a complete iteration, and slicing only
+    reads as far into the directory as the slice needs, so ``source[:100]``
+    of a million-file directory is cheap.
+
+    Args:
+        image_dir: Directory holding the images
+        pattern: Optional glob on the file name, e.g. 'image_1*.jpg'
+        extensions: Accepted file extensions; None accepts every file
+        count_cache: JSON file for the cached file count; None keeps it in memory only
+        shard: Optional (index, count) - only the images src.shards assigns to that shard
+    """
+
+    def __init__(self, image_dir, pattern=None, extensions=IMAGE_EXTENSIONS, count_cache=None, shard=None):
+        self.image_dir = image_dir
+        self.pattern = pattern
+        self.shard = tuple(shard) if shard else None
+        self.extensions = tuple(ext.lower() for ext in extensions) if extensions else None
+        self.count_cache = count_cache
+        self._count = None
+
+    def _accept(self, name):
+        if self.extensions and not name.lower().endswith(self.extensions):
+            return False
+        if self.pattern is not None and not fnmatch.fnmatch(name, self.pattern):
+            return False
+        return in_shard(name, self.shard)
+
+    def _scan(self):
+        count = 0
+        with os.scandir(self.image_dir) as entries:
+            for entry in entries:
+                # is_file() answers from the directory listing on most file systems, without a stat call
+                if self._accept(entry.name) and entry.is_file():
+                    count += 1
+                    yield entry
+        # A complete listing makes len() free afterwards
+        self._count = count
+
+    def __iter__(self):
+        return (entry.path for entry in self._scan())
+
+    def entries(self):
+        """Yield ImageFile(path, size, mtime) for every image"""
+        for entry in self._scan():
+            stat = entry.stat()
+            yield ImageFile(entry.path, stat.st_size, stat.st_mtime)
+
+    def head(self, n):
+        """The first n image paths, reading no further into the directory than needed"""
+        return list(itertools.islice(self, n))
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.start or 0, key.stop, key.step or 1
+            if start >= 0 and step > 0 and (stop is None or stop >= 0):
+                return list(itertools.islice(self, start, stop, step))
+            return list(self)[key]
+        if key < 0:
+            return list(self)[key]
+        try:
+            return next(itertools.islice(self, key, None))
+        except StopIteration:
+            raise IndexError("image index out of range") from None
+
+    def __len__(self):
+        if self._count is None:
+            self._count = count_images(self.image_dir, self.pattern, self.extensions, self.count_cache,
+                                       self.shard)
+        return self._count
+
+    def __repr__(self):
+        return f"ImageSource({self.image_dir!r}, pattern={self.pattern!r}, shard={self.shard!r})"
+
+def count_images(image_dir, pattern=None, extensions=IMAGE_EXTENSIONS, cache_path=COUNT_CACHE, shard=None):
+    """Number of images in a directory, cached until the directory changes.
+
+    Adding, removing or renaming files changes the directory's mtime, which
+    invalidates the cached count; on an unchanged directory the count costs
+    a single stat instead of a full listing.
+    """
+    key = [os.path.abspath(image_dir), pattern, list(extensions or [])]
+    key = json.dumps(key + [list(shard)] if shard else key)
+    mtime = os.stat(image_dir).st_mtime_ns
+    counts = {}
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path) as f:
+                counts = json.load(f)
+        except (OSError, ValueError):
+            counts = {}
+        cached = counts.get(key)
+        if cached and cached['mtime_ns'] == mtime:
+            return cached['count']
+
+    count = sum(1 for _ in ImageSource(image_dir, pattern, extensions, shard=shard)._scan())
+    if cache_path:
+        counts[key] = {'mtime_ns': mtime, 'count': count}
+        os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(counts, f)
+        os.replace(tmp_path, cache_path)
+    return count
+
+def read_labels(labels_path, names=None, chunksize=50000, shard=None):
+    """Read a labels CSV in chunks.
+
+    With ``names`` only the rows whose image_name is in it are kept, so
+    labels for a sample never hold the whole file in memory; with ``shard``
+    only the rows of that shard's images.
+    """
+    if names is not None:
+        names = set(names)
+    chunks = []
+    for chunk in pd.read_csv(labels_path, chunksize=chunksize):
+        if names is not None and LABEL_KEY in chunk.columns:
+            chunk = chunk[chunk[LABEL_KEY].astype(str).isin(names)]
+        if shard and LABEL_KEY in chunk.columns:
+            chunk = chunk[chunk[LABEL_KEY].map(lambda name: shard_of(name, shard[1]) == shard[0])]
+        chunks.append(chunk)
+    if not chunks:
+        # Header only
+        return pd.read_csv(labels_path)
+    return pd.concat(chunks, ignore_index=True)
@@ -0,0 +1,158 @@
+import os
+import platform
+from dataclasses import dataclass, field
+from typing import Optional
+import numpy as np
+
+ENGINES = ('auto', 'tesserocr', 'pytesseract')
+
+@dataclass(frozen=True)
+class OcrConfig:
+    """Tesseract settings shared by every backend.
+
+    Attributes:
+        lang: Tesseract language(s), e.g. 'eng' or 'eng+ind'
+        psm: Page segmentation mode (3 = fully automatic, 6 = single block, 11 = sparse text)
+        whitelist: Only recognise these characters (None allows everything)
+    """
+    lang: str = 'eng'
+    psm: int = 3
+    whitelist: Optional[str] = None
+
+    def cli_config(self):
+        """The settings as tesseract command line options (lang is passed separately)"""
+        config = f'--psm {self.psm}'
+        if self.whitelist:
+            config += f' -c tessedit_char_whitelist={self.whitelist}'
+        return config
+
+@dataclass
+class OcrResult:
+    """Recognised text plus (word, confidence 0-100) pairs"""
+    text: str
+    words: list = field(default_factory=list)
+
+    @property
+    def confidence(self):
+        """Mean word confidence, or None when nothing was recognised"""
+        if not self.words:
+            return None
+        return float(np.mean([conf for _, conf in self.words]))
+
+class OcrEngine:
+    """Interface of the OCR backends: recognize() an RGB or grayscale ndarray"""
+    name = None
+
+    def __init__(self, config=None):
+        self.config = config or OcrConfig()
+
+    def recognize(self, image):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+def _text_from_data(data):
+    """Rebuild image_to_string-style text from image_to_data output: lines by newline, blocks by a blank line"""
+    blocks = []
+    lines = {}
+    for i, word in enumerate(data['text']):
+        if float(data['conf'][i]) < 0 or not str(word).strip():
+            continue
+        block = (data['page_num'][i], data['block_num'][i], data['par_num'][i])
+        line = block + (data['line_num'][i],)
+        if line not in lines:
+            lines[line] = []
+            if not blocks or blocks[-1][0] != block:
+                blocks.append((block, []))
+            blocks[-1][1].append(lines[line])
+        lines[line].append(str(word))
+    return '\n\n'.join('\n'.join(' '.join(words) for words in block_lines) for _, block_lines in blocks)
+
+def load_pytesseract():
+    """pytesseract, imported on first use since it pulls in PIL and pandas"""
+    import pytesseract
+    # Only set the tesseract path on Windows
+    if platform.system() == 'Windows':
+        pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+    return pytesseract
+
+class PytesseractEngine(OcrEngine):
+    """Runs the tesseract executable once per image through pytesseract.
+
+    Works wherever the tesseract binary is installed, but every call pays for
+    a process start, temp files and model loading.
+    """
+    name = 'pytesseract'
+
+    def recognize(self, image):
+        pytesseract = load_pytesseract()
+        data = pytesseract.image_to_data(image, lang=self.config.lang, config=self.config.cli_config(),
+                                         output_type=pytesseract.Output.DICT)
+        words = [(str(word), float(conf)) for word, conf in zip(data['text'], data['conf'])
+                 if float(conf) >= 0 and str(word).strip()]
+        return OcrResult(_text_from_data(data), words)
+
+class TesserocrEngine(OcrEngine):
+    """Keeps one Tesseract instance loaded through the tesserocr C-API bindings.
+
+    The model is loaded once when the engine is created and reused for every
+    image, so a worker process pays the start-up cost only once.
+    """
+    name = 'tesserocr'
+
+    def __init__(self, config=None):
+        super().__init__(config)
+        import tesserocr
+        self._api = tesserocr.PyTessBaseAPI(lang=self.config.lang, psm=self.config.psm)
+        if self.config.whitelist:
+            self._api.SetVariable('tessedit_char_whitelist', self.config.whitelist)
+
+    def recognize(self, image):
+        from PIL import Image
+        self._api.SetImage(Image.fromarray(np.ascontiguousarray(image)))
+        text = self._api.GetUTF8Text()
+        words = [(word, float(conf)) for word, conf in self._api.MapWordConfidences() if word.strip()]
+        return OcrResult(text.strip(), words)
+
+    def close(self):
+        self._api.End()
+
+def tesserocr_available():
+    try:
+        import tesserocr  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def resolve_engine(name='auto'):
+    """Backend name an engine setting ends up using ('auto' prefers tesserocr when installed)"""
+    if name not in ENGINES:
+        raise ValueError(f"Unknown OCR engine '{name}', choose one of: {', '.join(ENGINES)}")
+    if name == 'auto':
+        return 'tesserocr' if tesserocr_available() else 'pytesseract'
+    return name
+
+def create_engine(name='auto', config=None):
+    """Create an OCR engine; 'auto' falls back to pytesseract when tesserocr is missing"""
+    name = resolve_engine(name)
+    if name == 'tesserocr':
+        return TesserocrEngine(config)
+    return PytesseractEngine(config)
+
+# One engine per process and setting, so worker processes keep theirs loaded between chunks
+_engines = {}
+
+def get_engine(name='auto', config=None):
+    """The process-wide engine for these settings, created on first use"""
+    key = (os.getpid(), name, config or OcrConfig())
+    engine = _engines.get(key)
+    if engine is None:
+        engine = _engines[key] = create_engine(name, config)
+    return engine
+
+def tesseract_version():
+    try:
+        return str(load_pytesseract().get_tesseract_version())
+    except Exception:
+        return 'unknown'
@@ -0,0 +1,264 @@
+import contextlib
+import cProfile
+import hashlib
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+from src import progress
+from src.image_source import COUNT_CACHE, count_images
+
+@dataclass
+class Stage:
+    """One step of the pipeline DAG.
+
+    Attributes:
+        name: Unique stage name, also the key of its result
+        func: Callable run in-process; receives a dict {dep name: dep value}
+            and returns a value handed to dependent stages (e.g. a DataFrame)
+        deps: Names of the stages that must finish first
+        inputs: Files/directories whose contents decide whether the stage can be skipped
+        listings: Image directories that also decide it, too large to stat file by file;
+            only their mtime and image count are compared (see _listing_signature)
+        outputs: Files that must exist for the stage to be skipped
+        params: Settings that change the stage's result; part of its fingerprint
+        command: Shell command used instead of func in isolated mode (or when func is None)
+        locks: Named resources the stage must hold exclusively (e.g. 'pyplot')
+        always_run: Never skip this stage
+        description: Human readable name for progress output
+    """
+    name: str
+    func: Optional[Callable[[dict], Any]] = None
+    deps: tuple = ()
+    inputs: tuple = ()
+    listings: tuple = ()
+    outputs: tuple = ()
+    params: dict = field(default_factory=dict)
+    command: Optional[str] = None
+    locks: tuple = ()
+    always_run: bool = False
+    description: Optional[str] = None
+
+@dataclass
+class StageResult:
+    """Outcome of a stage: status is 'ok', 'skipped', 'failed' or 'blocked'"""
+    status: str
+    value: Any = None
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+def _path_signature(path, digest):
+    """Feed a file's or directory tree's size/mtime metadata into a hash"""
+    if not os.path.exists(path):
+        digest.update(f"{path}:missing\n".encode())
+        return
+    if os.path.isfile(path):
+        stat = os.stat(path)
+        digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+        return
+    with os.scandir(path) as entries:
+        for entry in sorted(entries, key=lambda e: e.name):
+            if entry.name == '__pycache__':
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                _path_signature(entry.path, digest)
+            else:
+                stat = entry.stat()
+                digest.update(f"{entry.path}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+
+def _listing_signature(path, digest, count_cache=COUNT_CACHE):
+    """Feed an image directory's mtime and image count into a hash.
+
+    Adding, removing or renaming a file changes the directory's mtime, and
+    count_images answers from its cache while the mtime is unchanged, so
+    this costs a stat or two however many images there are. Files edited
+    in place go unnoticed; the ETL's result cache catches those.
+    """
+    if not os.path.isdir(path):
+        digest.update(f"{path}:missing\n".encode())
+        return
+    mtime = os.stat(path).st_mtime_ns
+    digest.update(f"{path}:{mtime}:{count_images(path, cache_path=count_cache)}\n".encode())
+
+class Pipeline:
+    """In-process DAG runner for the pipeline stages.
+
+    Stages run as soon as their dependencies are done, up to max_workers at
+    a time, and hand their return values to dependents in memory. A stage
+    whose params and input files are unchanged since its last successful
+    run (and whose outputs still exist) is skipped; dependents then get
+    None and read from disk. A failed stage blocks everything downstream.
+
+    Args:
+        stages: List of Stage objects
+        state_path: JSON file remembering each stage's last successful fingerprint
+        max_workers: Number of stages that may run concurrently
+        isolate: Run every stage that has a command as a subprocess instead
+        runner: Callable(command, description) -> bool used for subprocess stages;
+            it runs inside the stage's progress scope (see src.progress)
+        tracker: ProgressTracker the stages report to (defaults to the process-wide one)
+        show_progress: Draw a live bar per stage from the reported counts
+        metrics_path: JSON file the progress metrics are exported to
+        profile_dir: Run every in-process stage under cProfile and write
+            <profile_dir>/<stage>.prof (open with pstats, snakeviz, ...)
+        count_cache: JSON file caching the image counts of stage listings (None keeps them in memory)
+    """
+
+    def __init__(self, stages, state_path='data/.pipeline_state.json', max_workers=2, isolate=False,
+                 runner=None, tracker=None, show_progress=False, metrics_path=None, profile_dir=None,
+                 count_cache=COUNT_CACHE):
+        self.stages = {stage.name: stage for stage in stages}
+        for stage in stages:
+            unknown = set(stage.deps) - set(self.stages)
+            if unknown:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stage(s): {', '.join(sorted(unknown))}")
+        self.state_path = state_path
+        self.max_workers = max_workers
+        self.isolate = isolate
+        self.runner = runner
+        self.tracker = tracker or progress.get_tracker()
+        self.show_progress = show_progress
+        self.metrics_path = metrics_path
+        self.profile_dir = profile_dir
+        self.count_cache = count_cache
+        self.state = self._load_state()
+
+    def _load_state(self):
+        if self.state_path and os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                return json.load(f)
+        return {}
+
+    def _save_state(self):
+        if not self.state_path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.state_path)
+
+    def fingerprint(self, stage):
+        """Hash of the stage's params and the current state of its input files"""
+        digest = hashlib.sha256()
+        digest.update(json.dumps(stage.params, sort_keys=True, default=str).encode())
+        digest.update(str(self.isolate and stage.command is not None).encode())
+        for path in stage.inputs:
+            _path_signature(path, digest)
+        for path in stage.listings:
+            _listing_signature(path, digest, self.count_cache)
+        return digest.hexdigest()
+
+    def _can_skip(self, stage, fingerprint):
+        return (not stage.always_run
+                and self.state.get(stage.name) == fingerprint
+                and all(os.path.exists(path) for path in stage.outputs))
+
+    def _execute(self, stage, upstream):
+        start = time.perf_counter()
+        self.tracker.apply({'event': 'begin', 'stage': stage.name})
+        try:
+            with progress.stage(stage.name, self.tracker):
+                if stage.func is None or (self.isolate and stage.command):
+                    if self.runner is None:
+                        raise RuntimeError(f"Stage '{stage.name}' needs a subprocess runner")
+                    if not self.runner(stage.command, stage.description or stage.name):
+                        raise RuntimeError(f"Command failed: {stage.command}")
+                    value = None
+                elif self.profile_dir:
+                    value = self._profiled(stage, upstream)
+                else:
+                    value = stage.func(upstream)
+            result = StageResult('ok', value, time.perf_counter() - start)
+        except Exception as e:
+            traceback.print_exc()
+            result = StageResult('failed', None, time.perf_counter() - start, f"{type(e).__name__}: {e}")
+        self.tracker.apply({'event': 'end', 'stage': stage.name, 'status': result.status})
+        return result
+
+    def _profiled(self, stage, upstream):
+        # cProfile only sees the calling thread, which is this stage's worker thread
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(stage.func, upstream)
+        finally:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            path = os.path.join(self.profile_dir, f'{stage.name}.prof')
+            profiler.dump_stats(path)
+            print(f"[{stage.name}] cProfile stats written to {path}", flush=True)
+
+    def run(self):
+        """Run every stage and return {stage name: StageResult}.
+
+        Progress is drawn while the stages run (show_progress) and the final
+        metrics are written to metrics_path.
+        """
+        renderer = (progress.ProgressRenderer(self.tracker, self.metrics_path) if self.show_progress
+                    else contextlib.nullcontext())
+        with renderer:
+            results = self._run_stages()
+        if self.metrics_path:
+            self.tracker.export(self.metrics_path)
+        return results
+
+    def _run_stages(self):
+        results = {}
+        pending = dict(self.stages)
+        running = {}
+        held_locks = set()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending or running:
+                progressed = False
+                for name, stage in list(pending.items()):
+                    dep_results = [results.get(dep) for dep in stage.deps]
+                    if any(r is not None and r.status in ('failed', 'blocked') for r in dep_results):
+                        results[name] = StageResult('blocked', error='an upstream stage failed')
+                        print(f"[{name}] blocked: an upstream stage failed", flush=True)
+                        self.tracker.apply({'event': 'end', 'stage': name, 'status': 'blocked'})
+                        del pending[name]
+                        progressed = True
+                        continue
+                    if any(r is None for r in dep_results):
+                        continue
+                    if len(running) >= self.max_workers or set(stage.locks) & held_locks:
+                        continue
+
+                    del pending[name]
+                    progressed = True
+                    fingerprint = self.fingerprint(stage)
+                    if self._can_skip(stage, fingerprint):
+                        results[name] = StageResult('skipped')
+                        print(f"[{name}] skipped: inputs unchanged", flush=True)
+                        self.tracker.apply({'event': 'end', 'stage': name, 'status': 'skipped'})
+                        continue
+                    held_locks.update(stage.locks)
+                    upstream = {dep: results[dep].value for dep in stage.deps}
+                    print(f"[{name}] started", flush=True)
+                    running[pool.submit(self._execute, stage, upstream)] = (stage, fingerprint)
+
+                if progressed:
+                    continue
+                if not running:
+                    # Nothing can start and nothing is running: only possible with a dependency cycle
+                    raise ValueError(f"Dependency cycle between stages: {', '.join(sorted(pending))}")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, fingerprint = running.pop(future)
+                    held_locks.difference_update(stage.locks)
+                    result = future.result()
+                    results[stage.name] = result
+                    if result.status == 'ok':
+                        # The fingerprint taken at start, so inputs changed mid-run trigger a rerun
+                        self.state[stage.name] = fingerprint
+                        self._save_state()
+                        print(f"[{stage.name}] done in {result.seconds:.1f}s", flush=True)
+                    else:
+                        self.state.pop(stage.name, None)
+                        self._save_state()
+                        print(f"[{stage.name}] failed after {result.seconds:.1f}s: {result.error}", flush=True)
+        return results
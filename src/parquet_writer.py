@@ -0,0 +1,138 @@
+import os
+import shutil
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from src.schema import IMAGE_FIELDS, conform_table, records_to_table, unify_schemas
+
+class ParquetChunkWriter:
+    """Stream processed records to parquet in fixed-size row groups.
+
+    Records are buffered until ``row_group_size`` of them have arrived, then
+    written as their own part file under ``<output_dir>/<filename>.parts/``.
+    A crash therefore loses at most one row group, and a later run with
+    resume=True skips every image already present in the parts.
+    finalize() stitches the parts into the final parquet file one row
+    group at a time, so peak memory never depends on the dataset size.
+
+    Args:
+        output_dir: Directory that receives the parquet file
+        row_group_size: Records per row group / part file
+        resume: Keep parts from an interrupted run instead of clearing them
+        filename: Name of the final parquet file
+        schema: Types for known columns (see src.schema.IMAGE_FIELDS)
+    """
+
+    def __init__(self, output_dir, row_group_size=500, resume=False, filename='processed_data.parquet',
+                 schema=IMAGE_FIELDS):
+        self.output_dir = output_dir
+        self.schema = schema
+        self.row_group_size = row_group_size
+        self.path = os.path.join(output_dir, filename)
+        self.parts_dir = self.path + '.parts'
+        self._buffer = []
+        self.rows_written = 0
+
+        if not resume and os.path.isdir(self.parts_dir):
+            shutil.rmtree(self.parts_dir)
+        os.makedirs(self.parts_dir, exist_ok=True)
+
+        self._parts = self._part_files()
+        self.done_paths = set()
+        for part in self._parts:
+            self.done_paths.update(pq.read_table(part, columns=['image_path'])['image_path'].to_pylist())
+        self.rows_written = len(self.done_paths)
+
+    def _part_files(self):
+        return sorted(
+            os.path.join(self.parts_dir, name)
+            for name in os.listdir(self.parts_dir)
+            if name.endswith('.parquet')
+        )
+
+    def write(self, record):
+        """Buffer one record, flushing a row group when the buffer is full"""
+        self._buffer.append(record)
+        if len(self._buffer) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        """Write buffered records as a new part file"""
+        if not self._buffer:
+            return
+        table = records_to_table(self._buffer, self.schema)
+        part = os.path.join(self.parts_dir, f"part-{len(self._parts):05d}.parquet")
+        # Write under a temporary name so a crash never leaves a truncated part
+        pq.write_table(table, part + '.tmp')
+        os.replace(part + '.tmp', part)
+        self._parts.append(part)
+        self.done_paths.update(record['image_path'] for record in self._buffer)
+        self.rows_written += len(self._buffer)
+        self._buffer = []
+
+    def columns(self, merge=False):
+        """Column names of the rows written so far, and of the existing output file with merge"""
+        self.flush()
+        paths = self._parts + ([self.path] if merge and os.path.exists(self.path) else [])
+        names = {}
+        for path in paths:
+            names.update(dict.fromkeys(pq.read_schema(path).names))
+        return list(names)
+
+    def finalize(self, merge=False, rollup=None, term_index=None):
+        """Combine the parts into the final parquet file and remove them.
+
+        Args:
+            merge: Keep rows from an existing output file, except for images
+                that were written again in this run
+            rollup: src.rollups.Rollup of the existing file to keep in step:
+                the new rows are added to it and the replaced rows taken out
+            term_index: src.term_index.TermIndex of the existing file, kept in step the same way
+
+        Returns:
+            Number of rows in the final file
+        """
+        self.flush()
+        trackers = [tracker for tracker in (rollup, term_index) if tracker is not None]
+        existing = self.path if merge and os.path.exists(self.path) else None
+        schemas = [pq.read_schema(part) for part in self._parts]
+        if existing:
+            schemas.append(pq.read_schema(existing))
+        if not schemas:
+            shutil.rmtree(self.parts_dir, ignore_errors=True)
+            return 0
+        try:
+            schema = unify_schemas(schemas)
+        except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+            raise ValueError(f"{self.path} was written with an incompatible schema, "
+                             f"re-run with --rebuild to replace it: {e}")
+
+        rows = 0
+        tmp_path = self.path + '.tmp'
+        with pq.ParquetWriter(tmp_path, schema) as out:
+            if existing:
+                new_paths = pa.array(list(self.done_paths), type=pa.string())
+                existing_file = pq.ParquetFile(existing)
+                kept = 0
+                for i in range(existing_file.num_row_groups):
+                    table = existing_file.read_row_group(i)
+                    replaced = pc.is_in(table['image_path'], value_set=new_paths)
+                    for tracker in trackers:
+                        tracker.subtract(table.filter(replaced))
+                    table = table.filter(pc.invert(replaced))
+                    if len(table):
+                        out.write_table(conform_table(table, schema))
+                        kept += len(table)
+                print(f"Merging {self.rows_written} new rows with {kept} existing rows", flush=True)
+                rows += kept
+            for part in self._parts:
+                table = pq.read_table(part)
+                out.write_table(conform_table(table, schema))
+                for tracker in trackers:
+                    tracker.add(table)
+                rows += len(table)
+
+        os.replace(tmp_path, self.path)
+        shutil.rmtree(self.parts_dir)
+        self._parts = []
+        return rows
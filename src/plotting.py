@@ -0,0 +1,21 @@
+import os
+
+def pyplot():
+    """matplotlib.pyplot, imported on first use with the headless Agg backend.
+
+    Importing pyplot (and seaborn on top of it) takes longer than the rest
+    of a pipeline entry point put together, so modules call this inside
+    the functions that draw instead of importing it at the top. A backend
+    chosen through MPLBACKEND is left alone.
+    """
+    import matplotlib
+    if 'MPLBACKEND' not in os.environ:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+def seaborn():
+    """seaborn, imported on first use (after pyplot has been set up headless)"""
+    pyplot()
+    import seaborn as sns
+    return sns
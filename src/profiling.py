@@ -0,0 +1,136 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+
+# Substages timed for every image, in pipeline order
+STAGES = ('digest', 'cache', 'decode', 'ocr_prep', 'ocr', 'histogram', 'labels')
+
+class Stopwatch:
+    """Times consecutive substages of one image: call lap(stage) at the end of each one.
+
+    Laps are kept as (stage, wall seconds, cpu seconds) tuples, which are
+    cheap to send back from a worker process.
+    """
+
+    def __init__(self):
+        self.laps = []
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+
+    def restart(self):
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+
+    def lap(self, stage):
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        self.laps.append((stage, wall - self._wall, cpu - self._cpu))
+        self._wall = wall
+        self._cpu = cpu
+
+class _NullStopwatch:
+    """Stand-in used when profiling is off: every call is a no-op"""
+    laps = None
+
+    def restart(self):
+        pass
+
+    def lap(self, stage):
+        pass
+
+NULL_STOPWATCH = _NullStopwatch()
+
+def stopwatch(enabled):
+    """A fresh Stopwatch when enabled, otherwise the shared no-op one"""
+    return Stopwatch() if enabled else NULL_STOPWATCH
+
+class ProfileBuffer:
+    """Per-image, per-substage wall and CPU times in preallocated NumPy arrays.
+
+    Row i belongs to paths[i]; substages an image never went through (e.g.
+    OCR for a cache hit) stay NaN so they do not skew the percentiles.
+
+    Args:
+        stages: Substage names, one column each
+        capacity: Initial number of rows; the arrays double when full
+    """
+
+    def __init__(self, stages=STAGES, capacity=1024):
+        self.stages = tuple(stages)
+        self.columns = {stage: i for i, stage in enumerate(self.stages)}
+        self.wall = np.full((capacity, len(self.stages)), np.nan)
+        self.cpu = np.full((capacity, len(self.stages)), np.nan)
+        self.paths = []
+        self._rows = {}
+
+    def __len__(self):
+        return len(self.paths)
+
+    def _row(self, path):
+        row = self._rows.get(path)
+        if row is None:
+            row = len(self.paths)
+            if row == len(self.wall):
+                self.wall = np.vstack([self.wall, np.full_like(self.wall, np.nan)])
+                self.cpu = np.vstack([self.cpu, np.full_like(self.cpu, np.nan)])
+            self.paths.append(path)
+            self._rows[path] = row
+        return row
+
+    def add(self, path, laps):
+        """Record (stage, wall, cpu) laps for an image; repeated stages add up"""
+        if not laps:
+            return
+        row = self._row(path)
+        for stage, wall, cpu in laps:
+            column = self.columns[stage]
+            self.wall[row, column] = np.nan_to_num(self.wall[row, column]) + wall
+            self.cpu[row, column] = np.nan_to_num(self.cpu[row, column]) + cpu
+
+    def summary(self):
+        """One row per substage: images timed, total/mean wall and CPU time and wall-time percentiles"""
+        wall = self.wall[:len(self)]
+        cpu = self.cpu[:len(self)]
+        rows = []
+        for stage, column in self.columns.items():
+            times = wall[:, column]
+            times = times[~np.isnan(times)]
+            if not len(times):
+                continue
+            p50, p95, p99 = np.percentile(times, [50, 95, 99])
+            rows.append({
+                'stage': stage,
+                'images': len(times),
+                'wall_total_s': times.sum(),
+                'cpu_total_s': np.nansum(cpu[:, column]),
+                'wall_mean_s': times.mean(),
+                'p50_s': p50,
+                'p95_s': p95,
+                'p99_s': p99,
+            })
+        summary = pd.DataFrame(rows)
+        if len(summary):
+            summary['share'] = summary['wall_total_s'] / summary['wall_total_s'].sum()
+        return summary
+
+    def slowest(self, n=10):
+        """The n images with the highest total wall time, with their per-substage breakdown"""
+        wall = pd.DataFrame(self.wall[:len(self)], columns=self.stages)
+        wall.insert(0, 'image_path', self.paths)
+        wall['total_s'] = wall[list(self.stages)].sum(axis=1)
+        return wall.nlargest(n, 'total_s').reset_index(drop=True)
+
+    def write(self, output_dir, n=10):
+        """Write profile_summary.csv, profile_slowest.csv and the raw per-image times, then print the summary"""
+        os.makedirs(output_dir, exist_ok=True)
+        summary = self.summary()
+        summary.to_csv(os.path.join(output_dir, 'profile_summary.csv'), index=False)
+        self.slowest(n).to_csv(os.path.join(output_dir, 'profile_slowest.csv'), index=False)
+        np.savez_compressed(os.path.join(output_dir, 'profile_times.npz'), stages=np.array(self.stages),
+                            paths=np.array(self.paths), wall=self.wall[:len(self)], cpu=self.cpu[:len(self)])
+        if len(summary):
+            print("Per-image timing breakdown (seconds):")
+            print(summary.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+        print(f"Profile written to {output_dir}")
+        return summary
@@ -0,0 +1,286 @@
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Set by a parent process to receive JSON-lines progress events from a child
+PROGRESS_FILE_ENV = 'PIPELINE_PROGRESS_FILE'
+
+# Latency samples kept per stage for the percentiles
+LATENCY_WINDOW = 10000
+
+_current_stage = contextvars.ContextVar('pipeline_stage', default='main')
+_current_tracker = contextvars.ContextVar('pipeline_tracker', default=None)
+
+def percentile(sorted_values, q):
+    """q-th percentile (0-100) of an already sorted list, linearly interpolated"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+class StageProgress:
+    """Counters for one stage: items done/failed out of total, per-item latencies and timing"""
+
+    def __init__(self, name):
+        self.name = name
+        self.status = 'pending'
+        self.unit = 'item'
+        self.total = None
+        self.done = 0
+        self.failed = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.started = None
+        self.finished = None
+        self.items_started = None
+
+    def summary(self, now=None):
+        """Plain dict of the stage's progress, rate, ETA and latency percentiles"""
+        now = now or time.time()
+        end = self.finished or now
+        elapsed = end - self.started if self.started else 0.0
+        item_elapsed = end - self.items_started if self.items_started else 0.0
+        rate = self.done / item_elapsed if item_elapsed > 0 else 0.0
+        eta = None
+        if self.total is not None and rate > 0 and self.finished is None:
+            eta = max(self.total - self.done - self.failed, 0) / rate
+        latencies = sorted(self.latencies)
+        return {
+            'status': self.status,
+            'unit': self.unit,
+            'total': self.total,
+            'done': self.done,
+            'failed': self.failed,
+            'elapsed_s': round(elapsed, 3),
+            'rate_per_s': round(rate, 3),
+            'eta_s': round(eta, 1) if eta is not None else None,
+            'latency_s': {
+                'p50': percentile(latencies, 50),
+                'p90': percentile(latencies, 90),
+                'p99': percentile(latencies, 99),
+                'max': latencies[-1] if latencies else None,
+            },
+        }
+
+class ProgressTracker:
+    """Thread-safe progress counters for every pipeline stage.
+
+    Stages report through the module-level functions (start_items,
+    advance, ...), which find the tracker and the current stage name on
+    their own. When ``sink`` is given, every event is also written to it
+    as one JSON line, which is how a subprocess reports to its parent.
+
+    Args:
+        sink: Optional text file receiving one JSON event per line
+    """
+
+    def __init__(self, sink=None):
+        self.stages = {}
+        self.sink = sink
+        self._lock = threading.Lock()
+
+    def _stage(self, name):
+        if name not in self.stages:
+            self.stages[name] = StageProgress(name)
+        return self.stages[name]
+
+    def apply(self, event, stage=None):
+        """Apply one event dict, optionally under a different stage name (used for child processes)"""
+        name = stage or event['stage']
+        with self._lock:
+            progress = self._stage(name)
+            kind = event['event']
+            now = event.get('time', time.time())
+            if kind == 'begin':
+                progress.status = 'running'
+                progress.started = now
+                progress.finished = None
+            elif kind == 'items':
+                progress.total = event.get('total')
+                progress.unit = event.get('unit', progress.unit)
+                progress.items_started = now
+                if progress.started is None:
+                    progress.started = now
+                    progress.status = 'running'
+            elif kind == 'total':
+                progress.total = event.get('total')
+            elif kind == 'advance':
+                progress.done += event.get('n', 1)
+                progress.failed += event.get('failed', 0)
+                if event.get('latency') is not None:
+                    progress.latencies.append(event['latency'])
+            elif kind == 'end':
+                progress.status = event.get('status', 'ok')
+                progress.finished = now
+                if progress.started is None:
+                    progress.started = now
+            if self.sink is not None:
+                self.sink.write(json.dumps(dict(event, stage=name, time=now)) + '\n')
+                self.sink.flush()
+
+    def snapshot(self):
+        """{stage name: summary dict} for every stage seen so far"""
+        now = time.time()
+        with self._lock:
+            return {name: progress.summary(now) for name, progress in self.stages.items()}
+
+    def export(self, path):
+        """Write the current snapshot to a JSON file (atomically)"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'updated': time.time(), 'stages': self.snapshot()}, f, indent=2)
+        os.replace(tmp_path, path)
+
+_tracker = None
+_tracker_lock = threading.Lock()
+
+def get_tracker():
+    """The tracker of the current stage scope, else the process-wide one.
+
+    The process-wide tracker writes JSON lines to $PIPELINE_PROGRESS_FILE
+    when that is set.
+    """
+    global _tracker
+    scoped = _current_tracker.get()
+    if scoped is not None:
+        return scoped
+    with _tracker_lock:
+        if _tracker is None:
+            path = os.environ.get(PROGRESS_FILE_ENV)
+            _tracker = ProgressTracker(open(path, 'a', encoding='utf-8') if path else None)
+        return _tracker
+
+def set_tracker(tracker):
+    """Install a tracker (None resets to the default) and return the previous one"""
+    global _tracker
+    with _tracker_lock:
+        previous, _tracker = _tracker, tracker
+    return previous
+
+def current_stage():
+    return _current_stage.get()
+
+@contextlib.contextmanager
+def stage(name, tracker=None):
+    """Report everything inside the block under stage ``name`` (to ``tracker`` when given)"""
+    token = _current_stage.set(name)
+    tracker_token = _current_tracker.set(tracker) if tracker is not None else None
+    try:
+        yield
+    finally:
+        if tracker_token is not None:
+            _current_tracker.reset(tracker_token)
+        _current_stage.reset(token)
+
+def begin(name=None):
+    get_tracker().apply({'event': 'begin', 'stage': name or current_stage()})
+
+def end(status='ok', name=None):
+    get_tracker().apply({'event': 'end', 'stage': name or current_stage(), 'status': status})
+
+def start_items(total, unit='item'):
+    """Announce how many items the current stage is about to process"""
+    get_tracker().apply({'event': 'items', 'stage': current_stage(), 'total': total, 'unit': unit})
+
+def set_total(total):
+    """Fill in the total of a stage that started without one, keeping its rate and counts"""
+    get_tracker().apply({'event': 'total', 'stage': current_stage(), 'total': total})
+
+def advance(n=1, latency=None, failed=0):
+    """Count n finished items (and failed ones) for the current stage, with an optional per-item latency"""
+    get_tracker().apply({'event': 'advance', 'stage': current_stage(), 'n': n, 'latency': latency,
+                         'failed': failed})
+
+def follow(path, tracker, stage_name, stop):
+    """Apply JSON-lines events from a file written by a child process until ``stop`` is set"""
+    position = 0
+    while True:
+        finished = stop.is_set()
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                f.seek(position)
+                while True:
+                    line = f.readline()
+                    if not line.endswith('\n'):
+                        break
+                    position = f.tell()
+                    event = json.loads(line)
+                    # The parent owns begin/end; the child only reports items
+                    if event['event'] in ('items', 'total', 'advance'):
+                        tracker.apply(event, stage=stage_name)
+        if finished:
+            return
+        stop.wait(0.2)
+
+def _format_seconds(seconds):
+    if seconds is None:
+        return '?'
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m" if hours else f"{minutes}m{seconds:02d}s"
+
+class ProgressRenderer:
+    """Background thread drawing a tqdm bar per running stage from the tracker's real counts.
+
+    It also rewrites the metrics file on every refresh, so other tools can
+    follow a long run.
+
+    Args:
+        tracker: ProgressTracker to read
+        metrics_path: Optional JSON file exported on every refresh and on stop
+        interval: Seconds between refreshes
+    """
+
+    def __init__(self, tracker, metrics_path=None, interval=0.5):
+        self.tracker = tracker
+        self.metrics_path = metrics_path
+        self.interval = interval
+        self._bars = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.refresh()
+        self.refresh()
+        for bar in self._bars.values():
+            bar.close()
+
+    def refresh(self):
+        from tqdm import tqdm
+
+        snapshot = self.tracker.snapshot()
+        for name, summary in snapshot.items():
+            if not summary['total'] or (name in self._bars and self._bars[name].disable):
+                continue
+            bar = self._bars.get(name)
+            if bar is None:
+                # Rate and ETA come from the tracker, tqdm's own estimate only sees refreshes
+                bar = tqdm(total=summary['total'], desc=name, unit=summary['unit'], leave=True,
+                           bar_format='{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}{postfix}]')
+                self._bars[name] = bar
+            bar.n = summary['done'] + summary['failed']
+            postfix = f"{summary['rate_per_s']:.1f} {summary['unit']}/s, ETA {_format_seconds(summary['eta_s'])}"
+            if summary['latency_s']['p50'] is not None:
+                postfix += f", p50 {summary['latency_s']['p50']:.2f}s"
+            bar.set_postfix_str(postfix, refresh=False)
+            bar.refresh()
+            if summary['status'] != 'running':
+                bar.close()
+        if self.metrics_path:
+            self.tracker.export(self.metrics_path)
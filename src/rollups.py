@@ -0,0 +1,226 @@
+import gzip
+import json
+import os
+from collections import Counter
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from src import dataset
+
+ROLLUP_FILENAME = 'rollups.json.gz'
+
+# Label columns the dashboards filter on
+LABEL_COLUMNS = ['overall_sentiment', 'humour', 'sarcasm', 'offensive', 'motivational']
+
+# Columns the label cube is keyed on; older data has a plain 'sentiment' label instead
+ROLLUP_LABELS = ['sentiment'] + LABEL_COLUMNS
+
+# Histogram bin widths: exact word counts, image sides in 8 pixel bins
+HISTOGRAMS = {'word_count': 1, 'height': 8, 'width': 8}
+
+def _python(value):
+    """JSON-ready label value: NumPy scalars unwrapped, NaN as None"""
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+def word_counts(text):
+    """Number of whitespace-separated words per row of an Arrow string column (0 for null)"""
+    return pc.count_substring_regex(pc.fill_null(text, ''), r'\S+')
+
+class Rollup:
+    """Row counts of the processed data by every combination of label values.
+
+    Alongside the label cube it keeps binned histograms of the word count
+    and of the image height and width. All counts are additive, so a batch
+    of new rows is folded in with add() and rows that an ETL run replaces
+    are taken out with subtract(); nothing is recounted from the full
+    table. A few hundred cells answer every label distribution, however
+    many rows the dataset has.
+
+    Args:
+        labels: Label columns the cube is keyed on
+    """
+
+    def __init__(self, labels=ROLLUP_LABELS):
+        self.labels = list(labels)
+        # dataset.fingerprint of the data the counts describe, set by save_rollup
+        self.data = None
+        self.present = set()
+        self.rows = 0
+        self.cells = Counter()
+        self.histograms = {name: Counter() for name in HISTOGRAMS}
+
+    @property
+    def columns(self):
+        """Every column add() reads"""
+        return self.labels + ['text', 'height', 'width']
+
+    def _update(self, table, sign):
+        if isinstance(table, pa.RecordBatch):
+            table = pa.Table.from_batches([table])
+        names = table.column_names
+        present = [label for label in self.labels if label in names]
+        self.present.update(present)
+        self.rows += sign * table.num_rows
+
+        if present:
+            counts = table.select(present).to_pandas().value_counts(dropna=False)
+            for key, count in counts.items():
+                values = dict(zip(present, key if isinstance(key, tuple) else (key,)))
+                self.cells[tuple(_python(values.get(label)) for label in self.labels)] += sign * int(count)
+        elif table.num_rows:
+            self.cells[(None,) * len(self.labels)] += sign * table.num_rows
+
+        columns = {'word_count': word_counts(table['text']) if 'text' in names else None,
+                   'height': table['height'] if 'height' in names else None,
+                   'width': table['width'] if 'width' in names else None}
+        for name, column in columns.items():
+            if column is None:
+                continue
+            values = pc.drop_null(column).to_numpy()
+            bins, counts = np.unique(values // HISTOGRAMS[name] * HISTOGRAMS[name], return_counts=True)
+            histogram = self.histograms[name]
+            for start, count in zip(bins.tolist(), counts.tolist()):
+                histogram[int(start)] += sign * count
+
+        if sign < 0:
+            # Drop emptied cells so the rollup stays as small as the data it describes
+            for counter in [self.cells, *self.histograms.values()]:
+                for key in [key for key, count in counter.items() if count <= 0]:
+                    del counter[key]
+
+    def add(self, table):
+        """Count the rows of an Arrow table (only the rollup columns are read)"""
+        self._update(table, 1)
+
+    def subtract(self, table):
+        """Take rows counted earlier out again, e.g. rows a re-run replaces"""
+        self._update(table, -1)
+
+    def merge(self, other):
+        """Add the counts of another rollup over the same labels (e.g. of another shard)"""
+        self.present.update(other.present)
+        self.rows += other.rows
+        self.cells.update(other.cells)
+        for name, counts in other.histograms.items():
+            self.histograms[name].update(counts)
+
+    def _matches(self, where):
+        unknown = set(where) - set(self.labels)
+        if unknown:
+            raise ValueError(f"Unknown label columns: {', '.join(sorted(unknown))}")
+        positions = {self.labels.index(label): value for label, value in where.items() if value is not None}
+        return ((cell, count) for cell, count in self.cells.items()
+                if all(cell[i] == value for i, value in positions.items()))
+
+    def count(self, **where):
+        """Number of rows with the given label values, e.g. count(sarcasm='general')"""
+        return sum(count for _, count in self._matches(where))
+
+    def distribution(self, label, **where):
+        """Rows per value of one label, optionally within a label combination.
+
+        Returns:
+            Dict mapping label value to row count, most frequent first
+            (like value_counts, missing values are left out)
+        """
+        if label not in self.labels:
+            raise ValueError(f"Unknown label column: {label}")
+        position = self.labels.index(label)
+        counts = Counter()
+        for cell, count in self._matches(where):
+            if cell[position] is not None:
+                counts[cell[position]] += count
+        return dict(counts.most_common())
+
+    def histogram(self, name):
+        """(bin_starts, counts) NumPy arrays of one histogram, in bin order"""
+        items = sorted(self.histograms[name].items())
+        return (np.array([start for start, _ in items], dtype=np.int64),
+                np.array([count for _, count in items], dtype=np.int64))
+
+    def to_dict(self):
+        return {
+            'labels': self.labels,
+            'data': self.data,
+            'present': sorted(self.present),
+            'rows': self.rows,
+            'cells': [list(cell) + [count] for cell, count in self.cells.items()],
+            'histograms': {name: sorted(counts.items()) for name, counts in self.histograms.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        rollup = cls(data['labels'])
+        rollup.data = data.get('data')
+        rollup.present = set(data['present'])
+        rollup.rows = data['rows']
+        rollup.cells = Counter({tuple(row[:-1]): row[-1] for row in data['cells']})
+        for name, items in data['histograms'].items():
+            rollup.histograms[name] = Counter({start: count for start, count in items})
+        return rollup
+
+    def save(self, path):
+        """Write the rollup as gzipped JSON (atomically)"""
+        tmp_path = path + '.tmp'
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+def rollup_path(data_path):
+    """Where the rollup of the processed data in data_path lives"""
+    return os.path.join(data_path, ROLLUP_FILENAME)
+
+def save_rollup(rollup, data_path):
+    """Save the rollup of the processed data in data_path, stamped with the data's fingerprint"""
+    rollup.data = dataset.fingerprint(data_path)
+    rollup.save(rollup_path(data_path))
+
+def build_rollup(data_path, batch_size=50000):
+    """Count the processed data in data_path from scratch, streaming only the rollup columns"""
+    rollup = Rollup()
+    for batch in dataset.iter_batches(data_path, columns=rollup.columns, batch_size=batch_size):
+        rollup.add(batch)
+    return rollup
+
+def load_rollup(data_path):
+    """The saved rollup of data_path, or None when it is missing or out of step with the data.
+
+    The data file must be the one the rollup was saved for (see
+    dataset.fingerprint): a file rewritten with as many rows but other
+    labels does not pass.
+    """
+    path = rollup_path(data_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        rollup = Rollup.load(path)
+        current = dataset.fingerprint(data_path)
+    except (OSError, ValueError, KeyError):
+        return None
+    return rollup if rollup.data == current else None
+
+def open_rollup(data_path, rebuild=False):
+    """The rollup an ETL run should update: the saved one, recounted if missing or stale.
+
+    Returns an empty rollup when there is no data yet or the run replaces it (rebuild).
+    """
+    try:
+        dataset.data_file(data_path)
+    except FileNotFoundError:
+        return Rollup()
+    if rebuild:
+        return Rollup()
+    rollup = load_rollup(data_path)
+    if rollup is None:
+        print(f"Rollups: counting the existing data in {data_path}", flush=True)
+        rollup = build_rollup(data_path)
+    return rollup
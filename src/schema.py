@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# Number of bins in the per-image colour histogram
+HISTOGRAM_BINS = 256
+
+# Typed columns for the image metrics. Anything not listed here (labels,
+# text, paths) keeps the type pyarrow infers for it.
+IMAGE_FIELDS = pa.schema([
+    pa.field('height', pa.int32()),
+    pa.field('width', pa.int32()),
+    pa.field('channels', pa.int8()),
+    pa.field('histogram', pa.list_(pa.uint32(), HISTOGRAM_BINS)),
+    pa.field('ocr_confidence', pa.float32()),
+    pa.field('ocr_coverage', pa.float32()),
+    # Path of the image this one is a near-duplicate of (null for originals)
+    pa.field('duplicate_of', pa.string()),
+])
+
+def _typed_array(values, field):
+    """Build one column from Python/NumPy values, stacking fixed-size lists in one go"""
+    # Columns with null rows take pyarrow's per-row path below
+    if pa.types.is_fixed_size_list(field.type) and all(value is not None for value in values):
+        size = field.type.list_size
+        flat = np.stack(values).reshape(-1).astype(field.type.value_type.to_pandas_dtype(), copy=False)
+        flat = pa.array(flat)
+        return pa.FixedSizeListArray.from_arrays(flat, size)
+    # NaN is how pandas stores missing values, write it as null
+    return pa.array(values, type=field.type, from_pandas=True)
+
+def records_to_table(records, schema=IMAGE_FIELDS):
+    """Convert record dicts to an Arrow table, applying the typed schema where it matches"""
+    names = list(dict.fromkeys(name for record in records for name in record))
+    arrays = []
+    fields = []
+    for name in names:
+        values = [record.get(name) for record in records]
+        if name in schema.names:
+            field = schema.field(name)
+            arrays.append(_typed_array(values, field))
+            fields.append(field)
+        else:
+            # Empty label cells arrive from pandas as NaN, write them as null
+            array = pa.array(values, from_pandas=True)
+            arrays.append(array)
+            fields.append(pa.field(name, array.type))
+    return pa.Table.from_arrays(arrays, schema=pa.schema(fields))
+
+def unify_schemas(schemas):
+    """Merge part schemas, letting all-null columns take the type seen elsewhere"""
+    try:
+        schema = pa.unify_schemas(schemas, promote_options='permissive')
+    except TypeError:
+        # pyarrow < 14 has no promote_options but already promotes null types
+        schema = pa.unify_schemas(schemas)
+    # Drop index columns that pandas may have stored in an existing file
+    fields = [field for field in schema if not field.name.startswith('__index_level_')]
+    return pa.schema(fields)
+
+def conform_table(table, schema):
+    """Reorder/cast a table to the target schema, filling absent columns with nulls"""
+    columns = []
+    for field in schema:
+        if field.name in table.column_names:
+            columns.append(table[field.name].cast(field.type))
+        else:
+            columns.append(pa.nulls(len(table), field.type))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+def frame_to_table(df, schema=IMAGE_FIELDS):
+    """Convert a processed DataFrame to an Arrow table with the typed image columns"""
+    table = pa.Table.from_pandas(df.drop(columns=[c for c in schema.names if c in df.columns]),
+                                 preserve_index=False)
+    for field in schema:
+        if field.name in df.columns:
+            table = table.append_column(field, _typed_array(df[field.name].tolist(), field))
+    # Keep the DataFrame's column order
+    return table.select([c for c in df.columns])
+
+def histogram_matrix(column):
+    """Return an (n, HISTOGRAM_BINS) uint32 matrix from a histogram column.
+
+    Accepts an Arrow fixed-size list column (zero-copy view of its values)
+    or a pandas Series of per-row arrays/lists from older files. Null rows
+    (images whose histogram could not be computed) come back as zeros, so
+    row i of the matrix is always row i of the column.
+    """
+    if isinstance(column, pa.ChunkedArray):
+        column = column.combine_chunks()
+    if isinstance(column, pa.FixedSizeListArray):
+        bins = column.type.list_size
+        if column.null_count == 0:
+            return column.flatten().to_numpy(zero_copy_only=False).reshape(-1, bins)
+        matrix = np.zeros((len(column), bins), dtype=np.uint32)
+        valid = column.is_valid().to_numpy(zero_copy_only=False)
+        matrix[valid] = column.drop_null().flatten().to_numpy(zero_copy_only=False).reshape(-1, bins)
+        return matrix
+    matrix = np.zeros((len(column), HISTOGRAM_BINS), dtype=np.uint32)
+    valid = column.notna().to_numpy()
+    if valid.any():
+        matrix[valid] = np.stack(list(column[valid])).astype(np.uint32, copy=False)
+    return matrix
+
+def image_dimensions(df):
+    """Return (height, width) integer Series for a processed DataFrame.
+
+    Reads the typed height/width columns, or falls back to parsing the
+    legacy ``image_size`` column (tuples/arrays or their string form) with
+    vectorised operations, never eval().
+    """
+    if 'height' in df.columns and 'width' in df.columns:
+        return df['height'], df['width']
+    sizes = df['image_size']
+    if len(sizes) and isinstance(sizes.iloc[0], str):
+        parts = sizes.str.extract(r'(\d+)\D+(\d+)').astype('Int64')
+    else:
+        parts = pd.DataFrame(sizes.tolist(), index=sizes.index).iloc[:, :2].astype('Int64')
+    parts.columns = ['height', 'width']
+    return parts['height'], parts['width']
@@ -0,0 +1,120 @@
+import json
+import os
+import zlib
+import pyarrow.parquet as pq
+from src.schema import conform_table, unify_schemas
+
+# Directory under the ETL output that holds one sub-directory per shard
+SHARDS_DIR = 'shards'
+MANIFEST_NAME = 'manifest.json'
+DATA_NAME = 'processed_data.parquet'
+
+def parse_shard(spec):
+    """Parse an 'i/N' shard spec into (index, count), with 0 <= index < count"""
+    try:
+        index, count = (int(part) for part in str(spec).split('/'))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{spec}', expected INDEX/COUNT such as 0/4") from None
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard '{spec}', INDEX must be between 0 and COUNT - 1")
+    return index, count
+
+def shard_of(name, count):
+    """Shard an image belongs to, from its file name only.
+
+    CRC32 is stable across processes, machines and Python versions (unlike
+    hash()), so every node computes the same partition without talking to
+    the others, and an image keeps its shard wherever the data is mounted.
+    """
+    return zlib.crc32(os.path.basename(str(name)).encode('utf-8')) % count
+
+def in_shard(name, shard):
+    return shard is None or shard_of(name, shard[1]) == shard[0]
+
+def shard_dir(output_dir, shard):
+    """Output directory of one shard: <output_dir>/shards/<index>-of-<count>"""
+    index, count = shard
+    return os.path.join(output_dir, SHARDS_DIR, f"{index:03d}-of-{count:03d}")
+
+def write_manifest(directory, shard, rows, failed, config):
+    """Record that a shard finished, with what it wrote and the settings it used"""
+    manifest = {'shard': shard[0], 'shards': shard[1], 'rows': rows, 'failed': failed, 'config': config}
+    tmp_path = os.path.join(directory, MANIFEST_NAME + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(directory, MANIFEST_NAME))
+    return manifest
+
+def read_manifests(output_dir, count):
+    """Manifests of the shards of a count-way split, checked for completeness.
+
+    Raises:
+        ValueError: when shards are missing or unfinished, were run with a
+            different shard count, or with different transform settings
+    """
+    manifests = []
+    missing = []
+    for index in range(count):
+        path = os.path.join(shard_dir(output_dir, (index, count)), MANIFEST_NAME)
+        if not os.path.exists(path):
+            missing.append(f"{index}/{count}")
+            continue
+        with open(path) as f:
+            manifests.append(json.load(f))
+    if missing:
+        raise ValueError(f"Missing or unfinished shards: {', '.join(missing)}")
+    for manifest in manifests:
+        if manifest['shards'] != count:
+            raise ValueError(f"Shard {manifest['shard']} was run as part of a {manifest['shards']}-way split")
+    configs = {manifest['config'] for manifest in manifests}
+    if len(configs) > 1:
+        raise ValueError("Shards were processed with different settings, re-run them with the same options")
+    return manifests
+
+def merge_shards(output_dir, count):
+    """Combine the part files of every shard into <output_dir>/processed_data.parquet.
+
+    Rows are copied one row group at a time. Every image must sit in the
+    shard its name hashes to, so no image can be in two shards; repeated
+    images are looked for within each shard only, and memory grows with
+    the image names of the largest shard rather than the dataset.
+
+    Returns:
+        (path, rows) of the merged file
+
+    Raises:
+        ValueError: for missing, mismatched or overlapping shards
+    """
+    manifests = read_manifests(output_dir, count)
+    files = [os.path.join(shard_dir(output_dir, (m['shard'], count)), DATA_NAME) for m in manifests if m['rows']]
+    path = os.path.join(output_dir, DATA_NAME)
+    if not files:
+        raise ValueError("No shard wrote any rows")
+
+    schema = unify_schemas([pq.read_schema(file) for file in files])
+    rows = 0
+    tmp_path = path + '.tmp'
+    try:
+        with pq.ParquetWriter(tmp_path, schema) as out:
+            for manifest, file in zip([m for m in manifests if m['rows']], files):
+                parquet_file = pq.ParquetFile(file)
+                seen = set()
+                for i in range(parquet_file.num_row_groups):
+                    table = parquet_file.read_row_group(i)
+                    names = [os.path.basename(p) for p in table['image_path'].to_pylist()]
+                    misplaced = [n for n in names if shard_of(n, count) != manifest['shard']]
+                    if misplaced:
+                        raise ValueError(f"Shard {manifest['shard']}/{count} holds images of another shard, "
+                                         f"e.g. {misplaced[0]}")
+                    for name in names:
+                        if name in seen:
+                            raise ValueError(f"Image written more than once: {name}")
+                        seen.add(name)
+                    out.write_table(conform_table(table, schema))
+                    rows += len(table)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    print(f"Merged {count} shards into {rows} rows ({sum(m['failed'] for m in manifests)} images failed)")
+    return path, rows
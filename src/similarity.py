@@ -0,0 +1,235 @@
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+from src import dataset
+from src.schema import HISTOGRAM_BINS
+
+# Database rows scored against the queries per matrix product
+BLOCK_ROWS = 65536
+
+def popcount(words):
+    """Set bits of every element of a uint64 array (SWAR bit counting, no Python loop)"""
+    words = words - ((words >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    words = (words & np.uint64(0x3333333333333333)) + ((words >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    words = (words + (words >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return (words * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+def load_histograms(data_path=dataset.DATA_DIR, batch_size=50000):
+    """Read the stored colour histograms into one contiguous float32 matrix.
+
+    Only the image_path and histogram columns are streamed, one row group
+    at a time, straight into a matrix allocated once from the row count;
+    rows without a histogram are left out.
+
+    Returns:
+        (paths, matrix) with matrix of shape (len(paths), HISTOGRAM_BINS)
+
+    Raises:
+        ValueError: when the data has no list-typed histogram column (e.g. CSV output)
+    """
+    schema = dataset.schema(data_path)
+    if 'histogram' not in schema.names or not pa.types.is_fixed_size_list(schema.field('histogram').type):
+        raise ValueError(f"No stored histograms in {data_path}, re-run the ETL with parquet output")
+    matrix = np.empty((dataset.count_rows(data_path), HISTOGRAM_BINS), dtype=np.float32)
+    paths = []
+    for batch in dataset.iter_batches(data_path, columns=['image_path', 'histogram'],
+                                      filters=ds.field('histogram').is_valid(), batch_size=batch_size):
+        rows = batch.num_rows
+        matrix[len(paths):len(paths) + rows] = batch.column(1).flatten().to_numpy().reshape(rows, HISTOGRAM_BINS)
+        paths.extend(batch.column(0).to_pylist())
+    return paths, matrix[:len(paths)]
+
+def normalize(histograms):
+    """Hellinger-normalise histograms in place: square roots of the bin shares.
+
+    Every row becomes a unit vector, so the dot product of two rows is the
+    Bhattacharyya coefficient of their histograms: 1.0 for identical colour
+    distributions, 0.0 for distributions that share no bin. Empty
+    histograms become zero vectors.
+    """
+    histograms = np.asarray(histograms, dtype=np.float32)
+    if histograms.ndim == 1:
+        histograms = histograms.reshape(1, -1)
+    np.divide(histograms, np.maximum(histograms.sum(axis=1, keepdims=True), 1), out=histograms)
+    return np.sqrt(histograms, out=histograms)
+
+class RandomProjection:
+    """Sign random projection codes for approximate cosine search.
+
+    Each vector is reduced to ``bits`` signs of its projections onto random
+    hyperplanes (through the mean vector, since histograms all lie in one
+    orthant), packed into 64-bit words. Vectors at a small angle get codes
+    at a small Hamming distance, so the closest codes give a shortlist
+    that is then scored exactly, reading bits / 8 bytes per row instead of
+    1 KB.
+
+    Args:
+        vectors: Normalised float32 matrix to index
+        bits: Code length, a multiple of 64
+        seed: Seed of the random hyperplanes
+    """
+
+    def __init__(self, vectors, bits=64, seed=0):
+        if bits <= 0 or bits % 64:
+            raise ValueError(f"bits must be a positive multiple of 64, got {bits}")
+        rng = np.random.default_rng(seed)
+        self.bits = bits
+        self.center = vectors.mean(axis=0) if len(vectors) else np.zeros(vectors.shape[1], dtype=np.float32)
+        self.planes = rng.standard_normal((vectors.shape[1], bits)).astype(np.float32)
+        self.codes = np.empty((len(vectors), bits // 64), dtype=np.uint64)
+        for start in range(0, len(vectors), BLOCK_ROWS):
+            self.codes[start:start + BLOCK_ROWS] = self.encode(vectors[start:start + BLOCK_ROWS])
+
+    def encode(self, vectors):
+        """Packed codes of a matrix of vectors, one row of uint64 words per vector"""
+        signs = np.packbits((vectors - self.center) @ self.planes > 0, axis=1)
+        # Byte order does not matter for Hamming distances, any 8 bytes make a word
+        return np.ascontiguousarray(signs).view(np.uint64)
+
+    def candidates(self, vector, count):
+        """Row numbers of the count codes closest to a vector's code, in no particular order"""
+        distances = popcount(self.codes ^ self.encode(vector.reshape(1, -1))).sum(axis=1)
+        if count >= len(distances):
+            return np.arange(len(distances))
+        return np.argpartition(distances, count)[:count]
+
+def _top_k(scores, rows, k):
+    """The k best (score, row) pairs of one query, best first"""
+    if len(scores) > k:
+        best = np.argpartition(-scores, k - 1)[:k]
+        scores, rows = scores[best], rows[best]
+    order = np.argsort(-scores, kind='stable')
+    return scores[order], rows[order]
+
+class HistogramIndex:
+    """k-nearest-neighbour search over the stored colour histograms.
+
+    Histograms are normalised with normalize() into one contiguous float32
+    matrix, and queries are scored against it in blocks of BLOCK_ROWS rows
+    with a single matrix product per block. With ``bits`` a RandomProjection
+    index is built as well and search() only scores a shortlist of
+    ``candidates`` rows per query, which is what keeps millions of rows fast.
+
+    Args:
+        paths: Image path of every row
+        histograms: Matrix of raw histogram counts, one row per path (normalised in place)
+        bits: Build a random projection index with codes of this many bits
+        seed: Seed of the random projection
+    """
+
+    def __init__(self, paths, histograms, bits=None, seed=0):
+        self.paths = list(paths)
+        self.rows = {path: row for row, path in enumerate(self.paths)}
+        self.vectors = normalize(histograms)
+        self.projection = RandomProjection(self.vectors, bits, seed) if bits else None
+
+    @classmethod
+    def from_data(cls, data_path=dataset.DATA_DIR, bits=None, seed=0):
+        """Index the histograms of the processed data in data_path"""
+        paths, histograms = load_histograms(data_path)
+        return cls(paths, histograms, bits, seed)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def search(self, histograms, k=10, exclude=None, candidates=None):
+        """Find the k stored images whose histograms are most similar to each query.
+
+        Args:
+            histograms: One raw histogram or a matrix of them
+            k: Number of neighbours per query
+            exclude: Optional row number per query to leave out (the query itself)
+            candidates: Shortlist size per query for the random projection
+                index (default 50 * k); ignored without one
+
+        Returns:
+            One list of (path, similarity) pairs per query, most similar first
+        """
+        queries = normalize(np.array(histograms, dtype=np.float32))
+        exclude = list(exclude) if exclude is not None else [None] * len(queries)
+        k = min(k, len(self.paths) - any(row is not None for row in exclude))
+        if k <= 0:
+            return [[] for _ in queries]
+
+        if self.projection is not None:
+            results = []
+            for query, skip in zip(queries, exclude):
+                rows = self.projection.candidates(query, max(candidates or 50 * k, k + 1))
+                if skip is not None:
+                    rows = rows[rows != skip]
+                scores, rows = _top_k(self.vectors[rows] @ query, rows, k)
+                results.append((scores, rows))
+        else:
+            results = self._exact(queries, k, exclude)
+        return [[(self.paths[row], float(score)) for score, row in zip(scores, rows)] for scores, rows in results]
+
+    def _exact(self, queries, k, exclude):
+        """Blocked brute force: keep the running top k of every query across blocks"""
+        best = [(np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)) for _ in queries]
+        for start in range(0, len(self.vectors), BLOCK_ROWS):
+            scores = queries @ self.vectors[start:start + BLOCK_ROWS].T
+            rows = np.arange(start, start + scores.shape[1])
+            for i, skip in enumerate(exclude):
+                if skip is not None and start <= skip < start + scores.shape[1]:
+                    scores[i, skip - start] = -np.inf
+                best[i] = _top_k(np.concatenate([best[i][0], scores[i]]), np.concatenate([best[i][1], rows]), k)
+        return best
+
+    def similar_to(self, image_paths, k=10, candidates=None):
+        """Most similar stored images for image files.
+
+        A file that is already in the index is looked up by its path and
+        left out of its own results; any other file is decoded and its
+        histogram computed the same way as in the ETL.
+
+        Returns:
+            Dict {image path: [(path, similarity), ...]}
+        """
+        from src.etl_pipeline import color_histogram, decode_image
+
+        histograms = np.empty((len(image_paths), HISTOGRAM_BINS), dtype=np.float32)
+        exclude = []
+        for i, path in enumerate(image_paths):
+            row = self.rows.get(path)
+            exclude.append(row)
+            if row is not None:
+                # Stored rows hold the square roots of the bin shares
+                histograms[i] = self.vectors[row] ** 2
+            else:
+                histograms[i] = color_histogram(decode_image(path))
+        return dict(zip(image_paths, self.search(histograms, k, exclude, candidates)))
+
+def find_similar(image_paths, data_path=dataset.DATA_DIR, k=10, bits=None, candidates=None):
+    """Index the processed data in data_path and return the k most similar memes for each image
+
+    Args:
+        image_paths: Query image files, stored in the data or not
+        data_path: Processed data directory
+        k: Number of neighbours per image
+        bits: Use a random projection index with codes of this many bits
+        candidates: Shortlist size per query for the random projection index
+
+    Returns:
+        Dict {image path: [(path, similarity), ...]}
+    """
+    index = HistogramIndex.from_data(data_path, bits=bits)
+    return index.similar_to(list(image_paths), k, candidates)
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Find the memes whose colour histograms are most similar')
+    parser.add_argument('images', nargs='+', help='Query image files')
+    parser.add_argument('--data-path', type=str, default=dataset.DATA_DIR,
+                        help='Path to processed data directory')
+    parser.add_argument('-k', type=int, default=10, help='Number of similar memes per image')
+    parser.add_argument('--approximate', type=int, nargs='?', const=64, default=None, metavar='BITS',
+                        help='Search a random projection index with BITS-bit codes (default 64)')
+    parser.add_argument('--candidates', type=int, default=None,
+                        help='Rows scored exactly per query with --approximate (default 50 * k)')
+    args = parser.parse_args()
+
+    for image, matches in find_similar(args.images, args.data_path, args.k, args.approximate,
+                                       args.candidates).items():
+        print(f"{image}:")
+        for path, similarity in matches:
+            print(f"  {similarity:.4f}  {path}")
@@ -0,0 +1,378 @@
+import base64
+import gzip
+import hashlib
+import heapq
+import json
+import os
+import re
+import zlib
+from collections import Counter
+import numpy as np
+from src import dataset
+
+# Same tokenisation as sklearn's CountVectorizer defaults
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+INDEX_FILENAME = 'term_index.json.gz'
+
+_stop_words = None
+
+def stop_words():
+    """English stop word list, imported from sklearn on first use"""
+    global _stop_words
+    if _stop_words is None:
+        from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+        _stop_words = ENGLISH_STOP_WORDS
+    return _stop_words
+
+def tokenize(text):
+    """Lowercased word tokens of a text, without English stop words"""
+    if not isinstance(text, str):
+        return []
+    stop = stop_words()
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in stop]
+
+class HeavyHitters:
+    """Memory-bounded term counter: a count-min sketch plus a top-N candidate set.
+
+    The sketch gives an over-estimate of any term's count using
+    depth * width integers; the candidate dict keeps the ``capacity`` terms
+    with the highest estimates, which is what top-k queries read.
+    """
+
+    def __init__(self, width=2 ** 14, depth=4, capacity=1000):
+        self.width = width
+        self.depth = depth
+        self.capacity = capacity
+        self.sketch = np.zeros((depth, width), dtype=np.int64)
+        self.candidates = {}
+        self._weakest = None
+
+    def _buckets(self, term):
+        data = term.encode('utf-8')
+        # crc32 seeded per row gives depth independent, process-stable hashes
+        return [zlib.crc32(data, seed) % self.width for seed in range(1, self.depth + 1)]
+
+    def update(self, counts):
+        """Add a {term: count} mapping"""
+        rows = np.arange(self.depth)
+        for term, count in counts.items():
+            buckets = self._buckets(term)
+            self.sketch[rows, buckets] += count
+            estimate = int(self.sketch[rows, buckets].min())
+            if term in self.candidates:
+                self.candidates[term] = estimate
+                if term == self._weakest:
+                    self._weakest = None
+            elif len(self.candidates) < self.capacity:
+                self.candidates[term] = estimate
+                self._weakest = None
+            else:
+                # The weakest candidate is cached until the candidate set changes
+                if self._weakest is None:
+                    self._weakest = min(self.candidates, key=self.candidates.get)
+                if estimate > self.candidates[self._weakest]:
+                    del self.candidates[self._weakest]
+                    self.candidates[term] = estimate
+                    self._weakest = None
+
+    def subtract(self, counts):
+        """Take a {term: count} mapping added earlier out again.
+
+        Estimates stay upper bounds of the true counts. A candidate whose
+        estimate drops keeps its place, since the terms outside the
+        candidate set are not known.
+        """
+        rows = np.arange(self.depth)
+        for term, count in counts.items():
+            buckets = self._buckets(term)
+            self.sketch[rows, buckets] -= count
+            if term in self.candidates:
+                self.candidates[term] = int(self.sketch[rows, buckets].min())
+        self.candidates = {term: estimate for term, estimate in self.candidates.items() if estimate > 0}
+        self._weakest = None
+
+    def most_common(self, k):
+        return heapq.nlargest(k, self.candidates.items(), key=lambda item: item[1])
+
+    def to_dict(self):
+        return {
+            'width': self.width, 'depth': self.depth, 'capacity': self.capacity,
+            'sketch': self.sketch.tolist(), 'candidates': self.candidates,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        counter = cls(data['width'], data['depth'], data['capacity'])
+        counter.sketch = np.asarray(data['sketch'], dtype=np.int64)
+        counter.candidates = dict(data['candidates'])
+        return counter
+
+class KeyFilter:
+    """Bloom filter over document keys: a fixed number of bits however many keys are added.
+
+    Membership tests can return false positives (about 2% with 4 hashes at
+    1M keys in 2**23 bits) but never false negatives. Keys cannot be
+    removed, which is fine for documents that are replaced in place.
+    """
+
+    def __init__(self, bits=2 ** 23, hashes=4):
+        self.bits = bits
+        self.hashes = hashes
+        self.array = np.zeros(bits // 8, dtype=np.uint8)
+
+    def _positions(self, key):
+        # Double hashing from one digest; seeded crc32s are affine in each other and collide together
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.bits for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.array[position >> 3] |= np.uint8(1 << (position & 7))
+
+    def __contains__(self, key):
+        return all(self.array[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def to_dict(self):
+        return {'bits': self.bits, 'hashes': self.hashes,
+                'array': base64.b64encode(zlib.compress(self.array.tobytes())).decode('ascii')}
+
+    @classmethod
+    def from_dict(cls, data):
+        keys = cls(data['bits'], data['hashes'])
+        keys.array = np.frombuffer(zlib.decompress(base64.b64decode(data['array'])), dtype=np.uint8).copy()
+        return keys
+
+class TermIndex:
+    """Persistent term-frequency index over the OCR text, updated incrementally.
+
+    Keeps one counter for the whole corpus and one per group (the sentiment
+    label), so top-k and per-sentiment top-k are dictionary lookups rather
+    than a refit over every text. Documents are registered by key
+    (image_path) and counted once by update(). Like src.rollups.Rollup,
+    add() and subtract() fold in the rows of an Arrow table, which is how
+    an ETL run replaces the documents of images it processed again.
+
+    In bounded mode the document keys go into a KeyFilter instead of a
+    set, so neither memory nor the saved file grows with the corpus.
+
+    Args:
+        bounded: Use HeavyHitters counters and a KeyFilter instead of exact Counters and a key set
+        group_column: Column of the tables given to add()/subtract() holding the group label
+        **sketch_options: width/depth/capacity for the bounded counters
+    """
+
+    def __init__(self, bounded=False, group_column=None, **sketch_options):
+        self.bounded = bounded
+        self.group_column = group_column
+        # dataset.fingerprint of the data the counts describe
+        self.data = None
+        self.sketch_options = sketch_options
+        self.doc_keys = KeyFilter() if bounded else set()
+        self.documents = 0
+        self.total = self._new_counter()
+        self.groups = {}
+
+    def _new_counter(self):
+        return HeavyHitters(**self.sketch_options) if self.bounded else Counter()
+
+    def _count(self, texts, groups):
+        """(total counts, {group: counts}) of a batch of texts"""
+        batch_total = Counter()
+        batch_groups = {}
+        for text, group in zip(texts, groups):
+            tokens = Counter(tokenize(text))
+            batch_total.update(tokens)
+            if group is not None:
+                batch_groups.setdefault(str(group), Counter()).update(tokens)
+        return batch_total, batch_groups
+
+    def _fold(self, texts, groups):
+        # Fold the batch in once per counter, which keeps the sketch updates cheap
+        batch_total, batch_groups = self._count(texts, groups)
+        self.total.update(batch_total)
+        for group, counts in batch_groups.items():
+            self.groups.setdefault(group, self._new_counter()).update(counts)
+        self.documents += len(texts)
+
+    def _columns(self, table):
+        """(texts, groups, keys) lists of an Arrow table or record batch"""
+        names = table.schema.names
+        texts = table.column(names.index('text')).to_pylist() if 'text' in names else [None] * table.num_rows
+        if self.group_column in names:
+            groups = table.column(names.index(self.group_column)).to_pylist()
+        else:
+            groups = [None] * table.num_rows
+        return texts, groups, table.column(names.index('image_path')).to_pylist()
+
+    def update(self, texts, groups=None, keys=None):
+        """Count the tokens of new documents.
+
+        Args:
+            texts: Iterable of OCR texts
+            groups: Optional iterable of group labels (e.g. sentiment), one per text
+            keys: Optional iterable of document keys; documents already indexed are skipped
+
+        Returns:
+            Number of documents added
+        """
+        texts = list(texts)
+        groups = list(groups) if groups is not None else [None] * len(texts)
+        keys = list(keys) if keys is not None else [None] * len(texts)
+
+        new = []
+        for text, group, key in zip(texts, groups, keys):
+            if key is not None:
+                if key in self.doc_keys:
+                    continue
+                self.doc_keys.add(key)
+            new.append((text, group))
+        self._fold([text for text, _ in new], [group for _, group in new])
+        return len(new)
+
+    def add(self, table):
+        """Count every row of an Arrow table (image_path, text and the group column are read)"""
+        texts, groups, keys = self._columns(table)
+        for key in keys:
+            self.doc_keys.add(key)
+        self._fold(texts, groups)
+
+    def subtract(self, table):
+        """Take rows counted earlier out again, e.g. rows a re-run replaces"""
+        texts, groups, keys = self._columns(table)
+        if not self.bounded:
+            self.doc_keys.difference_update(keys)
+        batch_total, batch_groups = self._count(texts, groups)
+        pairs = [(self.total, batch_total)]
+        pairs += [(self.groups[group], counts) for group, counts in batch_groups.items() if group in self.groups]
+        for counter, counts in pairs:
+            counter.subtract(counts)
+            if not self.bounded:
+                # Drop emptied terms so the index stays as small as the data it describes
+                for term in [term for term in counts if counter[term] <= 0]:
+                    del counter[term]
+        self.documents -= len(keys)
+
+    def top_k(self, k=20, group=None):
+        """Return the k most frequent terms as a list of (term, count) pairs"""
+        counter = self.total if group is None else self.groups.get(str(group))
+        if counter is None:
+            return []
+        return counter.most_common(k)
+
+    def _dump_counter(self, counter):
+        return counter.to_dict() if self.bounded else dict(counter)
+
+    def _load_counter(self, data):
+        return HeavyHitters.from_dict(data) if self.bounded else Counter(data)
+
+    def save(self, path):
+        """Write the index as gzipped JSON (atomically)"""
+        data = {
+            'bounded': self.bounded,
+            'group_column': self.group_column,
+            'data': self.data,
+            'sketch_options': self.sketch_options,
+            'documents': self.documents,
+            'doc_keys': self.doc_keys.to_dict() if self.bounded else sorted(self.doc_keys),
+            'total': self._dump_counter(self.total),
+            'groups': {group: self._dump_counter(c) for group, c in self.groups.items()},
+        }
+        tmp_path = path + '.tmp'
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+        index = cls(data['bounded'], data.get('group_column'), **data['sketch_options'])
+        index.data = data.get('data')
+        index.documents = data['documents']
+        if isinstance(data['doc_keys'], dict):
+            index.doc_keys = KeyFilter.from_dict(data['doc_keys'])
+        elif index.bounded:
+            # Indexes saved before the key filter hold the raw keys
+            for key in data['doc_keys']:
+                index.doc_keys.add(key)
+        else:
+            index.doc_keys = set(data['doc_keys'])
+        index.total = index._load_counter(data['total'])
+        index.groups = {group: index._load_counter(c) for group, c in data['groups'].items()}
+        return index
+
+def _fill(index, data_path, batch_size=10000):
+    """Feed the processed data to index.update one record batch at a time; returns the documents added"""
+    columns = ['image_path', 'text'] + ([index.group_column] if index.group_column else [])
+    added = 0
+    for batch in dataset.iter_batches(data_path, columns=columns, batch_size=batch_size):
+        added += index.update(*index._columns(batch))
+    return added
+
+def update_from_parquet(parquet_path, index_path=None, group_column=None, rebuild=False, bounded=False,
+                        batch_size=10000):
+    """Bring the term index next to a processed parquet file up to date.
+
+    Only the text, key and group columns are read, one record batch at a
+    time, and rows whose image_path is already indexed are skipped.
+
+    Args:
+        parquet_path: processed_data.parquet to index
+        index_path: Index file (defaults to term_index.json.gz next to the parquet)
+        group_column: Label column to keep per-group counts for
+        rebuild: Start from an empty index instead of the saved one
+        bounded: Use the memory-bounded counters when creating a new index
+        batch_size: Rows read per batch
+
+    Returns:
+        The updated TermIndex
+    """
+    index_path = index_path or os.path.join(os.path.dirname(parquet_path), INDEX_FILENAME)
+    if os.path.exists(index_path) and not rebuild:
+        index = TermIndex.load(index_path)
+        index.group_column = index.group_column or group_column
+    else:
+        index = TermIndex(bounded=bounded, group_column=group_column)
+
+    added = _fill(index, parquet_path, batch_size)
+    index.data = dataset.fingerprint(parquet_path)
+    index.save(index_path)
+    print(f"Term index: added {added} documents ({index.documents} total)", flush=True)
+    return index
+
+def term_index_path(data_path):
+    """Where the term index of the processed data in data_path lives"""
+    return os.path.join(data_path, INDEX_FILENAME)
+
+def save_term_index(index, data_path):
+    """Save the term index of the processed data in data_path, stamped with the data's fingerprint"""
+    index.data = dataset.fingerprint(data_path)
+    index.save(term_index_path(data_path))
+
+def open_term_index(data_path, group_column=None, rebuild=False, bounded=False):
+    """The term index an ETL run should update, like src.rollups.open_rollup.
+
+    That is the saved index when it still describes the data in data_path,
+    else one counted from the data. Returns an empty index when there is
+    no data yet or the run replaces it (rebuild).
+    """
+    try:
+        dataset.data_file(data_path)
+    except FileNotFoundError:
+        return TermIndex(bounded=bounded, group_column=group_column)
+    if rebuild:
+        return TermIndex(bounded=bounded, group_column=group_column)
+    path = term_index_path(data_path)
+    if os.path.exists(path):
+        try:
+            index = TermIndex.load(path)
+            if index.group_column == group_column and index.data == dataset.fingerprint(data_path):
+                return index
+        except (OSError, ValueError, KeyError):
+            pass
+    print(f"Term index: counting the existing data in {data_path}", flush=True)
+    index = TermIndex(bounded=bounded, group_column=group_column)
+    _fill(index, data_path)
+    return index
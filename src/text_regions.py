@@ -0,0 +1,131 @@
+import cv2
+import numpy as np
+
+METHODS = ('bands', 'contours')
+
+# Share of the image height the top/bottom caption bands cover
+BAND_FRACTION = 0.25
+
+def caption_bands(shape, fraction=BAND_FRACTION):
+    """Top and bottom bands of an image, where classic meme captions sit.
+
+    Returns:
+        List of (x, y, width, height) boxes
+    """
+    height, width = shape[:2]
+    band = max(1, int(height * fraction))
+    return [(0, 0, width, band), (0, height - band, width, band)]
+
+def _merge_boxes(boxes):
+    """Merge overlapping (x, y, w, h) boxes until none overlap, sorted top to bottom"""
+    boxes = [list(box) for box in boxes]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                ax, ay, aw, ah = boxes[i]
+                bx, by, bw, bh = boxes[j]
+                if ax < bx + bw and bx < ax + aw and ay < by + bh and by < ay + ah:
+                    x, y = min(ax, bx), min(ay, by)
+                    boxes[i] = [x, y, max(ax + aw, bx + bw) - x, max(ay + ah, by + bh) - y]
+                    del boxes[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return sorted((tuple(box) for box in boxes), key=lambda box: (box[1], box[0]))
+
+def _line_strips(binary, min_height, padding):
+    """Full-width strips around the text-line blobs of a binary edge/stroke map"""
+    height, width = binary.shape
+    kernel_width = max(9, width // 40)
+    closed = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (kernel_width, 1)))
+    contours, _ = cv2.findContours(closed, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    strips = []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        if h < min_height or h > height * 0.3 or w < 2 * h:
+            continue
+        # Text lines are mostly filled once closed; scattered texture is not
+        if cv2.countNonZero(closed[y:y + h, x:x + w]) < 0.45 * w * h:
+            continue
+        y0, y1 = max(0, y - padding), min(height, y + h + padding)
+        strips.append((0, y0, width, y1 - y0))
+    return strips
+
+def text_boxes(image, min_height=8, padding=6):
+    """Find likely text lines and return them as full-width strips.
+
+    Two maps of text-like pixels are searched for wide, well-filled blobs
+    once they are smeared along rows:
+
+    - edges from the morphological gradient, keeping only connected blobs
+      no taller than a line of text (drops outlines of large shapes)
+    - thin strokes from the top-hat/black-hat transforms, which ignore
+      large uniform shapes even where a caption touches them
+
+    Strips span the full width so words at the edges of a caption are
+    never cut off.
+
+    Args:
+        image: Grayscale or RGB/BGR ndarray
+        min_height: Smallest text line height in pixels
+        padding: Pixels added above and below each line
+
+    Returns:
+        List of (x, y, width, height) boxes, merged and sorted top to bottom
+    """
+    gray = image if image.ndim == 2 else cv2.cvtColor(np.ascontiguousarray(image), cv2.COLOR_RGB2GRAY)
+    height, width = gray.shape
+
+    gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+    _, edges = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    count, components, stats, _ = cv2.connectedComponentsWithStats(edges, connectivity=8)
+    line_sized = (stats[:, cv2.CC_STAT_HEIGHT] >= min_height // 2) & (stats[:, cv2.CC_STAT_HEIGHT] <= height * 0.2)
+    line_sized[0] = False
+    edges = np.where(line_sized[components], 255, 0).astype(np.uint8)
+
+    size = max(15, min(height, width) // 20)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (size, size))
+    strokes = np.maximum(cv2.morphologyEx(gray, cv2.MORPH_TOPHAT, kernel),
+                         cv2.morphologyEx(gray, cv2.MORPH_BLACKHAT, kernel))
+    _, strokes = cv2.threshold(strokes, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+
+    return _merge_boxes(_line_strips(edges, min_height, padding) + _line_strips(strokes, min_height, padding))
+
+def find_text_regions(image, method='contours'):
+    """Regions of an image worth OCRing.
+
+    'bands' always returns the top and bottom caption bands. 'contours'
+    looks for text lines anywhere and falls back to the bands when it finds
+    none, so an image is never skipped entirely.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown text region method '{method}', choose one of: {', '.join(METHODS)}")
+    if method == 'contours':
+        boxes = text_boxes(image)
+        if boxes:
+            return boxes
+    return _merge_boxes(caption_bands(image.shape))
+
+def coverage(boxes, shape):
+    """Fraction of the image area the boxes cover"""
+    height, width = shape[:2]
+    return sum(w * h for _, _, w, h in boxes) / float(height * width)
+
+def stack_regions(image, boxes, gap=12):
+    """Stack the crops of an image into one tall image, separated by white gaps.
+
+    Tesseract then reads every region in a single call.
+    """
+    crops = [image[y:y + h, x:x + w] for x, y, w, h in boxes]
+    width = max(crop.shape[1] for crop in crops)
+    height = sum(crop.shape[0] for crop in crops) + gap * (len(crops) + 1)
+    canvas = np.full((height, width) + image.shape[2:], 255, dtype=image.dtype)
+    y = gap
+    for crop in crops:
+        canvas[y:y + crop.shape[0], :crop.shape[1]] = crop
+        y += crop.shape[0] + gap
+    return canvas
@@ -1,24 +1,61 @@
 # src/visualization.py
+import os
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
+from src import dataset
+from src.analyze_data import SENTIMENT_COLUMNS, word_counts
+from src.plotting import pyplot, seaborn
+from src.rollups import load_rollup
+
+def analyze(data_path=dataset.DATA_DIR, output_path=None):
+    """Plot the sentiment counts and text lengths of the processed data.
+
+    Both come from the data's rollup when it is up to date; otherwise only
+    the sentiment and text columns are read from the parquet file.
+
+    Args:
+        data_path: Processed data directory (relative to the project root by default)
+        output_path: PNG to write; analysis_results.png in data_path when None
+    """
+    rollup = load_rollup(data_path)
+    if rollup is not None:
+        sentiment_column = next((c for c in SENTIMENT_COLUMNS if c in rollup.present), None)
+        counts = pd.Series(rollup.distribution(sentiment_column)) if sentiment_column else None
+        lengths, weights = rollup.histogram('word_count')
+    else:
+        names = dataset.columns(data_path)
+        sentiment_column = next((c for c in SENTIMENT_COLUMNS if c in names), None)
+        data = dataset.read_frame(data_path, columns=[sentiment_column, 'text'] if sentiment_column else ['text'])
+        counts = data[sentiment_column].value_counts() if sentiment_column else None
+        lengths = word_counts(data['text']).to_numpy() if 'text' in data.columns else []
+        weights = None
+    plt = pyplot()
+    sns = seaborn()
+
+    fig, (sentiment_ax, text_ax) = plt.subplots(1, 2, figsize=(18, 8))
 
-def analyze():
-    data = pd.read_parquet('/app/data/processed/processed_data.parquet')
-    
     # Sentiment analysis
-    plt.figure(figsize=(12, 8))
-    sns.countplot(data=data, x='sentiment')
-    plt.title('Meme Sentiment Analysis')
-    
+    if counts is not None:
+        sns.barplot(x=counts.index.astype(str), y=counts.to_numpy(), ax=sentiment_ax)
+    sentiment_ax.set_title('Meme Sentiment Analysis')
+
     # Text analysis
-    word_counts = data['text'].str.split().apply(len)
-    plt.figure(figsize=(10, 6))
-    sns.histplot(word_counts, bins=30)
-    plt.title('Text Length Distribution')
-    
+    if len(lengths):
+        sns.histplot(x=lengths, weights=weights, bins=30, ax=text_ax)
+    text_ax.set_title('Text Length Distribution')
+
     # Save visualizations
-    plt.savefig('/app/data/processed/analysis_results.png')
+    output_path = output_path or os.path.join(os.path.dirname(dataset.data_file(data_path)), 'analysis_results.png')
+    fig.savefig(output_path)
+    plt.close(fig)
+    return output_path
 
 if __name__ == '__main__':
-    analyze()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description='Plot sentiment and text length of processed data')
+    parser.add_argument('--data-path', type=str, default=dataset.DATA_DIR,
+                        help='Path to processed data directory')
+    parser.add_argument('--output', type=str, default=None,
+                        help='PNG to write (default: analysis_results.png next to the data)')
+    args = parser.parse_args()
+
+    print(f"Saved {analyze(args.data_path, args.output)}")
@@ -1,66 +1,251 @@
-import pandas as pd
 import pymongo
-import os
 import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
+from pymongo import ASCENDING, TEXT, IndexModel, ReplaceOne, WriteConcern
 from pymongo.errors import BulkWriteError
 from dotenv import load_dotenv
+from src import dataset, progress
+from src.rollups import HISTOGRAMS, LABEL_COLUMNS, load_rollup
 
 # Load environment variables from .env file
 load_dotenv()
 
-def connect_to_mongodb():
-    """Connect to MongoDB Atlas using credentials from environment variables"""
+# Declarative index plan for the processed_data collection. The full label
+# compound serves overall_sentiment-led combinations, the (label,
+# overall_sentiment) pairs serve filters that start from another label, and
+# the text index serves $text searches. Queries in src.warehouse_queries
+# hint these indexes by name.
+INDEX_PLAN = [
+    {'name': 'image_id_unique', 'keys': [('image_id', ASCENDING)], 'unique': True},
+    {'name': 'labels_all', 'keys': [(label, ASCENDING) for label in LABEL_COLUMNS]},
+] + [
+    {'name': f'{label}_sentiment', 'keys': [(label, ASCENDING), ('overall_sentiment', ASCENDING)]}
+    for label in LABEL_COLUMNS[1:]
+] + [
+    {'name': 'text_search', 'keys': [('text', TEXT)]},
+]
+
+def ensure_indexes(collection, plan=INDEX_PLAN):
+    """Create the indexes of the plan that the collection does not have yet.
+
+    Existing indexes are left alone, so calling this on every load costs a
+    single listIndexes round trip once the plan is in place. Missing
+    indexes are built in the background.
+
+    Returns:
+        Names of the indexes that were created
+    """
+    existing = set(collection.index_information())
+    missing = [
+        IndexModel(spec['keys'], name=spec['name'], background=True,
+                   **({'unique': True} if spec.get('unique') else {}))
+        for spec in plan if spec['name'] not in existing
+    ]
+    if not missing:
+        return []
+    return collection.create_indexes(missing)
+
+def connect_to_mongodb(max_pool_size=None):
+    """Connect to MongoDB Atlas using credentials from environment variables
+    
+    Args:
+        max_pool_size: Connection pool size; set it to at least the number
+            of concurrent writers so they never wait for a socket
+    """
     connection_string = os.getenv('MONGO_CONNECTION_STRING')
     if not connection_string:
         raise ValueError("MongoDB connection string not found in environment variables")
     
-    client = pymongo.MongoClient(connection_string)
+    options = {}
+    if max_pool_size:
+        options['maxPoolSize'] = max_pool_size
+    client = pymongo.MongoClient(connection_string, **options)
     return client
 
-def load_to_warehouse(data_path, collection_name='processed_data'):
+def image_id(image_path):
+    """Stable document id for an image: its file name, independent of where the data lives"""
+    return os.path.basename(str(image_path).replace('\\', '/'))
+
+def _with_id(record):
+    """Give a record its stable image_id, also used as the document _id.
+
+    A near-duplicate's duplicate_of becomes the image_id of its canonical
+    image, so the two documents link up inside the warehouse.
+    """
+    record['image_id'] = image_id(record['image_path'])
+    record['_id'] = record['image_id']
+    if record.get('duplicate_of'):
+        record['duplicate_of'] = image_id(record['duplicate_of'])
+    return record
+
+def _documents(records, skip_duplicates=False):
+    """BSON-ready documents for a batch of records; skipped duplicates count as done for progress"""
+    documents = [_with_id(record) for record in records if not (skip_duplicates and record.get('duplicate_of'))]
+    if len(documents) < len(records):
+        progress.advance(len(records) - len(documents))
+    return documents
+
+def iter_document_batches(data_path, batch_size=1000, table=None, skip_duplicates=False):
+    """Yield lists of BSON-ready documents from the processed data, batch by batch.
+
+    Parquet is streamed by row group from the memory-mapped file (see
+    src.dataset) and converted straight to Python values (the histogram
+    becomes a list of ints), so only one batch is ever held in memory. CSV
+    input is read in chunks of the same size. An Arrow table handed over
+    in memory is sliced the same way. With
+    skip_duplicates, rows that are near-duplicates of another image are
+    left out, so a batch can be shorter than batch_size.
+    """
+    if table is not None:
+        print(f"Streaming {table.num_rows} records from memory")
+        progress.start_items(table.num_rows, unit='doc')
+        for batch in table.to_batches(max_chunksize=batch_size):
+            yield _documents(batch.to_pylist(), skip_duplicates)
+        return
+
+    path = dataset.data_file(data_path)
+    rows = dataset.count_rows(path)
+    print(f"Streaming {rows} records from {os.path.basename(path)}")
+    progress.start_items(rows, unit='doc')
+    for batch in dataset.iter_batches(path, batch_size=batch_size):
+        yield _documents(batch.to_pylist(), skip_duplicates)
+
+# Collection holding the pre-aggregated label counts and histograms of src.rollups
+ROLLUP_COLLECTION = 'label_rollups'
+
+def rollup_documents(rollup):
+    """Pre-aggregated documents for a Rollup.
+
+    One document per label combination, with the label values as
+    top-level fields (like the processed_data documents) and its row
+    count, plus one document per histogram with its [bin_start, rows] pairs.
+    """
+    documents = []
+    for cell, count in rollup.cells.items():
+        labels = {label: value for label, value in zip(rollup.labels, cell) if label in rollup.present}
+        documents.append({'_id': 'labels:' + json.dumps(cell), 'kind': 'labels', **labels, 'count': count})
+    for name, counts in rollup.histograms.items():
+        documents.append({'_id': f'histogram:{name}', 'kind': 'histogram', 'name': name,
+                          'bin_width': HISTOGRAMS[name], 'bins': sorted(counts.items())})
+    return documents
+
+def load_rollups(collection, rollup):
+    """Replace the rollup documents in a collection with those of a Rollup.
+
+    Returns:
+        Number of rollup documents written
+    """
+    documents = rollup_documents(rollup)
+    if documents:
+        collection.bulk_write([ReplaceOne({'_id': doc['_id']}, doc, upsert=True) for doc in documents],
+                              ordered=False)
+    # Label combinations that no longer occur in the data
+    collection.delete_many({'_id': {'$nin': [doc['_id'] for doc in documents]}})
+    return len(documents)
+
+def write_batch(collection, documents):
+    """Upsert one batch of documents keyed on _id with an unordered bulk_write.
+
+    Returns:
+        (documents, upserted, modified, errors) counts
+    """
+    if not documents:
+        return 0, 0, 0, 0
+    requests = [ReplaceOne({'_id': doc['_id']}, doc, upsert=True) for doc in documents]
+    try:
+        result = collection.bulk_write(requests, ordered=False)
+        if not result.acknowledged:
+            # w=0: the server sends no counts back
+            return len(documents), 0, 0, 0
+        return len(documents), result.upserted_count, result.modified_count, 0
+    except BulkWriteError as bwe:
+        details = bwe.details
+        print(f"Error during bulk write: {details['writeErrors'][:1]}")
+        return len(documents), details.get('nUpserted', 0), details.get('nModified', 0), len(details['writeErrors'])
+
+def _write_batches(collection, batches, workers=1):
+    """Yield write_batch results for every batch, keeping up to 2 * workers in flight.
+
+    Writers share the client's connection pool. Reading the next batch
+    blocks while the in-flight queue is full, so a slow cluster throttles
+    the parquet reader instead of letting batches pile up in memory.
+    """
+    if workers <= 1:
+        for documents in batches:
+            yield write_batch(collection, documents)
+        return
+
+    max_pending = workers * 2
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for documents in batches:
+            pending.add(pool.submit(write_batch, collection, documents))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in as_completed(pending):
+            yield future.result()
+
+def load_to_warehouse(data_path, collection_name='processed_data', batch_size=1000, client=None,
+                      workers=1, write_concern=None, table=None, skip_duplicates=False, rollups=True):
     """Load processed data into MongoDB data warehouse
     
+    Documents are upserted on their image id, so loading the same data
+    again updates the existing documents instead of duplicating them.
+
     Args:
         data_path: Path to the processed data directory
         collection_name: Name of the collection to store data in
+        batch_size: Documents per parquet read and per bulk_write call
+        client: Optional pymongo-compatible client (defaults to connect_to_mongodb())
+        workers: Number of batches written concurrently
+        write_concern: Optional dict of WriteConcern options, e.g. {'w': 1, 'j': False}
+        table: Processed data as an in-memory Arrow table; read from data_path when None
+        skip_duplicates: Only load canonical images, leaving out rows with a duplicate_of
+        rollups: Also load the data's rollup (src.rollups) into the label_rollups
+            collection, when it is up to date; it always counts every row
     """
     try:
-        # Load data from parquet or csv
-        if os.path.exists(os.path.join(data_path, 'processed_data.parquet')):
-            df = pd.read_parquet(os.path.join(data_path, 'processed_data.parquet'))
-            print(f"Loaded {len(df)} records from parquet file")
-        elif os.path.exists(os.path.join(data_path, 'processed_data.csv')):
-            df = pd.read_csv(os.path.join(data_path, 'processed_data.csv'))
-            print(f"Loaded {len(df)} records from CSV file")
-        else:
-            raise FileNotFoundError(f"No processed data found in {data_path}")
-        
         # Connect to MongoDB
-        client = connect_to_mongodb()
+        client = client or connect_to_mongodb(max_pool_size=max(workers, 1) + 2)
         db = client.get_database('meme_data_warehouse')
-        collection = db[collection_name]
-        
-        # Convert DataFrame to list of dictionaries for MongoDB
-        # Handle complex data types like numpy arrays or lists
-        records = json.loads(df.to_json(orient='records', date_format='iso'))
-        
-        # MongoDB insert operation
-        print(f"Uploading {len(records)} records to MongoDB collection '{collection_name}'...")
+        if write_concern:
+            collection = db.get_collection(collection_name, write_concern=WriteConcern(**write_concern))
+        else:
+            collection = db[collection_name]
         
-        # Use bulk insert for better performance
-        try:
-            result = collection.insert_many(records)
-            print(f"Successfully uploaded {len(result.inserted_ids)} records")
-        except BulkWriteError as bwe:
-            print(f"Error during bulk write: {bwe.details}")
-            successful = bwe.details['nInserted']
-            print(f"Successfully inserted {successful} records before the error")
+        print(f"Uploading records to MongoDB collection '{collection_name}' in batches of {batch_size} "
+              f"with {workers} writer(s)...")
+        start_time = time.perf_counter()
+        total = upserted = modified = errors = 0
+        batches = iter_document_batches(data_path, batch_size, table, skip_duplicates)
+        for written, batch_upserted, batch_modified, batch_errors in _write_batches(collection, batches, workers):
+            total += written
+            upserted += batch_upserted
+            modified += batch_modified
+            errors += batch_errors
+            progress.advance(written - batch_errors, failed=batch_errors)
+        elapsed = time.perf_counter() - start_time
+        rate = total / elapsed if elapsed > 0 else 0.0
+        print(f"Processed {total} records: {upserted} inserted, {modified} updated, {errors} failed")
+        print(f"Throughput: {rate:.0f} docs/s ({elapsed:.2f}s)")
         
-        # Create indexes for common query fields
-        collection.create_index('sentiment')
-        print("Created index on 'sentiment' field")
+        # Create indexes for common query fields (only the first load builds them)
+        created = ensure_indexes(collection)
+        if created:
+            print(f"Created indexes: {', '.join(created)}")
+        else:
+            print("All indexes already in place")
+
+        rollup = load_rollup(data_path) if rollups else None
+        if rollup is not None:
+            written = load_rollups(db[ROLLUP_COLLECTION], rollup)
+            print(f"Loaded {written} rollup documents into '{ROLLUP_COLLECTION}'")
         
-        return True
+        return errors == 0
         
     except Exception as e:
         print(f"Error loading data to warehouse: {str(e)}")
@@ -73,6 +258,25 @@ if __name__ == "__main__":
                         help='Path to processed data directory')
     parser.add_argument('--collection', type=str, default='processed_data',
                         help='MongoDB collection name')
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help='Documents per bulk write')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of batches written concurrently')
+    parser.add_argument('--w', type=str, default=None,
+                        help="Write concern 'w' (e.g. 0, 1 or majority)")
+    parser.add_argument('--journal', action='store_true',
+                        help='Wait for writes to be journaled')
+    parser.add_argument('--skip-duplicates', action='store_true',
+                        help='Leave out near-duplicate images (rows with a duplicate_of)')
+    parser.add_argument('--no-rollups', action='store_true',
+                        help='Do not load the pre-aggregated label counts into label_rollups')
     args = parser.parse_args()
     
-    load_to_warehouse(args.data_path, args.collection)
+    write_concern = {}
+    if args.w is not None:
+        write_concern['w'] = int(args.w) if args.w.isdigit() else args.w
+    if args.journal:
+        write_concern['j'] = True
+    load_to_warehouse(args.data_path, args.collection, batch_size=args.batch_size, workers=args.workers,
+                      write_concern=write_concern or None, skip_duplicates=args.skip_duplicates,
+                      rollups=not args.no_rollups)
@@ -0,0 +1,107 @@
+from src.warehouse_loader import INDEX_PLAN, LABEL_COLUMNS
+
+def choose_index(fields, plan=INDEX_PLAN):
+    """Pick the plan index that serves an equality filter on the given fields.
+
+    An index can serve the filter through the longest prefix of its keys
+    that are all filtered on; the index with the longest such prefix wins,
+    and the shorter index wins a tie.
+
+    Returns:
+        Index name, or None when no plan index covers the first filtered field
+    """
+    fields = set(fields)
+    best = None
+    best_score = (0, 0)
+    for spec in plan:
+        if spec.get('unique') or any(direction == 'text' for _, direction in spec['keys']):
+            continue
+        prefix = 0
+        for key, _ in spec['keys']:
+            if key not in fields:
+                break
+            prefix += 1
+        score = (prefix, -len(spec['keys']))
+        if prefix and score > best_score:
+            best, best_score = spec['name'], score
+    return best
+
+def _label_filter(labels):
+    unknown = set(labels) - set(LABEL_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown label columns: {', '.join(sorted(unknown))}")
+    return {label: value for label, value in labels.items() if value is not None}
+
+def find_by_labels(collection, projection=None, limit=0, **labels):
+    """Find documents matching a label combination, e.g. overall_sentiment='positive', sarcasm='general'"""
+    query = _label_filter(labels)
+    cursor = collection.find(query, projection, limit=limit)
+    index = choose_index(query)
+    return cursor.hint(index) if index else cursor
+
+def count_by_labels(collection, **labels):
+    """Count documents matching a label combination"""
+    query = _label_filter(labels)
+    index = choose_index(query)
+    return collection.count_documents(query, **({'hint': index} if index else {}))
+
+def label_distribution(collection, label, **labels):
+    """Counts per value of one label, optionally within a label combination.
+
+    Returns:
+        Dict mapping label value to document count
+    """
+    query = _label_filter(labels)
+    pipeline = [
+        {'$match': query},
+        {'$group': {'_id': f'${label}', 'count': {'$sum': 1}}},
+        {'$sort': {'count': -1}},
+    ]
+    # The grouped label joins the filter so the chosen index can also cover it
+    index = choose_index(set(query) | {label})
+    options = {'hint': index} if index else {}
+    return {row['_id']: row['count'] for row in collection.aggregate(pipeline, **options)}
+
+def rollup_distribution(collection, label, **labels):
+    """label_distribution answered from the label_rollups collection (see load_rollups).
+
+    Sums the pre-aggregated counts of the matching label combinations, a
+    few hundred documents at most, instead of grouping every image.
+    Images without a value for the label are left out.
+    """
+    if label not in LABEL_COLUMNS:
+        raise ValueError(f"Unknown label column: {label}")
+    pipeline = [
+        {'$match': {'kind': 'labels', **_label_filter(labels)}},
+        {'$group': {'_id': f'${label}', 'count': {'$sum': '$count'}}},
+        {'$sort': {'count': -1}},
+    ]
+    return {row['_id']: row['count'] for row in collection.aggregate(pipeline) if row['_id'] is not None}
+
+def search_text(collection, text, limit=20, projection=None, **labels):
+    """Full-text search over the OCR text, best matches first (uses the text index)"""
+    query = {'$text': {'$search': text}, **_label_filter(labels)}
+    projection = dict(projection or {})
+    projection['score'] = {'$meta': 'textScore'}
+    return collection.find(query, projection, limit=limit).sort([('score', {'$meta': 'textScore'})])
+
+def winning_stages(explain):
+    """All stage names of the winning plan in an explain() result"""
+    plan = explain.get('queryPlanner', {}).get('winningPlan', {})
+    stages = []
+    todo = [plan]
+    while todo:
+        node = todo.pop()
+        if 'stage' in node:
+            stages.append(node['stage'])
+        for key in ('inputStage', 'queryPlan'):
+            if key in node:
+                todo.append(node[key])
+        todo.extend(node.get('inputStages', []))
+    return stages
+
+def uses_index(explain):
+    """True when an explain() result scans an index and never the whole collection"""
+    stages = winning_stages(explain)
+    return 'COLLSCAN' not in stages and any(stage in ('IXSCAN', 'TEXT', 'TEXT_MATCH', 'COUNT_SCAN')
+                                            for stage in stages)
@@ -3,18 +3,28 @@ import shutil
 import pandas as pd
 
 def prepare_test_data():
-    # Create test directories
+    # Without the real dataset, test on synthetic memes instead
+    if not os.path.exists('data/raw/images') or not os.path.exists('data/raw/labels.csv'):
+        from benchmarks.synthetic import generate_memes
+        if not os.path.exists('data/raw_test/labels_test.csv'):
+            generate_memes('data/raw_test', 10, labels_name='labels_test.csv')
+        return
+
+    # Create test directories, dropping images a previous selection left behind
+    shutil.rmtree('data/raw_test/images', ignore_errors=True)
     os.makedirs('data/raw_test/images', exist_ok=True)
     
     # Copy first 10 images
     src_images = 'data/raw/images'
     dest_images = 'data/raw_test/images'
     
-    for img in os.listdir(src_images)[:10]:
+    names = sorted(os.listdir(src_images))[:10]
+    for img in names:
         shutil.copy(os.path.join(src_images, img), dest_images)
     
-    # Create test labels
-    labels = pd.read_csv('data/raw/labels.csv').head(10)
+    # Create test labels for exactly the copied images (joined on image_name)
+    labels = pd.read_csv('data/raw/labels.csv')
+    labels = labels[labels['image_name'].isin(names)]
     labels.to_csv('data/raw_test/labels_test.csv', index=False)
 
 if __name__ == '__main__':
@@ -0,0 +1,37 @@
+import os
+import pandas as pd
+from src.analyze_data import compute_metrics, analyze_data
+
+def _frame():
+    return pd.DataFrame({
+        'text': ['cat memes are great', None, 'cat  cat\nfunny', ''],
+        'overall_sentiment': ['positive', 'negative', 'positive', 'neutral'],
+        'height': [100, 200, 300, 400],
+        'width': [50, 60, 70, 80],
+    })
+
+def test_compute_metrics_vectorised():
+    result = compute_metrics(_frame())
+
+    assert result.record_count == 4
+    assert result.word_counts.tolist() == [4, 0, 3, 0]
+    assert result.sentiment_column == 'overall_sentiment'
+    assert result.sentiment_counts['positive'] == 2
+    assert result.top_words.iloc[0].tolist() == ['cat', 3]
+    assert result.heights.tolist() == [100, 200, 300, 400]
+    assert result.errors == {}
+
+
+def test_analyze_data_writes_outputs(tmpdir):
+    data_path = str(tmpdir.mkdir("processed"))
+    output_path = str(tmpdir.join("analysis"))
+    _frame().to_parquet(os.path.join(data_path, 'processed_data.parquet'))
+
+    analyze_data(data_path, output_path)
+
+    for name in ['data_summary.txt', 'sentiment_distribution.png', 'word_count_distribution.png',
+                 'top_words.png', 'image_size_distribution.png']:
+        assert os.path.exists(os.path.join(output_path, name)), name
+    # The summary lists the dtypes of the whole file, as pandas reads it
+    with open(os.path.join(output_path, 'data_summary.txt')) as f:
+        assert str(pd.read_parquet(os.path.join(data_path, 'processed_data.parquet')).dtypes) in f.read()
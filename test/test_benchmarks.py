@@ -0,0 +1,37 @@
+import os
+import cv2
+import pandas as pd
+from benchmarks.run_benchmarks import compare
+from benchmarks.synthetic import LABEL_VALUES, generate_memes
+
+def test_generate_memes_is_reproducible(tmpdir):
+    image_dir, labels_path = generate_memes(str(tmpdir.join('a')), 4, seed=3, min_side=100, max_side=200)
+    _, other_labels_path = generate_memes(str(tmpdir.join('b')), 4, seed=3, min_side=100, max_side=200)
+
+    labels = pd.read_csv(labels_path)
+    assert list(labels['image_name']) == [f'image_{i}.jpg' for i in range(1, 5)]
+    assert 'overall_sentiment ' in labels.columns
+    assert set(labels['humour']) <= set(LABEL_VALUES['humour'])
+    assert labels.equals(pd.read_csv(other_labels_path))
+
+    for name in labels['image_name']:
+        img = cv2.imread(os.path.join(image_dir, name))
+        assert img is not None and 100 <= min(img.shape[:2]) and max(img.shape[:2]) <= 200
+
+
+def test_compare_flags_throughput_and_memory_regressions():
+    baseline = {'results': [
+        {'stage': 'etl', 'scale': 20, 'items_per_s': 10.0, 'peak_rss_mb': 200.0, 'children_peak_rss_mb': 100.0},
+        {'stage': 'analyze', 'scale': 20, 'items_per_s': 100.0, 'peak_rss_mb': 200.0},
+    ]}
+    current = {'results': [
+        {'stage': 'etl', 'scale': 20, 'items_per_s': 8.0, 'peak_rss_mb': 205.0, 'children_peak_rss_mb': 150.0},
+        {'stage': 'analyze', 'scale': 20, 'items_per_s': 95.0, 'peak_rss_mb': 260.0, 'children_peak_rss_mb': 0.0},
+        {'stage': 'warehouse', 'scale': 20, 'items_per_s': 1.0, 'peak_rss_mb': 900.0},
+    ]}
+
+    regressions = compare(baseline, current, tolerance=0.15)
+    assert len(regressions) == 3
+    assert regressions[0].startswith('etl x20: throughput')
+    assert regressions[1].startswith('etl x20: child peak RSS')
+    assert regressions[2].startswith('analyze x20: peak RSS')
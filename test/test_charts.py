@@ -0,0 +1,40 @@
+import os
+from src import charts
+from src.charts import POOL_MIN_CHARTS, FINGERPRINT_KEY, Chart, bar_aggregate, histogram_panel, png_text, render_charts
+
+def _charts(counts):
+    return [
+        Chart('bars.png', 'bar', bar_aggregate(['a', 'b'], counts, 'Counts')),
+        Chart('hist.png', 'histogram', {'panels': [histogram_panel([1, 2, 2, 3, float('nan')], 3, 'Values')]}),
+    ]
+
+
+def test_histogram_panel_is_computed_from_values():
+    panel = histogram_panel([1, 2, 2, 3, float('nan')], 2, 'Values')
+    assert panel['counts'] == [1, 3]
+    assert panel['edges'] == [1.0, 2.0, 3.0]
+
+
+def test_unchanged_charts_are_skipped(tmpdir, monkeypatch):
+    output_dir = str(tmpdir)
+    # Draw the first two charts in a pool as well
+    monkeypatch.setattr(charts, 'POOL_MIN_CHARTS', 2)
+    assert render_charts(_charts([1, 2]), output_dir, workers=2) == {'bars.png': 'rendered', 'hist.png': 'rendered'}
+    text = png_text(os.path.join(output_dir, 'bars.png'))
+    assert text[FINGERPRINT_KEY] == _charts([1, 2])[0].fingerprint()
+
+    mtime = os.path.getmtime(os.path.join(output_dir, 'hist.png'))
+    assert render_charts(_charts([1, 2]), output_dir) == {'bars.png': 'unchanged', 'hist.png': 'unchanged'}
+    assert render_charts(_charts([1, 3]), output_dir) == {'bars.png': 'rendered', 'hist.png': 'unchanged'}
+    assert os.path.getmtime(os.path.join(output_dir, 'hist.png')) == mtime
+    assert render_charts(_charts([1, 3]), output_dir, force=True)['hist.png'] == 'rendered'
+    assert png_text(os.path.join(output_dir, 'missing.png')) == {}
+
+
+def test_few_charts_are_drawn_in_process(tmpdir, monkeypatch):
+    def no_pool(*args, **kwargs):
+        raise AssertionError("a process pool was started")
+
+    monkeypatch.setattr(charts, 'ProcessPoolExecutor', no_pool)
+    few = [Chart(f'bars_{i}.png', 'bar', bar_aggregate(['a'], [i], 'Counts')) for i in range(POOL_MIN_CHARTS - 1)]
+    assert set(render_charts(few, str(tmpdir), workers=4).values()) == {'rendered'}
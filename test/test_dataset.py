@@ -0,0 +1,60 @@
+import os
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+from src import dataset
+from src.schema import HISTOGRAM_BINS, frame_to_table
+from src.visualization import analyze
+
+def _frame(rows=10):
+    return pd.DataFrame({
+        'image_path': [f'img_{i}.jpg' for i in range(rows)],
+        'text': [f'meme number {i}' for i in range(rows)],
+        'overall_sentiment': ['positive' if i % 2 else 'negative' for i in range(rows)],
+        'height': list(range(100, 100 + rows)),
+        'histogram': [np.full(HISTOGRAM_BINS, i, dtype=np.uint32) for i in range(rows)],
+    })
+
+def _write(tmpdir, rows=10, row_group_size=4):
+    data_path = str(tmpdir)
+    pq.write_table(frame_to_table(_frame(rows)), os.path.join(data_path, dataset.PARQUET_NAME),
+                   row_group_size=row_group_size)
+    return data_path
+
+
+def test_projection_and_filters(tmpdir):
+    data_path = _write(tmpdir)
+
+    # Unknown columns are skipped, the histogram is never read
+    frame = dataset.read_frame(data_path, columns=['text', 'height', 'image_size'])
+    assert list(frame.columns) == ['text', 'height']
+    assert isinstance(frame['text'].dtype, pd.ArrowDtype)
+
+    table = dataset.read_table(data_path, columns=['image_path'],
+                               filters=[('overall_sentiment', '=', 'positive'), ('height', '>=', 105)])
+    assert table.column('image_path').to_pylist() == ['img_5.jpg', 'img_7.jpg', 'img_9.jpg']
+    assert dataset.count_rows(data_path) == 10
+    assert dataset.count_rows(data_path, [('height', '<', 102)]) == 2
+
+    batches = list(dataset.iter_batches(data_path, columns=['height'], batch_size=3))
+    assert all(batch.num_rows <= 3 and batch.schema.names == ['height'] for batch in batches)
+    assert sorted(sum((batch.column(0).to_pylist() for batch in batches), [])) == list(range(100, 110))
+
+
+def test_csv_fallback_and_missing_data(tmpdir):
+    data_path = str(tmpdir)
+    with pytest.raises(FileNotFoundError):
+        dataset.data_file(data_path)
+
+    _frame(5).drop(columns='histogram').to_csv(os.path.join(data_path, dataset.CSV_NAME), index=False)
+    assert dataset.columns(data_path) == ['image_path', 'text', 'overall_sentiment', 'height']
+    frame = dataset.read_frame(data_path, columns=['height'], filters=[('height', '>', 102)], arrow_dtypes=False)
+    assert frame['height'].tolist() == [103, 104]
+    assert [batch.num_rows for batch in dataset.iter_batches(data_path, batch_size=2)] == [2, 2, 1]
+
+
+def test_visualization_reads_from_data_path(tmpdir):
+    data_path = _write(tmpdir)
+    assert analyze(data_path) == os.path.join(data_path, 'analysis_results.png')
+    assert os.path.getsize(os.path.join(data_path, 'analysis_results.png')) > 0
@@ -0,0 +1,95 @@
+import cv2
+import numpy as np
+import pandas as pd
+import pytest
+from benchmarks.synthetic import render_meme
+from src import dedup
+from src.dedup import BKTree, DuplicateIndex, find_duplicates, hamming, image_hash, text_difference
+from src.etl_pipeline import transform
+
+@pytest.fixture
+def memes(tmpdir):
+    """Two distinct memes plus a resized, recompressed repost of the first"""
+    rng = np.random.default_rng(3)
+    first, _ = render_meme(rng, 600, 450)
+    second, _ = render_meme(rng, 500, 500)
+    paths = [str(tmpdir.join(name)) for name in ('a.jpg', 'b.jpg', 'a_repost.jpg')]
+    cv2.imwrite(paths[0], first)
+    cv2.imwrite(paths[1], second)
+    cv2.imwrite(paths[2], cv2.resize(first, (420, 315)), [cv2.IMWRITE_JPEG_QUALITY, 60])
+    return paths
+
+
+def test_bk_tree_matches_brute_force():
+    rng = np.random.default_rng(0)
+    values = [int(v) for v in rng.integers(0, 2 ** 63, size=300, dtype=np.int64)]
+    tree = BKTree()
+    for i, value in enumerate(values):
+        tree.add(value, i)
+
+    query = values[17] ^ 0b1011
+    expected = sorted(i for i, value in enumerate(values) if hamming(query, value) <= 12)
+    found = tree.search(query, 12)
+    assert sorted(item for _, item in found) == expected
+    assert found[0] == (3, 17)
+
+
+def test_near_duplicates_point_to_the_canonical_image(memes):
+    assert hamming(image_hash(memes[0]), image_hash(memes[2])) <= 6
+    assert hamming(image_hash(memes[0]), image_hash(memes[1])) > 6
+    assert find_duplicates(memes) == {memes[2]: memes[0]}
+
+    index = DuplicateIndex(max_distance=0, method='dhash')
+    assert [index.add(path) for path in memes[:2]] == [None, None]
+    with pytest.raises(ValueError):
+        image_hash(memes[0], 'whash')
+
+
+def test_same_template_with_another_caption_is_not_a_duplicate(tmpdir):
+    # Same layout, "MEME 1" and "MEME 3": the perceptual hashes are 6 bits apart
+    first, other = 'data/raw_test/images/image_1.jpg', 'data/raw_test/images/image_3.jpg'
+    assert hamming(image_hash(first), image_hash(other)) <= 6
+    repost = str(tmpdir.join('image_1_repost.jpg'))
+    gray = cv2.imread(first, cv2.IMREAD_GRAYSCALE)
+    cv2.imwrite(repost, cv2.resize(gray, (240, 185)), [cv2.IMWRITE_JPEG_QUALITY, 60])
+
+    assert find_duplicates([first, other, repost]) == {repost: first}
+    assert find_duplicates([first, other], check_text=False) == {other: first}
+    assert text_difference(gray, gray) == 0
+
+
+def test_canonical_images_are_decoded_once(memes, monkeypatch):
+    full_decodes = []
+    gray = dedup._gray
+
+    def counting_gray(path, reduced=True):
+        if not reduced:
+            full_decodes.append(path)
+        return gray(path, reduced)
+
+    monkeypatch.setattr(dedup, '_gray', counting_gray)
+    # The same repost three times: each is compared with the first meme
+    paths = [memes[0], memes[1]] + [memes[2]] * 3
+    index = DuplicateIndex()
+    assert [index.add(path) for path in paths] == [None, None] + [memes[0]] * 3
+    assert sorted(full_decodes) == [memes[0]] + [memes[2]] * 3
+
+
+def test_transform_reuses_ocr_of_canonical_image(memes, monkeypatch):
+    import src.etl_pipeline as etl
+    calls = []
+    real_get_engine = etl.get_engine
+
+    def counting_get_engine(*args):
+        calls.append(args)
+        return real_get_engine(*args)
+
+    monkeypatch.setattr(etl, 'get_engine', counting_get_engine)
+    labels = pd.DataFrame({'overall_sentiment': ['positive', 'neutral', 'positive']})
+    df = transform(memes, labels, duplicates=find_duplicates(memes))
+
+    assert len(calls) == 2
+    assert df['duplicate_of'].isna().tolist() == [True, True, False]
+    assert df.loc[2, 'duplicate_of'] == memes[0]
+    assert df.loc[2, 'text'] == df.loc[0, 'text']
+    assert (df.loc[2, 'height'], df.loc[2, 'width']) == (315, 420)
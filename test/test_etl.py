@@ -2,7 +2,9 @@
 import os
 import pytest
 import pandas as pd
-from src.etl_pipeline import extract, transform, load
+import cv2
+import numpy as np
+from src.etl_pipeline import extract, transform, load, ocr_input, process_image, TransformOptions
 
 @pytest.fixture
 def test_data():
@@ -30,7 +32,7 @@ def test_transform(test_data):
     assert len(processed) == len(image_paths)
     
     # Check expected columns (with clean names)
-    expected_columns = ['image_path', 'text', 'image_size', 'histogram']
+    expected_columns = ['image_path', 'text', 'height', 'width', 'channels', 'histogram']
     for col in expected_columns:
         assert col in processed.columns
     
@@ -49,4 +51,91 @@ def test_load(test_data, tmpdir):
     # Check if either parquet or CSV file was created
     assert os.path.exists(os.path.join(output_path, 'processed_data.parquet')) or \
            os.path.exists(os.path.join(output_path, 'processed_data.csv'))
-    assert os.path.exists(os.path.join(output_path, 'sentiment_distribution.png'))
\ No newline at end of file
+    assert os.path.exists(os.path.join(output_path, 'sentiment_distribution.png'))
+
+
+def test_transform_parallel_matches_serial(test_data):
+    image_paths, labels = extract(test_data['image_dir'], test_data['labels_path'])
+    serial = transform(image_paths, labels)
+    parallel = transform(image_paths, labels, workers=2, chunk_size=3)
+
+    # Same rows, same order and same schema as the in-process path
+    assert list(parallel.columns) == list(serial.columns)
+    assert parallel['image_path'].tolist() == serial['image_path'].tolist()
+    assert parallel['text'].tolist() == serial['text'].tolist()
+    assert parallel.attrs['errors'] == []
+
+
+def test_transform_captures_errors(test_data, tmpdir):
+    image_paths, labels = extract(test_data['image_dir'], test_data['labels_path'])
+    broken = tmpdir.join("broken.jpg")
+    broken.write("not an image")
+    paths = image_paths[:2] + [str(broken)]
+
+    processed = transform(paths, labels, workers=2, chunk_size=1)
+
+    assert len(processed) == 2
+    assert [e['image_path'] for e in processed.attrs['errors']] == [str(broken)]
+
+
+def test_transform_when_every_image_fails(test_data, tmpdir):
+    _, labels = extract(test_data['image_dir'], test_data['labels_path'])
+    broken = tmpdir.join("broken.jpg")
+    broken.write("not an image")
+
+    processed = transform([str(broken)], labels)
+
+    assert processed.empty
+    assert [e['image_path'] for e in processed.attrs['errors']] == [str(broken)]
+
+
+def test_labels_are_joined_by_image_name(test_data):
+    image_paths, labels = extract(test_data['image_dir'], test_data['labels_path'])
+    assert labels.index.name == 'image_name'
+
+    # Any order, and a label row whose image is missing, give the same labelled rows
+    names = [os.path.basename(path) for path in image_paths]
+    extra = labels.iloc[:1].assign(image_name='missing.jpg').set_index(pd.Index(['missing.jpg'], name='image_name'))
+    processed = transform(image_paths[::-1], pd.concat([labels, extra]))
+
+    assert processed['image_name'].tolist() == names[::-1]
+    assert processed.attrs['unmatched_labels'] == ['missing.jpg']
+    expected = labels.loc[names[::-1], 'overall_sentiment'].tolist()
+    assert processed['overall_sentiment'].tolist() == expected
+
+
+def test_image_without_label_row_is_reported(test_data, tmpdir):
+    image_paths, labels = extract(test_data['image_dir'], test_data['labels_path'])
+    unlabelled = str(tmpdir.join('unlabelled.jpg'))
+    cv2.imwrite(unlabelled, np.zeros((20, 20, 3), dtype=np.uint8))
+
+    processed = transform(image_paths[:2] + [unlabelled], labels)
+
+    assert len(processed) == 2
+    assert processed.attrs['errors'] == [{'image_path': unlabelled,
+                                          'error': 'KeyError: no label row for unlabelled.jpg'}]
+
+
+def test_process_image_single_decode_metrics(test_data):
+    image_paths, _ = extract(test_data['image_dir'], test_data['labels_path'])
+    path = image_paths[0]
+    record, error = process_image(path)
+    assert error is None
+
+    # Metrics must match the old imread + RGB conversion path
+    rgb = cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2RGB)
+    assert (record['height'], record['width'], record['channels']) == rgb.shape
+    expected_hist = cv2.calcHist([rgb], [0], None, [256], [0, 256]).flatten()
+    assert record['histogram'].dtype == np.uint32
+    assert np.array_equal(record['histogram'], expected_hist)
+
+
+def test_ocr_input_preprocessing():
+    img = np.zeros((400, 3200, 3), dtype=np.uint8)
+
+    # Default path is a zero-copy view over the decoded image
+    view = ocr_input(img, TransformOptions())
+    assert np.shares_memory(view, img)
+
+    small = ocr_input(img, TransformOptions(ocr_preprocess=True, ocr_max_side=800))
+    assert small.shape == (100, 800)
@@ -0,0 +1,53 @@
+import os
+import pandas as pd
+from src.etl_cache import ResultCache, fingerprint
+from src.etl_pipeline import extract, transform, load
+
+def test_cache_roundtrip_and_fingerprint(tmpdir):
+    path = str(tmpdir.join("cache.sqlite"))
+    with ResultCache(path, fingerprint({'v': 1})) as cache:
+        cache.put('abc', {'text': 'hello'})
+        assert cache.get('abc') == {'text': 'hello'}
+
+    # A different config fingerprint must not see the old entries
+    with ResultCache(path, fingerprint({'v': 2})) as cache:
+        assert cache.get('abc') is None
+
+
+def test_cache_evicts_least_recently_used(tmpdir):
+    cache = ResultCache(str(tmpdir.join("cache.sqlite")), 'fp', max_bytes=70)
+    cache.put('old', {'text': 'x' * 20})
+    cache.put('new', {'text': 'y' * 20})
+    cache.get('new')
+    cache.put('newest', {'text': 'z' * 20})
+
+    assert cache.evict() == 1
+    assert cache.get('old') is None
+    assert cache.get('newest') is not None
+    cache.close()
+
+
+def test_transform_uses_cache(tmpdir):
+    image_paths, labels = extract('data/raw_test/images', 'data/raw_test/labels_test.csv')
+    cache_path = str(tmpdir.join("cache.sqlite"))
+
+    with ResultCache(cache_path, 'fp') as cache:
+        first = transform(image_paths, labels, cache=cache)
+        assert cache.misses == len(image_paths)
+
+    with ResultCache(cache_path, 'fp') as cache:
+        second = transform(image_paths, labels, cache=cache)
+        assert cache.hits == len(image_paths)
+
+    pd.testing.assert_frame_equal(first, second)
+
+
+def test_load_merges_with_existing_output(tmpdir):
+    image_paths, labels = extract('data/raw_test/images', 'data/raw_test/labels_test.csv')
+    output_path = str(tmpdir.mkdir("processed"))
+
+    load(transform(image_paths[:3], labels), output_path)
+    load(transform(image_paths[2:5], labels), output_path, merge=True)
+
+    merged = pd.read_parquet(os.path.join(output_path, 'processed_data.parquet'))
+    assert sorted(merged['image_path']) == sorted(image_paths[:5])
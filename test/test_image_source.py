@@ -0,0 +1,77 @@
+import os
+import pandas as pd
+import pytest
+from src import progress
+from src.etl_pipeline import extract, run_etl, transform
+from src.image_source import ImageSource, count_images, read_labels
+
+def _touch(directory, *names):
+    for name in names:
+        directory.join(name).write(b'x' * 10)
+
+
+def test_source_filters_and_slices_lazily(tmpdir):
+    _touch(tmpdir, 'a.jpg', 'b.PNG', 'c.jpg', 'notes.txt', '.DS_Store')
+    tmpdir.mkdir('nested.jpg')
+
+    source = ImageSource(str(tmpdir))
+    assert sorted(os.path.basename(path) for path in source) == ['a.jpg', 'b.PNG', 'c.jpg']
+    assert len(source) == 3
+    assert source[:2] == source.head(2) == list(source)[:2]
+    assert source[-1] == list(source)[-1]
+    assert [os.path.basename(path) for path in ImageSource(str(tmpdir), pattern='[ab]*')] != []
+    assert len(ImageSource(str(tmpdir), pattern='c*')) == 1
+
+    files = list(source.entries())
+    assert all(file.size == 10 and file.mtime > 0 for file in files)
+
+
+def test_count_is_cached_until_the_directory_changes(tmpdir):
+    images = tmpdir.mkdir('images')
+    _touch(images, 'a.jpg', 'b.jpg')
+    cache_path = str(tmpdir.join('counts.json'))
+
+    assert count_images(str(images), cache_path=cache_path) == 2
+    # A stale entry with the current mtime is trusted...
+    os.utime(str(images), ns=(1, 1))
+    count_images(str(images), cache_path=cache_path)
+    _touch(images, 'c.jpg')
+    os.utime(str(images), ns=(1, 1))
+    assert count_images(str(images), cache_path=cache_path) == 2
+    # ...and recounted once the directory is modified
+    os.utime(str(images), ns=(2, 2))
+    assert count_images(str(images), cache_path=cache_path) == 3
+
+
+def test_sampled_extract_reads_only_the_sampled_labels(tmpdir):
+    image_paths, labels = extract('data/raw_test/images', 'data/raw_test/labels_test.csv', sample=3,
+                                  count_cache=None)
+    assert len(image_paths) == 3
+    assert sorted(labels.index) == sorted(os.path.basename(path) for path in image_paths)
+
+    labels_path = str(tmpdir.join('labels.csv'))
+    pd.DataFrame({'image_name': [f'{i}.jpg' for i in range(10)], 'x': range(10)}).to_csv(labels_path, index=False)
+    assert read_labels(labels_path, names=['3.jpg', '7.jpg'], chunksize=4)['x'].tolist() == [3, 7]
+
+
+def test_transform_consumes_a_lazy_source():
+    source, labels = extract('data/raw_test/images', 'data/raw_test/labels_test.csv', count_cache=None)
+    processed = transform(iter(source), labels)
+    assert sorted(processed['image_path']) == sorted(source)
+
+
+def test_run_etl_never_counts_the_directory_up_front(tmpdir, monkeypatch):
+    def count_images(*args, **kwargs):
+        raise AssertionError("the image directory was counted")
+
+    monkeypatch.setattr('src.image_source.count_images', count_images)
+    tracker = progress.ProgressTracker()
+    with progress.stage('etl', tracker):
+        table = run_etl('data/raw_test/images', 'data/raw_test/labels_test.csv', str(tmpdir.join('processed')),
+                        use_cache=False)
+
+    # The total is filled in from the listing itself
+    summary = tracker.snapshot()['etl']
+    assert summary['total'] == summary['done'] == table.num_rows == len(os.listdir('data/raw_test/images'))
+    with pytest.raises(AssertionError):
+        len(extract('data/raw_test/images', 'data/raw_test/labels_test.csv')[0])
@@ -0,0 +1,38 @@
+import os
+import subprocess
+import sys
+import pytest
+
+# Entry points and the cold-start budget each must import within
+ENTRY_POINTS = ['src.etl_pipeline', 'src.analyze_data', 'src.warehouse_loader', 'run_pipeline']
+BUDGET_S = float(os.environ.get('IMPORT_TIME_BUDGET', 2.0))
+
+# Loaded on first use only: plotting, OCR backends
+LAZY_MODULES = ('matplotlib', 'seaborn', 'pytesseract', 'tesserocr', 'sklearn', 'PIL')
+
+def import_times(module):
+    """{module: cumulative seconds} from ``python -X importtime`` for a fresh interpreter"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+@pytest.mark.parametrize('module', ENTRY_POINTS)
+def test_entry_point_imports_lazily_and_within_budget(module):
+    times = import_times(module)
+    eager = sorted(name for name in times if name.split('.')[0] in LAZY_MODULES)
+    assert eager == [], f"{module} imports {', '.join(eager[:5])} at start-up"
+    assert times[module] < BUDGET_S, f"{module} took {times[module]:.2f}s to import (budget {BUDGET_S}s)"
+
+
+def test_plotting_is_headless():
+    code = 'from src.plotting import pyplot; import matplotlib; pyplot(); print(matplotlib.get_backend())'
+    env = {k: v for k, v in os.environ.items() if k != 'MPLBACKEND'}
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True, env=env)
+    assert result.stdout.strip().lower() == 'agg'
@@ -0,0 +1,86 @@
+import sys
+import types
+import numpy as np
+import pytest
+from src import ocr
+from src.ocr import OcrConfig, OcrResult, PytesseractEngine, get_engine, resolve_engine
+
+def test_text_rebuilt_from_word_data():
+    data = {
+        'page_num': [1, 1, 1, 1, 1, 1],
+        'block_num': [1, 1, 1, 1, 2, 2],
+        'par_num': [1, 1, 1, 1, 1, 1],
+        'line_num': [0, 1, 1, 2, 1, 1],
+        'text': ['', 'when', 'memes', 'hit', 'so', ' '],
+        'conf': [-1, 90, 80, 70, 60, 50],
+    }
+    assert ocr._text_from_data(data) == 'when memes\nhit\n\nso'
+
+
+def test_cli_config_and_confidence():
+    assert OcrConfig().cli_config() == '--psm 3'
+    assert OcrConfig(psm=6, whitelist='ABC').cli_config() == '--psm 6 -c tessedit_char_whitelist=ABC'
+    assert OcrResult('a b', [('a', 90.0), ('b', 70.0)]).confidence == 80.0
+    assert OcrResult('').confidence is None
+
+
+def test_pytesseract_engine_returns_word_confidences():
+    result = PytesseractEngine().recognize(np.full((40, 120, 3), 255, dtype=np.uint8))
+    assert isinstance(result.text, str)
+    assert all(0 <= conf <= 100 for _, conf in result.words)
+
+
+def test_auto_falls_back_to_pytesseract(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'tesserocr', None)
+    assert resolve_engine('auto') == 'pytesseract'
+    with pytest.raises(ValueError):
+        resolve_engine('easyocr')
+
+
+def test_tesserocr_engine_is_loaded_once_per_process(monkeypatch):
+    created = []
+
+    class FakeApi:
+        def __init__(self, lang, psm):
+            created.append((lang, psm))
+            self.variables = {}
+
+        def SetVariable(self, name, value):
+            self.variables[name] = value
+
+        def SetImage(self, image):
+            self.image = image
+
+        def GetUTF8Text(self):
+            return 'HELLO\n'
+
+        def MapWordConfidences(self):
+            return [('HELLO', 95)]
+
+        def End(self):
+            pass
+
+    monkeypatch.setitem(sys.modules, 'tesserocr', types.SimpleNamespace(PyTessBaseAPI=FakeApi))
+    monkeypatch.setattr(ocr, '_engines', {})
+    config = OcrConfig(lang='eng', psm=6, whitelist='HELO')
+
+    first = get_engine('auto', config)
+    result = first.recognize(np.zeros((10, 10, 3), dtype=np.uint8))
+    second = get_engine('auto', config)
+    second.recognize(np.zeros((10, 10), dtype=np.uint8))
+
+    assert first is second and first.name == 'tesserocr'
+    assert created == [('eng', 6)]
+    assert first._api.variables == {'tessedit_char_whitelist': 'HELO'}
+    assert result.text == 'HELLO' and result.confidence == 95.0
+
+
+def test_cache_fingerprint_without_a_tesseract_binary(monkeypatch):
+    from src.etl_pipeline import config_fingerprint
+
+    def missing():
+        raise OSError("tesseract is not installed")
+
+    monkeypatch.setattr(ocr, 'load_pytesseract', missing)
+    assert ocr.tesseract_version() == 'unknown'
+    assert config_fingerprint() == config_fingerprint()
@@ -0,0 +1,103 @@
+import threading
+import time
+import pytest
+from src.orchestrator import Pipeline, Stage
+
+def test_values_flow_between_stages(tmpdir):
+    stages = [
+        Stage('load', lambda up: [1, 2, 3]),
+        Stage('double', lambda up: [x * 2 for x in up['load']], deps=('load',)),
+        Stage('total', lambda up: sum(up['double']) + sum(up['load']), deps=('load', 'double')),
+    ]
+    results = Pipeline(stages, state_path=str(tmpdir.join('state.json'))).run()
+
+    assert results['total'].value == 18
+    assert all(result.status == 'ok' for result in results.values())
+
+
+def test_unchanged_inputs_are_skipped(tmpdir):
+    source = tmpdir.join('input.txt')
+    source.write('v1')
+    calls = []
+    stage = Stage('read', lambda up: calls.append(source.read()), inputs=(str(source),))
+    state_path = str(tmpdir.join('state.json'))
+
+    Pipeline([stage], state_path=state_path).run()
+    assert Pipeline([stage], state_path=state_path).run()['read'].status == 'skipped'
+
+    source.write('version 2')
+    assert Pipeline([stage], state_path=state_path).run()['read'].status == 'ok'
+    assert calls == ['v1', 'version 2']
+
+
+def test_image_listings_are_fingerprinted_without_stat_per_file(tmpdir, monkeypatch):
+    images = tmpdir.mkdir('images')
+    images.join('a.jpg').write('x')
+    stage = Stage('etl', lambda up: None, listings=(str(images),))
+    pipeline = Pipeline([stage], state_path=None, count_cache=str(tmpdir.join('counts.json')))
+    before = pipeline.fingerprint(stage)
+
+    # An unchanged directory is never listed again
+    monkeypatch.setattr('src.image_source.ImageSource._scan', lambda self: pytest.fail("directory was listed"))
+    assert pipeline.fingerprint(stage) == before
+    monkeypatch.undo()
+
+    images.join('b.jpg').write('x')
+    assert pipeline.fingerprint(stage) != before
+
+
+def test_failure_blocks_dependents_only(tmpdir):
+    def fail(up):
+        raise ValueError("boom")
+
+    stages = [
+        Stage('bad', fail),
+        Stage('after_bad', lambda up: 1, deps=('bad',)),
+        Stage('independent', lambda up: 2),
+    ]
+    results = Pipeline(stages, state_path=str(tmpdir.join('state.json'))).run()
+
+    assert results['bad'].status == 'failed' and 'boom' in results['bad'].error
+    assert results['after_bad'].status == 'blocked'
+    assert results['independent'].status == 'ok'
+
+
+def test_independent_stages_run_concurrently_unless_locked(tmpdir):
+    def overlap_pipeline(locks):
+        active = []
+        peak = []
+        lock = threading.Lock()
+
+        def work(up):
+            with lock:
+                active.append(1)
+                peak.append(len(active))
+            time.sleep(0.1)
+            with lock:
+                active.pop()
+
+        stages = [Stage(name, work, locks=locks) for name in ('a', 'b')]
+        Pipeline(stages, state_path=None, max_workers=2).run()
+        return max(peak)
+
+    assert overlap_pipeline(()) == 2
+    assert overlap_pipeline(('pyplot',)) == 1
+
+
+def test_isolated_stages_use_runner(tmpdir):
+    commands = []
+    stages = [
+        Stage('etl', lambda up: 'in-process', command='python -m src.etl_pipeline'),
+        Stage('tests', command='python -m pytest', deps=('etl',)),
+    ]
+    runner = lambda command, description: commands.append(command) or True
+
+    results = Pipeline(stages, state_path=None, isolate=True, runner=runner).run()
+
+    assert commands == ['python -m src.etl_pipeline', 'python -m pytest']
+    assert results['etl'].value is None
+
+
+def test_unknown_dependency_is_rejected():
+    with pytest.raises(ValueError):
+        Pipeline([Stage('a', lambda up: 1, deps=('missing',))], state_path=None)
@@ -0,0 +1,81 @@
+import os
+import pandas as pd
+import pyarrow.parquet as pq
+from src.parquet_writer import ParquetChunkWriter
+from src.etl_pipeline import extract, iter_transform, load_stream, run_etl
+
+def _records(start, stop):
+    return [{'image_path': f'img_{i}.jpg', 'text': f'text {i}', 'sentiment': None if i < 3 else 'positive'}
+            for i in range(start, stop)]
+
+def test_writer_row_groups_and_null_promotion(tmpdir):
+    writer = ParquetChunkWriter(str(tmpdir), row_group_size=3)
+    for record in _records(0, 7):
+        writer.write(record)
+    assert writer.finalize() == 7
+
+    parquet_file = pq.ParquetFile(writer.path)
+    assert parquet_file.num_row_groups == 3
+    # First part only had nulls in 'sentiment', the unified schema must still be string
+    assert str(parquet_file.schema_arrow.field('sentiment').type) == 'string'
+    assert not os.path.exists(writer.parts_dir)
+
+
+def test_writer_resume_after_crash(tmpdir):
+    writer = ParquetChunkWriter(str(tmpdir), row_group_size=2)
+    for record in _records(0, 5):
+        writer.write(record)
+    # Simulate a crash: the buffered 5th record is lost, the two full row groups survive
+    del writer
+
+    resumed = ParquetChunkWriter(str(tmpdir), row_group_size=2, resume=True)
+    assert resumed.done_paths == {f'img_{i}.jpg' for i in range(4)}
+    for record in _records(0, 6):
+        if record['image_path'] not in resumed.done_paths:
+            resumed.write(record)
+    resumed.finalize()
+
+    result = pd.read_parquet(resumed.path)
+    assert sorted(result['image_path']) == sorted(f'img_{i}.jpg' for i in range(6))
+
+
+def test_writer_merge_replaces_reprocessed_rows(tmpdir):
+    first = ParquetChunkWriter(str(tmpdir))
+    for record in _records(0, 4):
+        first.write(record)
+    first.finalize()
+
+    second = ParquetChunkWriter(str(tmpdir))
+    for record in _records(2, 6):
+        record['text'] = 'updated'
+        second.write(record)
+    assert second.finalize(merge=True) == 6
+
+    result = pd.read_parquet(second.path).set_index('image_path')
+    assert result.loc['img_1.jpg', 'text'] == 'text 1'
+    assert result.loc['img_3.jpg', 'text'] == 'updated'
+
+
+def test_iter_transform_streams_to_parquet(tmpdir):
+    image_paths, labels = extract('data/raw_test/images', 'data/raw_test/labels_test.csv')
+    writer = ParquetChunkWriter(str(tmpdir), row_group_size=4)
+
+    rows = load_stream(iter_transform(image_paths, labels), writer)
+
+    assert rows == len(image_paths)
+    assert pq.ParquetFile(writer.path).num_row_groups == -(-len(image_paths) // 4)
+    assert os.path.exists(os.path.join(str(tmpdir), 'sentiment_distribution.png'))
+
+
+def test_missing_label_cells_are_written_as_null(tmpdir):
+    labels = pd.read_csv('data/raw_test/labels_test.csv')
+    # Only one image keeps its text_corrected, so most row groups have none at all
+    labels.loc[labels.index[1:], 'text_corrected'] = None
+    labels_path = str(tmpdir.join('labels.csv'))
+    labels.to_csv(labels_path, index=False)
+    output_dir = str(tmpdir.join('processed'))
+
+    table = run_etl('data/raw_test/images', labels_path, output_dir, use_cache=False, row_group_size=2)
+
+    assert table.schema.field('text_corrected').type == 'string'
+    assert table['text_corrected'].null_count == table.num_rows - 1
@@ -0,0 +1,55 @@
+import numpy as np
+from src.etl_pipeline import extract, transform, open_cache
+from src.profiling import NULL_STOPWATCH, STAGES, ProfileBuffer, Stopwatch, stopwatch
+
+def test_buffer_summary_ignores_missing_stages():
+    buffer = ProfileBuffer(capacity=2)
+    buffer.add('a.jpg', [('decode', 0.1, 0.1), ('ocr', 1.0, 0.2)])
+    buffer.add('b.jpg', [('decode', 0.3, 0.3)])
+    buffer.add('c.jpg', [('decode', 0.2, 0.2), ('ocr', 3.0, 0.5)])
+
+    summary = buffer.summary().set_index('stage')
+    assert len(buffer) == 3
+    assert summary.loc['decode', 'images'] == 3
+    assert summary.loc['ocr', 'images'] == 2
+    assert np.isclose(summary.loc['ocr', 'p50_s'], 2.0)
+    assert np.isclose(summary.loc['ocr', 'cpu_total_s'], 0.7)
+    assert list(buffer.slowest(1)['image_path']) == ['c.jpg']
+
+
+def test_repeated_laps_add_up():
+    buffer = ProfileBuffer()
+    buffer.add('a.jpg', [('cache', 0.1, 0.0)])
+    buffer.add('a.jpg', [('cache', 0.2, 0.0)])
+    assert np.isclose(buffer.wall[0, buffer.columns['cache']], 0.3)
+
+
+def test_disabled_stopwatch_records_nothing():
+    assert stopwatch(False) is NULL_STOPWATCH
+    NULL_STOPWATCH.lap('ocr')
+    assert NULL_STOPWATCH.laps is None
+
+    watch = stopwatch(True)
+    assert isinstance(watch, Stopwatch)
+    watch.lap('decode')
+    assert [stage for stage, _, _ in watch.laps] == ['decode']
+
+
+def test_transform_times_every_substage(tmpdir):
+    image_paths, labels = extract('data/raw_test/images', 'data/raw_test/labels_test.csv')
+    profiler = ProfileBuffer()
+    cache = open_cache(str(tmpdir), rebuild=True)
+    try:
+        transform(image_paths, labels, workers=2, cache=cache, profiler=profiler)
+    finally:
+        cache.close()
+
+    summary = profiler.summary().set_index('stage')
+    assert len(profiler) == len(image_paths)
+    assert set(summary.index) == set(STAGES)
+    assert (summary['images'] == len(image_paths)).all()
+
+    summary_path = tmpdir.join('profile')
+    profiler.write(str(summary_path))
+    assert summary_path.join('profile_summary.csv').check()
+    assert summary_path.join('profile_slowest.csv').check()
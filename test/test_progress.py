@@ -0,0 +1,61 @@
+import json
+import threading
+from src import progress
+from src.orchestrator import Pipeline, Stage
+from src.progress import ProgressTracker, percentile
+
+def test_percentile_interpolates():
+    values = [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert percentile(values, 50) == 3.0
+    assert percentile(values, 90) == 4.6
+    assert percentile([], 50) is None
+
+
+def test_tracker_counts_rate_and_eta():
+    tracker = ProgressTracker()
+    with progress.stage('etl', tracker):
+        tracker.apply({'event': 'items', 'stage': 'etl', 'total': 10, 'unit': 'img', 'time': 100.0})
+        for latency in (0.1, 0.2, 0.3, 0.4):
+            progress.advance(latency=latency)
+        progress.advance(0, failed=1)
+
+    summary = tracker.stages['etl'].summary(now=102.0)
+    assert (summary['done'], summary['failed'], summary['total']) == (4, 1, 10)
+    assert summary['rate_per_s'] == 2.0
+    assert summary['eta_s'] == 2.5
+    assert summary['latency_s']['p50'] == 0.25
+
+
+def test_child_events_are_followed_under_parent_stage(tmpdir):
+    path = str(tmpdir.join('progress.jsonl'))
+    with open(path, 'a') as sink:
+        child = ProgressTracker(sink)
+        with progress.stage('main', child):
+            progress.start_items(3, unit='img')
+            progress.advance(2, latency=0.5)
+
+    parent = ProgressTracker()
+    stop = threading.Event()
+    stop.set()
+    progress.follow(path, parent, 'etl', stop)
+
+    summary = parent.snapshot()['etl']
+    assert (summary['done'], summary['total'], summary['unit']) == (2, 3, 'img')
+
+
+def test_pipeline_exports_stage_metrics(tmpdir):
+    def work(upstream):
+        progress.start_items(5, unit='img')
+        for _ in range(5):
+            progress.advance(latency=0.01)
+
+    metrics_path = str(tmpdir.join('metrics.json'))
+    stages = [Stage('etl', work), Stage('report', lambda up: None, deps=('etl',))]
+    Pipeline(stages, state_path=None, tracker=ProgressTracker(), metrics_path=metrics_path).run()
+
+    with open(metrics_path) as f:
+        metrics = json.load(f)['stages']
+    assert metrics['etl']['status'] == 'ok'
+    assert metrics['etl']['done'] == 5
+    assert metrics['etl']['latency_s']['p99'] == 0.01
+    assert metrics['report']['status'] == 'ok'
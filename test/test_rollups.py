@@ -0,0 +1,71 @@
+import pandas as pd
+import pyarrow as pa
+import pytest
+from src.analyze_data import analyze_data
+from src.etl_pipeline import load, load_stream
+from src.parquet_writer import ParquetChunkWriter
+from src.rollups import Rollup, build_rollup, load_rollup, rollup_path
+
+def _records(start, stop, sentiment='positive'):
+    return [{'image_path': f'img_{i}.jpg', 'text': 'a meme ' * (i % 3), 'height': 100 + i, 'width': 50,
+             'overall_sentiment': sentiment, 'sarcasm': 'general' if i % 2 else None}
+            for i in range(start, stop)]
+
+def _cube(rollup):
+    return rollup.rows, dict(rollup.cells), {name: dict(counts) for name, counts in rollup.histograms.items()}
+
+
+def test_rollup_queries_and_round_trip(tmpdir):
+    rollup = Rollup()
+    rollup.add(pa.Table.from_pylist(_records(0, 6)))
+
+    assert rollup.rows == 6
+    assert rollup.distribution('overall_sentiment') == {'positive': 6}
+    assert rollup.distribution('sarcasm') == {'general': 3}
+    assert rollup.count(overall_sentiment='positive', sarcasm='general') == 3
+    assert dict(zip(*(values.tolist() for values in rollup.histogram('word_count')))) == {0: 2, 2: 2, 4: 2}
+    assert rollup.histogram('height')[0].tolist() == [96, 104]
+    with pytest.raises(ValueError):
+        rollup.count(colour='red')
+
+    path = str(tmpdir.join('rollups.json.gz'))
+    rollup.save(path)
+    assert _cube(Rollup.load(path)) == _cube(rollup)
+
+
+def test_rollup_follows_appends_and_replacements(tmpdir):
+    output_dir = str(tmpdir)
+    load_stream(_records(0, 6), ParquetChunkWriter(output_dir, row_group_size=4))
+    # Images 4 and 5 come back with a new label, 6 and 7 are new
+    load_stream(_records(4, 8, sentiment='negative'), ParquetChunkWriter(output_dir, row_group_size=4), merge=True)
+
+    rollup = load_rollup(output_dir)
+    assert rollup.distribution('overall_sentiment') == {'positive': 4, 'negative': 4}
+    assert _cube(rollup) == _cube(build_rollup(output_dir))
+
+    # A rollup that no longer matches the data is not used, even with the same row count
+    saved = Rollup.load(rollup_path(output_dir))
+    load(pd.DataFrame(_records(0, 8, sentiment='neutral')), output_dir)
+    saved.save(rollup_path(output_dir))
+    assert load_rollup(output_dir) is None
+
+
+def test_analysis_and_warehouse_use_rollups(tmpdir):
+    data_path = str(tmpdir.mkdir('processed'))
+    load(pd.DataFrame(_records(0, 6)), data_path)
+    analyze_data(data_path, str(tmpdir.join('analysis')))
+    with open(str(tmpdir.join('analysis', 'data_summary.txt'))) as f:
+        summary = f.read()
+    assert 'Total records: 6' in summary and 'positive    6' in summary
+
+    mongomock = pytest.importorskip('mongomock')
+    from src.warehouse_loader import ROLLUP_COLLECTION, load_to_warehouse
+    from src.warehouse_queries import label_distribution, rollup_distribution
+
+    client = mongomock.MongoClient()
+    assert load_to_warehouse(data_path, client=client)
+    db = client['meme_data_warehouse']
+    expected = {value: count for value, count in label_distribution(db['processed_data'], 'sarcasm').items()
+                if value is not None}
+    assert rollup_distribution(db[ROLLUP_COLLECTION], 'sarcasm') == expected == {'general': 3}
+    assert db[ROLLUP_COLLECTION].find_one({'_id': 'histogram:word_count'})['bins'] == [[0, 2], [2, 2], [4, 2]]
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from src.schema import HISTOGRAM_BINS, records_to_table, frame_to_table, histogram_matrix, image_dimensions
+
+def _records(n):
+    return [{'image_path': f'img_{i}.jpg', 'height': 10 + i, 'width': 20 + i, 'channels': 3,
+             'histogram': np.full(HISTOGRAM_BINS, i, dtype=np.uint32)} for i in range(n)]
+
+def test_records_to_table_uses_compact_types():
+    table = records_to_table(_records(3))
+
+    assert table.schema.field('histogram').type == pa.list_(pa.uint32(), HISTOGRAM_BINS)
+    assert table.schema.field('height').type == pa.int32()
+    assert table.schema.field('image_path').type == pa.string()
+
+    matrix = histogram_matrix(table['histogram'])
+    assert matrix.shape == (3, HISTOGRAM_BINS)
+    assert matrix.dtype == np.uint32
+    assert matrix[2, 0] == 2
+
+
+def test_frame_to_table_keeps_column_order():
+    df = pd.DataFrame(_records(2))
+    table = frame_to_table(df)
+
+    assert table.column_names == list(df.columns)
+    assert np.array_equal(histogram_matrix(table['histogram']), histogram_matrix(df['histogram']))
+
+
+def test_histogram_matrix_fills_null_rows_with_zeros():
+    records = _records(3)
+    records[1]['histogram'] = None
+    table = records_to_table(records)
+    assert table['histogram'].null_count == 1
+
+    for column in (table['histogram'], table.slice(1)['histogram'], table.to_pandas()['histogram']):
+        matrix = histogram_matrix(column)
+        assert matrix.shape == (len(column), HISTOGRAM_BINS)
+        assert matrix.dtype == np.uint32
+        assert (matrix[-2] == 0).all() and (matrix[-1] == 2).all()
+
+
+def test_image_dimensions_typed_and_legacy():
+    typed = pd.DataFrame({'height': [10, 20], 'width': [30, 40]})
+    heights, widths = image_dimensions(typed)
+    assert heights.tolist() == [10, 20] and widths.tolist() == [30, 40]
+
+    legacy_tuples = pd.DataFrame({'image_size': [(10, 30, 3), (20, 40, 3)]})
+    heights, widths = image_dimensions(legacy_tuples)
+    assert heights.tolist() == [10, 20] and widths.tolist() == [30, 40]
+
+    legacy_strings = pd.DataFrame({'image_size': ['(10, 30, 3)', '(20, 40, 3)']})
+    heights, widths = image_dimensions(legacy_strings)
+    assert heights.tolist() == [10, 20] and widths.tolist() == [30, 40]
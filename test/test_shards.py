@@ -0,0 +1,48 @@
+import os
+import subprocess
+import sys
+import pandas as pd
+import pytest
+from src.etl_pipeline import merge_etl_shards
+from src.image_source import ImageSource
+from src.shards import parse_shard, shard_of
+
+def test_partition_is_stable_and_complete():
+    names = [f'image_{i}.jpg' for i in range(200)]
+    shards = [shard_of(name, 4) for name in names]
+    assert set(shards) == {0, 1, 2, 3}
+    # Depends on the file name only, never on the directory or process
+    assert shards == [shard_of(os.path.join('/mnt', 'node2', name), 4) for name in names]
+    assert shard_of('image_1.jpg', 4) == 0
+
+    assert parse_shard('2/4') == (2, 4)
+    for spec in ('4/4', '-1/2', '1', 'a/b'):
+        with pytest.raises(ValueError):
+            parse_shard(spec)
+
+
+def test_shards_run_as_processes_and_merge(tmpdir):
+    output_dir = str(tmpdir)
+
+    def run_shard(spec):
+        return subprocess.Popen([sys.executable, '-m', 'src.etl_pipeline', '--test', '--no-cache',
+                                 '--shard', spec, '--output-dir', output_dir],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    # Merging before every shard has finished is refused
+    assert run_shard('0/3').wait() == 0
+    with pytest.raises(ValueError, match='1/3, 2/3'):
+        merge_etl_shards(output_dir, 3)
+
+    assert all(process.wait() == 0 for process in [run_shard('1/3'), run_shard('2/3')])
+    merged = merge_etl_shards(output_dir, 3).to_pandas()
+
+    expected = sorted(ImageSource('data/raw_test/images'))
+    assert sorted(merged['image_path']) == expected
+    assert os.path.exists(os.path.join(output_dir, 'term_index.json.gz'))
+    shard_rows = pd.read_parquet(os.path.join(output_dir, 'shards', '001-of-003', 'processed_data.parquet'))
+    assert {shard_of(path, 3) for path in shard_rows['image_path']} == {1}
+
+    # A shard of a different split cannot be merged in
+    with pytest.raises(ValueError, match='Missing'):
+        merge_etl_shards(output_dir, 2)
@@ -0,0 +1,60 @@
+import shutil
+import numpy as np
+import pandas as pd
+import pytest
+from src.etl_pipeline import color_histogram, decode_image, load
+from src.image_source import ImageSource
+from src.similarity import HistogramIndex, RandomProjection, find_similar, normalize, popcount
+
+def _histograms(n, seed=0):
+    return np.random.default_rng(seed).integers(0, 1000, size=(n, 256)).astype(np.uint32)
+
+def _paths(results):
+    return [[path for path, _ in matches] for matches in results]
+
+
+def test_exact_search_matches_brute_force(monkeypatch):
+    # Small blocks so the running top-k is carried across several of them
+    monkeypatch.setattr('src.similarity.BLOCK_ROWS', 64)
+    stored, queries = _histograms(300), _histograms(3, seed=1)
+    index = HistogramIndex([f'img_{i}.jpg' for i in range(300)], stored.copy())
+
+    expected = np.argsort(-(normalize(queries) @ normalize(stored).T), axis=1)[:, :5]
+    results = index.search(queries, k=5)
+    assert [[index.rows[path] for path, _ in matches] for matches in results] == expected.tolist()
+    assert all(matches[0][1] >= matches[-1][1] > 0 for matches in results)
+
+    # A stored row is never its own neighbour when excluded
+    assert [path for path, _ in index.search(stored[7], k=3, exclude=[7])[0]][0] != 'img_7.jpg'
+    assert index.search(stored[7], k=1)[0][0] == ('img_7.jpg', pytest.approx(1.0))
+
+
+def test_random_projection_shortlist():
+    stored = _histograms(500)
+    paths = [f'img_{i}.jpg' for i in range(500)]
+    exact = HistogramIndex(paths, stored.copy())
+    approximate = HistogramIndex(paths, stored.copy(), bits=64)
+
+    query = stored[:10]
+    # With every row shortlisted the approximate index is exact
+    assert _paths(approximate.search(query, k=5, candidates=500)) == _paths(exact.search(query, k=5))
+    assert [matches[0][0] for matches in approximate.search(query, k=1, candidates=20)] == paths[:10]
+    with pytest.raises(ValueError):
+        RandomProjection(approximate.vectors, bits=96)
+
+    words = np.array([0, 1, 2 ** 64 - 1, 0b1011 << 40], dtype=np.uint64)
+    assert popcount(words).tolist() == [0, 1, 64, 3]
+
+
+def test_find_similar_over_processed_data(tmpdir):
+    images = sorted(ImageSource('data/raw_test/images'))
+    data_path = str(tmpdir.mkdir('processed'))
+    load(pd.DataFrame({'image_path': images, 'text': '',
+                       'histogram': [color_histogram(decode_image(path)) for path in images]}), data_path)
+
+    query = str(tmpdir.join('repost.jpg'))
+    shutil.copy(images[3], query)
+    results = find_similar([query, images[3]], data_path, k=2)
+    assert results[query][0] == (images[3], pytest.approx(1.0))
+    assert images[3] not in [path for path, _ in results[images[3]]]
+    assert len(results[images[3]]) == 2
@@ -0,0 +1,94 @@
+import gzip
+import os
+import pandas as pd
+import pytest
+from src.analyze_data import load_term_index
+from src.etl_pipeline import load, load_stream
+from src.parquet_writer import ParquetChunkWriter
+from src.term_index import INDEX_FILENAME, TermIndex, HeavyHitters, tokenize, update_from_parquet
+
+TEXTS = ['The cat sat on the mat', 'Cat memes forever', 'dogs and cats', 'cat cat dog']
+SENTIMENTS = ['positive', 'negative', 'positive', 'positive']
+
+def test_tokenize_matches_count_vectorizer_rules():
+    # Lowercased, single characters and English stop words dropped
+    assert tokenize('The Cat sat on a MAT, x') == ['cat', 'sat', 'mat']
+    assert tokenize(None) == []
+
+
+def test_incremental_updates_skip_known_documents():
+    index = TermIndex()
+    assert index.update(TEXTS[:2], SENTIMENTS[:2], keys=['a', 'b']) == 2
+    assert index.update(TEXTS, SENTIMENTS, keys=['a', 'b', 'c', 'd']) == 2
+
+    assert index.top_k(1) == [('cat', 4)]
+    assert index.top_k(1, 'negative') == [('cat', 1)]
+    assert dict(index.top_k(10, 'positive'))['dog'] == 1
+
+
+def test_bounded_mode_finds_heavy_hitters():
+    counter = HeavyHitters(width=64, depth=3, capacity=5)
+    counter.update({f'rare{i}': 1 for i in range(200)})
+    counter.update({'frequent': 50, 'common': 30})
+
+    top = counter.most_common(2)
+    assert [term for term, _ in top] == ['frequent', 'common']
+    # Count-min estimates never under-count
+    assert top[0][1] >= 50
+
+
+def test_save_load_and_parquet_update(tmpdir):
+    parquet_path = str(tmpdir.join('processed_data.parquet'))
+    df = pd.DataFrame({'image_path': list('abcd'), 'text': TEXTS, 'overall_sentiment': SENTIMENTS})
+    df.iloc[:2].to_parquet(parquet_path)
+    update_from_parquet(parquet_path, group_column='overall_sentiment', bounded=True)
+
+    df.to_parquet(parquet_path)
+    index = update_from_parquet(parquet_path, group_column='overall_sentiment')
+
+    reloaded = TermIndex.load(os.path.join(str(tmpdir), 'term_index.json.gz'))
+    assert reloaded.bounded
+    assert reloaded.documents == index.documents == 4
+    assert reloaded.top_k(1) == [('cat', 4)]
+
+
+@pytest.mark.parametrize('bounded', [False, True])
+def test_replaced_documents_are_subtracted(tmpdir, bounded):
+    output_dir = str(tmpdir)
+
+    def records(start, stop, text):
+        return [{'image_path': f'img_{i}.jpg', 'text': text, 'overall_sentiment': 'positive'}
+                for i in range(start, stop)]
+
+    load_stream(records(0, 4, 'cat memes'), ParquetChunkWriter(output_dir, row_group_size=3),
+                term_index=True, bounded_term_index=bounded)
+    # Images 2 and 3 are OCRed again with new text, 4 is new
+    load_stream(records(2, 5, 'dog memes'), ParquetChunkWriter(output_dir, row_group_size=3), merge=True,
+                term_index=True, bounded_term_index=bounded)
+
+    path = os.path.join(output_dir, INDEX_FILENAME)
+    index = TermIndex.load(path)
+    assert index.bounded == bounded
+    assert index.documents == 5
+    assert dict(index.top_k(3)) == {'memes': 5, 'dog': 3, 'cat': 2}
+    assert dict(index.top_k(3, 'positive')) == dict(index.top_k(3))
+    with gzip.open(path, 'rt') as f:
+        # A bounded index keeps no raw image paths
+        assert ('img_0.jpg' in f.read()) != bounded
+
+
+def test_stale_index_is_ignored_and_replaced_by_load(tmpdir):
+    output_dir = str(tmpdir)
+    records = [{'image_path': f'img_{i}.jpg', 'text': 'hello world', 'overall_sentiment': 'positive'}
+               for i in range(3)]
+    load_stream(records, ParquetChunkWriter(output_dir), term_index=True)
+    assert dict(load_term_index(output_dir).top_k(2)) == {'hello': 3, 'world': 3}
+
+    # Data rewritten behind the index's back: the index no longer matches it
+    stale = TermIndex.load(os.path.join(output_dir, INDEX_FILENAME))
+    pd.DataFrame([dict(r, text='banana banana banana') for r in records]).to_parquet(
+        os.path.join(output_dir, 'processed_data.parquet'))
+    assert stale.data is not None and load_term_index(output_dir) is None
+
+    load(pd.DataFrame([dict(r, text='banana banana banana') for r in records]), output_dir)
+    assert load_term_index(output_dir).top_k(1) == [('banana', 9)]
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from benchmarks.synthetic import render_meme
+from src.etl_pipeline import TransformOptions, process_image
+from src.text_regions import caption_bands, coverage, find_text_regions, stack_regions
+
+def test_caption_lines_are_found_in_a_meme():
+    img, _ = render_meme(np.random.default_rng(1), 600, 500)
+    boxes = find_text_regions(img, 'contours')
+
+    assert 0 < coverage(boxes, img.shape) < 0.4
+    # One strip near the top caption and one near the bottom caption
+    assert boxes[0][1] < 500 * 0.25
+    assert boxes[-1][1] + boxes[-1][3] > 500 * 0.75
+    assert all(box[0] == 0 and box[2] == 600 for box in boxes)
+
+
+def test_image_without_text_falls_back_to_bands():
+    img = np.full((200, 300, 3), 128, dtype=np.uint8)
+    assert find_text_regions(img, 'contours') == caption_bands(img.shape)
+    assert coverage(caption_bands(img.shape), img.shape) == 0.5
+    with pytest.raises(ValueError):
+        find_text_regions(img, 'mser')
+
+
+def test_regions_are_stacked_into_one_image():
+    img = np.zeros((100, 80), dtype=np.uint8)
+    stacked = stack_regions(img, [(0, 0, 80, 10), (10, 50, 40, 20)], gap=5)
+    assert stacked.shape == (10 + 20 + 3 * 5, 80)
+    assert stacked[:5].min() == 255
+    assert stacked[5:15].max() == 0
+
+
+def test_process_image_reports_ocr_coverage(tmpdir):
+    import cv2
+    img, _ = render_meme(np.random.default_rng(2), 500, 400)
+    path = str(tmpdir.join('meme.jpg'))
+    cv2.imwrite(path, img)
+
+    full, _ = process_image(path)
+    cropped, error = process_image(path, TransformOptions(ocr_regions='contours'))
+
+    assert error is None
+    assert full['ocr_coverage'] == 1.0
+    assert 0 < cropped['ocr_coverage'] < 0.5
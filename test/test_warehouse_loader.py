@@ -0,0 +1,70 @@
+import os
+import pandas as pd
+import pytest
+from src.etl_pipeline import load
+from src.warehouse_loader import image_id, iter_document_batches, load_to_warehouse
+
+mongomock = pytest.importorskip('mongomock')
+
+def _processed(tmpdir, n=5, text='hello'):
+    import numpy as np
+    df = pd.DataFrame({
+        'image_path': [f'data/raw/images/image_{i}.jpg' for i in range(n)],
+        'text': [text] * n,
+        'height': [10] * n, 'width': [20] * n, 'channels': [3] * n,
+        'histogram': [np.arange(256, dtype=np.uint32)] * n,
+        'overall_sentiment': ['positive'] * n,
+    })
+    load(df, str(tmpdir))
+    return str(tmpdir)
+
+
+def test_image_id_is_platform_independent():
+    assert image_id('data/raw/images/image_1.jpg') == 'image_1.jpg'
+    assert image_id('C:\\data\\images\\image_1.jpg') == 'image_1.jpg'
+
+
+def test_document_batches_are_bson_ready(tmpdir):
+    batches = list(iter_document_batches(_processed(tmpdir), batch_size=2))
+
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    doc = batches[0][0]
+    assert doc['_id'] == doc['image_id'] == 'image_0.jpg'
+    assert isinstance(doc['histogram'], list) and type(doc['histogram'][0]) is int
+
+
+def test_reload_is_idempotent(tmpdir):
+    client = mongomock.MongoClient()
+    data_path = _processed(tmpdir)
+
+    assert load_to_warehouse(data_path, batch_size=2, client=client)
+    _processed(tmpdir, text='updated')
+    assert load_to_warehouse(data_path, batch_size=2, client=client)
+
+    collection = client['meme_data_warehouse']['processed_data']
+    assert collection.count_documents({}) == 5
+    assert collection.find_one({'_id': 'image_3.jpg'})['text'] == 'updated'
+
+
+def test_concurrent_load_with_write_concern(tmpdir, capsys):
+    client = mongomock.MongoClient()
+    data_path = _processed(tmpdir, n=23)
+
+    assert load_to_warehouse(data_path, batch_size=3, client=client, workers=4, write_concern={'w': 1})
+
+    collection = client['meme_data_warehouse']['processed_data']
+    assert collection.count_documents({}) == 23
+    assert 'docs/s' in capsys.readouterr().out
+
+
+@pytest.mark.skipif(not os.getenv('MONGO_TEST_URI'), reason="Set MONGO_TEST_URI to test against a real mongod")
+def test_concurrent_load_against_mongod(tmpdir):
+    import pymongo
+    client = pymongo.MongoClient(os.environ['MONGO_TEST_URI'], maxPoolSize=8)
+    client['meme_data_warehouse'].drop_collection('loader_test')
+    data_path = _processed(tmpdir, n=50)
+
+    assert load_to_warehouse(data_path, 'loader_test', batch_size=7, client=client, workers=4)
+    assert load_to_warehouse(data_path, 'loader_test', batch_size=7, client=client, workers=4)
+    assert client['meme_data_warehouse']['loader_test'].count_documents({}) == 50
+    client['meme_data_warehouse'].drop_collection('loader_test')
@@ -0,0 +1,65 @@
+import os
+import pytest
+from src.warehouse_loader import INDEX_PLAN, ensure_indexes
+from src.warehouse_queries import (choose_index, count_by_labels, find_by_labels, label_distribution,
+                                   search_text, uses_index)
+
+DOCS = [
+    {'_id': f'image_{i}.jpg', 'image_id': f'image_{i}.jpg', 'text': text,
+     'overall_sentiment': sentiment, 'humour': humour, 'sarcasm': 'general',
+     'offensive': 'not_offensive', 'motivational': 'not_motivational'}
+    for i, (text, sentiment, humour) in enumerate([
+        ('cats rule the internet', 'positive', 'funny'),
+        ('monday again', 'negative', 'not_funny'),
+        ('cats and dogs', 'positive', 'very_funny'),
+        ('this is fine', 'neutral', 'funny'),
+    ])
+]
+
+def test_choose_index_prefers_longest_prefix():
+    assert choose_index({'overall_sentiment'}) == 'labels_all'
+    assert choose_index({'overall_sentiment', 'humour', 'sarcasm'}) == 'labels_all'
+    assert choose_index({'sarcasm'}) == 'sarcasm_sentiment'
+    assert choose_index({'sarcasm', 'overall_sentiment'}) == 'sarcasm_sentiment'
+    assert choose_index({'text'}) is None
+
+
+def test_ensure_indexes_builds_plan_once():
+    mongomock = pytest.importorskip('mongomock')
+    collection = mongomock.MongoClient()['db']['docs']
+
+    created = ensure_indexes(collection)
+    assert sorted(created) == sorted(spec['name'] for spec in INDEX_PLAN)
+    assert ensure_indexes(collection) == []
+
+
+@pytest.fixture
+def mongod_collection():
+    if not os.getenv('MONGO_TEST_URI'):
+        pytest.skip("Set MONGO_TEST_URI to verify query plans against a real mongod")
+    import pymongo
+    client = pymongo.MongoClient(os.environ['MONGO_TEST_URI'])
+    collection = client['meme_data_warehouse']['query_test']
+    collection.drop()
+    collection.insert_many(DOCS)
+    ensure_indexes(collection)
+    yield collection
+    collection.drop()
+    client.close()
+
+
+def test_label_queries_use_indexes(mongod_collection):
+    assert count_by_labels(mongod_collection, overall_sentiment='positive') == 2
+    assert label_distribution(mongod_collection, 'humour', overall_sentiment='positive') == \
+        {'funny': 1, 'very_funny': 1}
+
+    cursor = find_by_labels(mongod_collection, overall_sentiment='positive', humour='funny')
+    assert uses_index(cursor.explain())
+    cursor = find_by_labels(mongod_collection, sarcasm='general')
+    assert uses_index(cursor.explain())
+
+
+def test_text_search_uses_text_index(mongod_collection):
+    cursor = search_text(mongod_collection, 'cats')
+    assert {doc['_id'] for doc in cursor.clone()} == {'image_0.jpg', 'image_2.jpg'}
+    assert uses_index(cursor.explain())